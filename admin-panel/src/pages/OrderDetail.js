@@ -207,22 +207,11 @@ export default function OrderDetail() {
                     className={`btn btn-sm ${
                       order.isPaid ? "btn-success" : "btn-outline-secondary"
                     }`}
-                    disabled={updating}
+                    disabled={updating || order.isPaid}
                     onClick={() => updateStatus("isPaid", true)}
                   >
                     Mark Paid
                   </button>
-                  <button
-                    className={`btn btn-sm ${
-                      !order.isPaid
-                        ? "btn-outline-secondary"
-                        : "btn-outline-danger"
-                    }`}
-                    disabled={updating}
-                    onClick={() => updateStatus("isPaid", false)}
-                  >
-                    Unpaid
-                  </button>
                 </div>
               </div>
 
@@ -235,22 +224,11 @@ export default function OrderDetail() {
                         ? "btn-success"
                         : "btn-outline-secondary"
                     }`}
-                    disabled={updating}
+                    disabled={updating || order.isDelivered}
                     onClick={() => updateStatus("isDelivered", true)}
                   >
                     Delivered
                   </button>
-                  <button
-                    className={`btn btn-sm ${
-                      !order.isDelivered
-                        ? "btn-outline-secondary"
-                        : "btn-outline-danger"
-                    }`}
-                    disabled={updating}
-                    onClick={() => updateStatus("isDelivered", false)}
-                  >
-                    Not Delivered
-                  </button>
                 </div>
               </div>
 
@@ -261,22 +239,11 @@ export default function OrderDetail() {
                     className={`btn btn-sm ${
                       order.isRefunded ? "btn-danger" : "btn-outline-secondary"
                     }`}
-                    disabled={updating}
+                    disabled={updating || order.isRefunded || !order.isPaid}
                     onClick={() => updateStatus("isRefunded", true)}
                   >
                     Refunded
                   </button>
-                  <button
-                    className={`btn btn-sm ${
-                      !order.isRefunded
-                        ? "btn-outline-secondary"
-                        : "btn-outline-success"
-                    }`}
-                    disabled={updating}
-                    onClick={() => updateStatus("isRefunded", false)}
-                  >
-                    Not Refunded
-                  </button>
                 </div>
               </div>
             </div>
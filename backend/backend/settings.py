@@ -33,6 +33,7 @@ from pathlib import Path
 import os
 from decouple import config
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -151,6 +152,9 @@ CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS',
     default='http://localhost:3000,http://127.0.0.1:3000,http://localhost:3001,http://127.0.0.1:3001'
 ).split(',')
+# Retried writes carry an Idempotency-Key; replays are flagged in the response
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
@@ -212,6 +216,10 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'static', 'media')
 
+# Product image variants are rendered in background threads after upload
+IMAGE_VARIANTS_ASYNC = config('IMAGE_VARIANTS_ASYNC', default='True') == 'True'
+IMAGE_VARIANT_WORKERS = config('IMAGE_VARIANT_WORKERS', default=2, cast=int)
+
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
     # Serve React static assets from the build folders when present
@@ -219,6 +227,30 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, '..', 'admin-panel', 'build', 'static'),
 ]
 
+# ===== CACHING =====
+# Max entries in each worker's in-process anonymous product listing cache
+PRODUCT_LIST_CACHE_SIZE = config('PRODUCT_LIST_CACHE_SIZE', default=256, cast=int)
+# Max entries in the read-through product detail cache (0 disables it)
+PRODUCT_DETAIL_CACHE_SIZE = config('PRODUCT_DETAIL_CACHE_SIZE', default=512, cast=int)
+# Seconds between checks for catalog changes made by other workers (suggest index)
+SUGGEST_REFRESH_SECONDS = config('SUGGEST_REFRESH_SECONDS', default=5, cast=int)
+# Neighbours kept per product by the related-products builder
+RELATED_PRODUCTS_TOP_N = config('RELATED_PRODUCTS_TOP_N', default=20, cast=int)
+# Reference currency for priceBase and the ExchangeRate table
+BASE_CURRENCY = config('BASE_CURRENCY', default='USD')
+# How long a stored Idempotency-Key response is replayed
+IDEMPOTENCY_KEY_TTL_HOURS = config('IDEMPOTENCY_KEY_TTL_HOURS', default=24, cast=int)
+# Email outbox worker: rows per batch, attempts before dead-lettering, and
+# the exponential retry backoff (doubling from the base, capped at the max)
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=100, cast=int)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
+OUTBOX_BACKOFF_SECONDS = config('OUTBOX_BACKOFF_SECONDS', default=30, cast=int)
+OUTBOX_MAX_BACKOFF_SECONDS = config('OUTBOX_MAX_BACKOFF_SECONDS', default=3600, cast=int)
+# Bank-transfer payment reminders: at most one per customer per interval,
+# and only for orders older than the minimum age
+TRANSFER_REMINDER_INTERVAL_HOURS = config('TRANSFER_REMINDER_INTERVAL_HOURS', default=48, cast=int)
+TRANSFER_REMINDER_MIN_AGE_HOURS = config('TRANSFER_REMINDER_MIN_AGE_HOURS', default=24, cast=int)
+
 # ===== PAYMENT GATEWAY CONFIGURATION =====
 # Stripe Payment Processing
 STRIPE_PUBLIC_KEY = config('STRIPE_PUBLIC_KEY', default='pk_test_default')
@@ -21,11 +21,13 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import re_path
-from base.views import serve_frontend, serve_admin_panel
+from base.views import serve_frontend, serve_admin_panel, serve_image_variant
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('base.urls')), 
+    # Content-hashed product image variants, cached as immutable
+    re_path(r'^media/variants/(?P<path>.+)$', serve_image_variant),
 ]
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
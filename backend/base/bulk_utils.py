@@ -0,0 +1,237 @@
+"""
+Streaming bulk import and export of products (CSV or NDJSON).
+
+Imports are parsed row by row from the uploaded file, validated, and written
+in fixed-size batches: rows carrying an existing ``_id`` update that product,
+rows without one create a new product. Each batch commits in its own
+transaction, so one bad batch never rolls back the rest, and every rejected
+row is reported with its line number. Exports stream straight from
+``QuerySet.iterator()`` so memory stays flat regardless of catalog size.
+"""
+import codecs
+import csv
+import io
+import json
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .cache_utils import bump_version, CATALOG, SUGGEST
+from .catalog_utils import product_detail_cache
+from .fx_utils import get_rates, to_base
+from .models import Product
+
+
+FORMATS = ('csv', 'ndjson')
+EXPORT_FIELDS = ('_id', 'name', 'brand', 'category', 'description', 'price', 'priceCurrency',
+                 'countInStock', 'rating', 'numReviews', 'image', 'created_at')
+DEFAULT_BATCH_SIZE = 1000
+# Changing either of these recomputes priceBase
+PRICE_FIELDS = {'price', 'priceCurrency'}
+# Fields the search-box suggestions are built from
+SUGGEST_FIELDS = {'name', 'brand', 'category'}
+MAX_REPORTED_ERRORS = 1000
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    _id = serializers.IntegerField(required=False, allow_null=True)
+
+    class Meta:
+        model = Product
+        fields = ('_id', 'name', 'brand', 'category', 'description', 'price', 'priceCurrency', 'countInStock')
+
+
+def detect_format(filename=None, content_type=None, explicit=None):
+    if explicit in FORMATS:
+        return explicit
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in (content_type or ''):
+        return 'ndjson'
+    return 'csv'
+
+
+def iter_records(binary_stream, fmt):
+    """Yield ``(line_number, record_or_None, parse_error_or_None)`` from a byte stream."""
+    lines = codecs.iterdecode(binary_stream, 'utf-8-sig')
+    if fmt == 'ndjson':
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, None, {'non_field_errors': [f'Invalid JSON: {e}']}
+                continue
+            if not isinstance(record, dict):
+                yield number, None, {'non_field_errors': ['Each line must be a JSON object']}
+                continue
+            yield number, record, None
+        return
+
+    reader = csv.DictReader(lines)
+    for record in reader:
+        # Blank CSV cells mean "not provided" rather than an empty value
+        yield reader.line_num, {k: v for k, v in record.items() if k and v not in (None, '')}, None
+
+
+def _write_batch(batch, report):
+    """Validate and persist one batch of ``(line_number, record)`` pairs."""
+    validator = ProductImportSerializer()
+    creates, updates = [], []
+    for number, record in batch:
+        try:
+            data = validator.run_validation(record)
+        except serializers.ValidationError as e:
+            report['errors'].append({'row': number, 'errors': e.detail})
+            continue
+        pk = data.pop('_id', None)
+        (updates if pk else creates).append((number, pk, data))
+
+    rates = get_rates()
+    with transaction.atomic():
+        existing = Product.objects.in_bulk([pk for _, pk, _ in updates])
+        changed, fields = [], {'updated_at'}
+        now = timezone.now()
+        for number, pk, data in updates:
+            product = existing.get(pk)
+            if product is None:
+                report['errors'].append({'row': number, 'errors': {'_id': [f'Product {pk} does not exist']}})
+                continue
+            for name, value in data.items():
+                setattr(product, name, value)
+            product.updated_at = now
+            fields.update(data)
+            if PRICE_FIELDS & data.keys():
+                product.priceBase = to_base(product.price, product.priceCurrency, rates)
+                fields.add('priceBase')
+            changed.append(product)
+        if changed:
+            Product.objects.bulk_update(changed, sorted(fields))
+        if creates:
+            new_products = [Product(**data) for _, _, data in creates]
+            for product in new_products:
+                product.priceBase = to_base(product.price, product.priceCurrency, rates)
+            Product.objects.bulk_create(new_products)
+    report['updated'] += len(changed)
+    report['created'] += len(creates)
+
+
+def import_products(binary_stream, fmt='csv', batch_size=DEFAULT_BATCH_SIZE):
+    """Import products from ``binary_stream``; returns a summary report."""
+    report = {'rows': 0, 'created': 0, 'updated': 0, 'errors': []}
+    batch = []
+    for number, record, error in iter_records(binary_stream, fmt):
+        report['rows'] += 1
+        if error:
+            report['errors'].append({'row': number, 'errors': error})
+            continue
+        batch.append((number, record))
+        if len(batch) >= batch_size:
+            _write_batch(batch, report)
+            batch = []
+    if batch:
+        _write_batch(batch, report)
+
+    # bulk_create/bulk_update skip model signals, so invalidate explicitly
+    if report['created'] or report['updated']:
+        bump_version(CATALOG)
+        bump_version(SUGGEST)
+        product_detail_cache.refresh()
+    report['error_count'] = len(report['errors'])
+    report['errors'] = report['errors'][:MAX_REPORTED_ERRORS]
+    return report
+
+
+class ProductBulkUpdateItemSerializer(serializers.Serializer):
+    _id = serializers.IntegerField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    priceCurrency = serializers.ChoiceField(choices=Product._meta.get_field('priceCurrency').choices, required=False)
+    countInStock = serializers.IntegerField(min_value=0, required=False)
+    # Optional optimistic-concurrency guard: the updated_at the client last saw
+    updated_at = serializers.DateTimeField(required=False)
+
+
+def bulk_update_products(items):
+    """Apply price/stock changes with one ``in_bulk`` read and ``bulk_update``.
+
+    Valid items are applied together in a single transaction; items that fail
+    validation, repeat an id, name a missing product or carry a stale
+    ``updated_at`` are returned as conflicts and left untouched.
+    """
+    validator = ProductBulkUpdateItemSerializer()
+    conflicts, changes, seen = [], [], set()
+    for index, item in enumerate(items):
+        try:
+            data = validator.run_validation(item)
+        except serializers.ValidationError as e:
+            conflicts.append({'index': index, '_id': item.get('_id') if isinstance(item, dict) else None,
+                              'errors': e.detail})
+            continue
+        if data['_id'] in seen:
+            conflicts.append({'index': index, '_id': data['_id'], 'errors': {'_id': ['Duplicate _id in request']}})
+            continue
+        seen.add(data['_id'])
+        changes.append((index, data))
+
+    updated = []
+    rates = get_rates()
+    with transaction.atomic():
+        products = Product.objects.select_for_update().in_bulk([data['_id'] for _, data in changes])
+        now = timezone.now()
+        fields = {'updated_at'}
+        for index, data in changes:
+            pk = data.pop('_id')
+            expected = data.pop('updated_at', None)
+            product = products.get(pk)
+            if product is None:
+                conflicts.append({'index': index, '_id': pk, 'errors': {'_id': ['Product not found']}})
+                continue
+            if expected is not None and product.updated_at != expected:
+                conflicts.append({'index': index, '_id': pk, 'errors': {
+                    'updated_at': [f'Product was modified at {product.updated_at.isoformat()}'],
+                }})
+                continue
+            for name, value in data.items():
+                setattr(product, name, value)
+            product.updated_at = now
+            fields.update(data)
+            if PRICE_FIELDS & data.keys():
+                product.priceBase = to_base(product.price, product.priceCurrency, rates)
+                fields.add('priceBase')
+            updated.append(product)
+        if updated:
+            Product.objects.bulk_update(updated, sorted(fields), batch_size=DEFAULT_BATCH_SIZE)
+
+    if updated:
+        bump_version(CATALOG)
+        if SUGGEST_FIELDS & fields:
+            bump_version(SUGGEST)
+        product_detail_cache.refresh()
+    conflicts.sort(key=lambda c: c['index'])
+    return {'updated': len(updated), 'conflicts': conflicts}
+
+
+def _json_default(value):
+    return str(value)
+
+
+def iter_export(queryset, fmt='csv', chunk_size=2000):
+    """Yield the export document chunk by chunk from a server-side iterator."""
+    rows = queryset.order_by('_id').values(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    if fmt == 'ndjson':
+        for row in rows:
+            yield json.dumps(row, default=_json_default) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,132 @@
+"""
+In-process response caches with database-backed invalidation.
+
+Each gunicorn worker keeps its own bounded LRU of serialized responses.
+Entries are tagged with a shared version counter stored in ``CacheVersion``;
+signal handlers bump the counter when the underlying rows change, so every
+worker notices on its next request without a shared cache or broker.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+
+CATALOG = 'catalog'
+# Advanced only by changes to the text the suggest index is built from
+SUGGEST = 'suggest'
+
+# Query parameters that affect the product listing, with their normalizers.
+PRODUCT_LIST_PARAMS = {
+    'search': lambda v: ' '.join(v.lower().split()),
+    'category': lambda v: v.strip().lower(),
+    'brand': lambda v: v.strip().lower(),
+    'min_price': float,
+    'max_price': float,
+    'rating': float,
+    'in_stock': lambda v: v.lower() in ['true', '1', 'yes'],
+    'sort': str.strip,
+    'page': int,
+    'page_size': int,
+    'pagination': str.strip,
+    'cursor': str.strip,
+    'count': str.strip,
+    'currency': lambda v: v.strip().upper(),
+    'fields': lambda v: ','.join(sorted(n.strip() for n in v.split(',') if n.strip())),
+    'omit': lambda v: ','.join(sorted(n.strip() for n in v.split(',') if n.strip())),
+}
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU whose entries belong to one version."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.version = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+                return None
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value, version):
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_matching(self, predicate):
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.version = None
+
+    def __len__(self):
+        return len(self._data)
+
+
+product_list_cache = LRUCache(getattr(settings, 'PRODUCT_LIST_CACHE_SIZE', 256))
+
+
+def get_version(name):
+    return get_version_info(name)[0]
+
+
+def get_version_info(name):
+    """Return ``(version, updated_at)`` for the named counter."""
+    from .models import CacheVersion
+    row = CacheVersion.objects.filter(name=name).values_list('version', 'updated_at').first()
+    return row or (0, None)
+
+
+def bump_version(name):
+    """Advance the named counter.
+
+    The new value is at least the current time in nanoseconds, so it never
+    repeats a value a worker may still hold even if the row was rolled back.
+    """
+    from .models import CacheVersion
+    new_value = Greatest(F('version') + 1, Value(time.time_ns()))
+    if not CacheVersion.objects.filter(name=name).update(version=new_value, updated_at=timezone.now()):
+        CacheVersion.objects.get_or_create(name=name, defaults={'version': time.time_ns()})
+
+
+def product_list_cache_key(params):
+    """Normalize listing query parameters into a hashable cache key.
+
+    Returns ``None`` when a parameter cannot be normalized, in which case the
+    request is served uncached.
+    """
+    key = []
+    for name, normalize in PRODUCT_LIST_PARAMS.items():
+        value = params.get(name)
+        if name == 'search' and not value:
+            value = params.get('q')
+        if value in (None, ''):
+            continue
+        try:
+            key.append((name, normalize(value)))
+        except (TypeError, ValueError):
+            return None
+    return tuple(key)
@@ -0,0 +1,99 @@
+"""
+In-process product lookup structures.
+
+``CatalogIndex`` indexes product records by normalized id, name and
+category. It backs the static fallback catalog in ``base.products``, which
+is indexed once at import instead of being scanned per request.
+
+``ProductDetailCache`` is a read-through cache of serialized product detail
+payloads. Entries are validated against the row's ``updated_at`` (which the
+detail view reads anyway for its ETag) and evicted by the model signal
+refresh hook, so a hit costs one single-column lookup.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+
+from .cache_utils import LRUCache
+from .products import products as static_products
+
+
+def normalize_id(value):
+    """Normalize an id from a URL, dict or model ("007", 7, " 7 ") to ``'7'``."""
+    text = str(value).strip()
+    try:
+        return str(int(text))
+    except ValueError:
+        return text
+
+
+def _normalize_text(value):
+    return ' '.join(str(value).lower().split()) if value else ''
+
+
+class CatalogIndex:
+    """Read-only index over product records (dicts or model instances)."""
+
+    def __init__(self, records=()):
+        self.by_id = {}
+        self.by_name = defaultdict(list)
+        self.by_category = defaultdict(list)
+        for record in records:
+            self.add(record)
+
+    @staticmethod
+    def _get(record, name):
+        return record.get(name) if isinstance(record, dict) else getattr(record, name, None)
+
+    def add(self, record):
+        self.by_id[normalize_id(self._get(record, '_id'))] = record
+        self.by_name[_normalize_text(self._get(record, 'name'))].append(record)
+        self.by_category[_normalize_text(self._get(record, 'category'))].append(record)
+
+    def get(self, pk):
+        return self.by_id.get(normalize_id(pk))
+
+    def find_by_name(self, name):
+        return list(self.by_name.get(_normalize_text(name), ()))
+
+    def in_category(self, category):
+        return list(self.by_category.get(_normalize_text(category), ()))
+
+    def __len__(self):
+        return len(self.by_id)
+
+
+static_catalog = CatalogIndex(static_products)
+
+
+class ProductDetailCache:
+    """Read-through cache of product detail payloads keyed by id and review page."""
+
+    def __init__(self, maxsize):
+        self._cache = LRUCache(maxsize)
+
+    @property
+    def enabled(self):
+        return self._cache.maxsize > 0
+
+    def get(self, pk, updated_at, *variant):
+        if not self.enabled:
+            return None
+        entry = self._cache.get((normalize_id(pk),) + variant, version=None)
+        if entry is None or entry[0] != updated_at:
+            return None
+        return entry[1]
+
+    def set(self, pk, updated_at, data, *variant):
+        if self.enabled:
+            self._cache.set((normalize_id(pk),) + variant, (updated_at, data), version=None)
+
+    def refresh(self, pk=None):
+        """Refresh hook: drop cached payloads for ``pk`` (or everything)."""
+        if pk is None:
+            self._cache.clear()
+            return
+        self._cache.discard_matching(lambda key: key[0] == normalize_id(pk))
+
+
+product_detail_cache = ProductDetailCache(getattr(settings, 'PRODUCT_DETAIL_CACHE_SIZE', 512))
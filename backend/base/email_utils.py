@@ -1,275 +1,249 @@
 """
 Email utilities for sending order confirmations, payment notifications, and other transactional emails.
+
+Messages are queued in the email outbox (see base.outbox_utils) and sent by
+the ``process_outbox`` worker; call these inside the transaction that makes
+the change the email reports.
+
+Each email is a pair of templates in ``base/templates/base/emails/`` (HTML
+and plain text) extending a shared layout that holds the CSS once. Compiled
+templates are kept per process, and ``render_order_emails`` renders one
+email for many orders in a single pass, loading the orders' users, items
+and addresses with one query per relation.
+
+``queue_transfer_reminders`` (the ``send_transfer_reminders`` command)
+streams unpaid bank-transfer orders with ``iterator()`` and queues at most one
+reminder per customer per ``TRANSFER_REMINDER_INTERVAL_HOURS``, listing all of
+the customer's due orders, a batch at a time, recording
+``Order.transferRemindedAt`` in the same transaction.
 """
-from django.core.mail import send_mail
+import functools
+import itertools
+import re
+from datetime import timedelta
+from decimal import Decimal
+from operator import attrgetter
+
 from django.conf import settings
-from django.template.loader import render_to_string
-import html
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.template.loader import get_template
+from django.utils import timezone
 
+from .outbox_utils import queue_mail, queue_mass_mail
 
-def send_order_confirmation_email(order, user):
-    """Send order confirmation email to customer"""
-    subject = f"Order Confirmation - mamigloexclusive #{order._id}"
-    
-    html_message = f"""
-    <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; background-color: #f5f5f5; }}
-                .container {{ max-width: 600px; margin: 20px auto; background-color: white; padding: 20px; border-radius: 8px; }}
-                .header {{ border-bottom: 2px solid #0dcaf0; padding-bottom: 10px; margin-bottom: 20px; }}
-                .header h1 {{ color: #333; margin: 0; }}
-                .order-details {{ background-color: #f9f9f9; padding: 15px; border-radius: 5px; margin: 15px 0; }}
-                .order-details p {{ margin: 5px 0; }}
-                .items-table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
-                .items-table th, .items-table td {{ padding: 10px; border-bottom: 1px solid #ddd; text-align: left; }}
-                .items-table th {{ background-color: #0dcaf0; color: white; }}
-                .total {{ font-weight: bold; font-size: 18px; color: #333; }}
-                .footer {{ background-color: #f5f5f5; padding: 20px; border-radius: 5px; margin-top: 20px; text-align: center; }}
-                .footer p {{ margin: 5px 0; font-size: 12px; color: #666; }}
-                .button {{ display: inline-block; background-color: #0dcaf0; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; margin: 10px 0; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Thank you for your order!</h1>
-                    <p>Order #<strong>{order._id}</strong></p>
-                </div>
-                
-                <p>Hello {user.first_name or user.username},</p>
-                <p>We've received your order and it's being processed. Here are the details:</p>
-                
-                <div class="order-details">
-                    <h3>Shipping Address</h3>
-                    <p>{order.shippingaddress.address}</p>
-                    <p>{order.shippingaddress.city}, {order.shippingaddress.postalCode}</p>
-                    <p>{order.shippingaddress.country}</p>
-                </div>
-                
-                <h3>Order Items</h3>
-                <table class="items-table">
-                    <thead>
-                        <tr>
-                            <th>Product</th>
-                            <th>Quantity</th>
-                            <th>Price</th>
-                            <th>Total</th>
-                        </tr>
-                    </thead>
-                    <tbody>
+
+TEMPLATE_DIR = 'base/emails'
+# Subject, colour theme and whether the order's items and address are shown
+EMAILS = {
+    'order_confirmation': {
+        'subject': 'Order Confirmation - mamigloexclusive #{order_id}',
+        'theme': {'accent': '#0dcaf0', 'heading_color': '#333', 'details_background': '#f9f9f9'},
+        'items': True,
+    },
+    'payment_confirmation': {
+        'subject': 'Payment Confirmed - Order #{order_id} - mamigloexclusive',
+        'theme': {'accent': '#28a745', 'heading_color': '#28a745', 'details_background': '#f9f9f9'},
+        'items': False,
+    },
+    'order_shipped': {
+        'subject': 'Your Order Has Shipped - #{order_id} - mamigloexclusive',
+        'theme': {'accent': '#0dcaf0', 'heading_color': '#0dcaf0', 'details_background': '#f9f9f9'},
+        'items': False,
+    },
+    'transfer_reminder': {
+        'subject': 'Payment Reminder - Bank Transfer for Order #{order_id}',
+        'theme': {'accent': '#ffc107', 'heading_color': '#ffc107', 'details_background': '#fff8e1'},
+        'items': False,
+    },
+}
+_BLANK_LINES_RE = re.compile(r'\n\s*\n(\s*\n)+')
+
+
+@functools.lru_cache(maxsize=None)
+def _template(name):
+    return get_template(f'{TEMPLATE_DIR}/{name}')
+
+
+def _money(value):
+    return f'{Decimal(value or 0):.2f}'
+
+
+def _tidy(text):
+    return _BLANK_LINES_RE.sub('\n\n', text).strip() + '\n'
+
+
+def _order_url(order):
+    frontend = getattr(settings, 'FRONTEND_URL', 'http://localhost:3000')
+    return f'{frontend}/order/{order._id}'
+
+
+def _due_order(order):
+    return {'id': order._id, 'total': _money(order.totalPrice), 'url': _order_url(order)}
+
+
+def order_context(order, user, items=None, details=True, **extra):
+    """Template context for ``order``.
+
+    With ``details`` the items (``items``, defaulting to the order's own) and
+    the shipping address are included; otherwise neither is loaded.
     """
-    
-    for item in order.orderitems.all():
-        item_total = item.price * item.qty
-        html_message += f"""
-                        <tr>
-                            <td>{item.name}</td>
-                            <td>{item.qty}</td>
-                            <td>${item.price:.2f}</td>
-                            <td>${item_total:.2f}</td>
-                        </tr>
-        """
-    
-    html_message += f"""
-                    </tbody>
-                </table>
-                
-                <div class="order-details">
-                    <p><strong>Subtotal:</strong> ${order.totalPrice - order.shippingPrice - order.taxPrice:.2f}</p>
-                    <p><strong>Shipping:</strong> ${order.shippingPrice:.2f}</p>
-                    <p><strong>Tax:</strong> ${order.taxPrice:.2f}</p>
-                    <p class="total"><strong>Total:</strong> ${order.totalPrice:.2f}</p>
-                </div>
-                
-                <div style="text-align: center;">
-                    <a href="http://localhost:3000/order/{order._id}" class="button">View Order Status</a>
-                </div>
-                
-                <div class="footer">
-                    <p>If you have any questions, please contact us at support@mamigloexclusive.com</p>
-                    <p>&copy; 2025 mamigloexclusive. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-    </html>
+    shipping = None
+    if not details:
+        items = ()
+    else:
+        if items is None:
+            items = order.orderitems.all()
+        shipping = getattr(order, 'shippingaddress', None)
+    shipping_price, tax = order.shippingPrice or 0, order.taxPrice or 0
+    return {
+        'order': order,
+        'name': user.first_name or user.username,
+        'shipping': shipping,
+        'items': [
+            {'name': item.name, 'qty': item.qty, 'price': _money(item.price), 'total': _money(item.price * item.qty)}
+            for item in items
+        ],
+        'subtotal': _money((order.totalPrice or 0) - shipping_price - tax),
+        'shipping_price': _money(shipping_price),
+        'tax': _money(tax),
+        'total': _money(order.totalPrice),
+        'order_url': _order_url(order),
+        **extra,
+    }
+
+
+def render_email(name, context):
+    """Return ``(subject, text, html)`` for email ``name`` rendered with ``context``."""
+    spec = EMAILS[name]
+    context = {**spec['theme'], **context}
+    subject = spec['subject'].format(order_id=context['order']._id)
+    html_message = _template(f'{name}.html').render(context)
+    text_message = _tidy(_template(f'{name}.txt').render(context))
+    return subject, text_message, html_message
+
+
+def render_order_emails(name, orders, **extra):
+    """Render email ``name`` for many orders; returns ``[(order, subject, text, html)]``.
+
+    Orders without a user are skipped. Users (and, for emails that list them,
+    items and shipping addresses) are loaded with one query per relation.
     """
-    
-    send_mail(
-        subject,
-        f"Order Confirmation for order #{order._id}",
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        html_message=html_message,
-        fail_silently=True,
-    )
+    orders = list(orders)
+    lookups = ['user'] + (['orderitems', 'shippingaddress'] if EMAILS[name]['items'] else [])
+    prefetch_related_objects(orders, *lookups)
+    rendered = []
+    for order in orders:
+        if order.user is None:
+            continue
+        context = order_context(order, order.user, details=EMAILS[name]['items'], **extra)
+        rendered.append((order, *render_email(name, context)))
+    return rendered
+
+
+def queue_order_emails(name, orders, **extra):
+    """Render email ``name`` for many orders and queue them with one insert; returns the rows."""
+    return queue_mass_mail([
+        (subject, text_message, settings.DEFAULT_FROM_EMAIL, [order.user.email], html_message)
+        for order, subject, text_message, html_message in render_order_emails(name, orders, **extra)
+    ])
+
+
+def _send(name, order, user, **extra):
+    context = order_context(order, user, details=EMAILS[name]['items'], **extra)
+    subject, text_message, html_message = render_email(name, context)
+    queue_mail(subject, text_message, settings.DEFAULT_FROM_EMAIL, [user.email], html_message=html_message)
+
+
+def send_order_confirmation_email(order, user):
+    """Send order confirmation email to customer"""
+    _send('order_confirmation', order, user)
 
 
 def send_payment_confirmation_email(order, user, payment_method):
     """Send payment confirmation email"""
-    subject = f"Payment Confirmed - Order #{order._id} - mamigloexclusive"
-    
-    html_message = f"""
-    <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; background-color: #f5f5f5; }}
-                .container {{ max-width: 600px; margin: 20px auto; background-color: white; padding: 20px; border-radius: 8px; }}
-                .header {{ border-bottom: 2px solid #28a745; padding-bottom: 10px; margin-bottom: 20px; }}
-                .header h1 {{ color: #28a745; margin: 0; }}
-                .order-details {{ background-color: #f9f9f9; padding: 15px; border-radius: 5px; margin: 15px 0; }}
-                .footer {{ background-color: #f5f5f5; padding: 20px; border-radius: 5px; margin-top: 20px; text-align: center; }}
-                .footer p {{ margin: 5px 0; font-size: 12px; color: #666; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>✓ Payment Confirmed!</h1>
-                </div>
-                
-                <p>Hello {user.first_name or user.username},</p>
-                <p>Thank you! Your payment has been successfully processed.</p>
-                
-                <div class="order-details">
-                    <p><strong>Order Number:</strong> #{order._id}</p>
-                    <p><strong>Payment Method:</strong> {payment_method}</p>
-                    <p><strong>Amount:</strong> ${order.totalPrice:.2f}</p>
-                    <p><strong>Date:</strong> {order.paidAt or 'Processing'}</p>
-                </div>
-                
-                <p>Your order is now being prepared for shipment. You'll receive a tracking number via email once it ships.</p>
-                
-                <div class="footer">
-                    <p>If you have any questions, please contact us at support@mamigloexclusive.com</p>
-                    <p>&copy; 2025 mamigloexclusive. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-    </html>
-    """
-    
-    send_mail(
-        subject,
-        f"Payment confirmed for order #{order._id}",
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        html_message=html_message,
-        fail_silently=True,
-    )
+    _send('payment_confirmation', order, user, payment_method=payment_method)
 
 
 def send_order_shipped_email(order, user, tracking_number=None):
     """Send order shipped notification"""
-    subject = f"Your Order Has Shipped - #{order._id} - mamigloexclusive"
-    
-    tracking_info = ""
-    if tracking_number:
-        tracking_info = f"<p><strong>Tracking Number:</strong> {tracking_number}</p>"
-    
-    html_message = f"""
-    <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; background-color: #f5f5f5; }}
-                .container {{ max-width: 600px; margin: 20px auto; background-color: white; padding: 20px; border-radius: 8px; }}
-                .header {{ border-bottom: 2px solid #0dcaf0; padding-bottom: 10px; margin-bottom: 20px; }}
-                .header h1 {{ color: #0dcaf0; margin: 0; }}
-                .order-details {{ background-color: #f9f9f9; padding: 15px; border-radius: 5px; margin: 15px 0; }}
-                .footer {{ background-color: #f5f5f5; padding: 20px; border-radius: 5px; margin-top: 20px; text-align: center; }}
-                .footer p {{ margin: 5px 0; font-size: 12px; color: #666; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>📦 Your Order Has Shipped!</h1>
-                </div>
-                
-                <p>Hello {user.first_name or user.username},</p>
-                <p>Great news! Your order is on its way.</p>
-                
-                <div class="order-details">
-                    <p><strong>Order Number:</strong> #{order._id}</p>
-                    {tracking_info}
-                    <p><strong>Estimated Delivery:</strong> 5-7 business days</p>
-                </div>
-                
-                <p>You can track your package using the tracking number above. Click the button below to view your order status.</p>
-                
-                <div style="text-align: center;">
-                    <a href="http://localhost:3000/order/{order._id}" style="display: inline-block; background-color: #0dcaf0; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">Track Order</a>
-                </div>
-                
-                <div class="footer">
-                    <p>If you have any questions, please contact us at support@mamigloexclusive.com</p>
-                    <p>&copy; 2025 mamigloexclusive. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-    </html>
-    """
-    
-    send_mail(
-        subject,
-        f"Your order #{order._id} has been shipped",
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        html_message=html_message,
-        fail_silently=True,
-    )
+    _send('order_shipped', order, user, tracking_number=tracking_number)
 
 
 def send_transfer_payment_reminder_email(order, user):
     """Send reminder for bank transfer payment"""
-    subject = f"Payment Reminder - Bank Transfer for Order #{order._id}"
-    
-    html_message = f"""
-    <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; background-color: #f5f5f5; }}
-                .container {{ max-width: 600px; margin: 20px auto; background-color: white; padding: 20px; border-radius: 8px; }}
-                .header {{ border-bottom: 2px solid #ffc107; padding-bottom: 10px; margin-bottom: 20px; }}
-                .header h1 {{ color: #ffc107; margin: 0; }}
-                .order-details {{ background-color: #fff8e1; padding: 15px; border-radius: 5px; margin: 15px 0; }}
-                .footer {{ background-color: #f5f5f5; padding: 20px; border-radius: 5px; margin-top: 20px; text-align: center; }}
-                .footer p {{ margin: 5px 0; font-size: 12px; color: #666; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>⏰ Payment Pending</h1>
-                </div>
-                
-                <p>Hello {user.first_name or user.username},</p>
-                <p>We're still waiting for your bank transfer payment for order #{order._id}.</p>
-                
-                <div class="order-details">
-                    <p><strong>Order Number:</strong> #{order._id}</p>
-                    <p><strong>Amount Due:</strong> ${order.totalPrice:.2f}</p>
-                    <p>Please complete your transfer to activate this order. You can view the bank details in your order page.</p>
-                </div>
-                
-                <div style="text-align: center;">
-                    <a href="http://localhost:3000/order/{order._id}" style="display: inline-block; background-color: #0dcaf0; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">Complete Payment</a>
-                </div>
-                
-                <div class="footer">
-                    <p>If you have any questions, please contact us at support@mamigloexclusive.com</p>
-                    <p>&copy; 2025 mamigloexclusive. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-    </html>
+    _send('transfer_reminder', order, user, orders=[_due_order(order)])
+
+
+def transfer_reminder_candidates(now=None, interval=None, min_age=None):
+    """Unpaid bank-transfer orders due a reminder, grouped by customer, oldest first.
+
+    Customers reminded within ``interval`` are excluded, as are orders
+    younger than ``min_age`` and transfers the customer already confirmed.
     """
-    
-    send_mail(
-        subject,
-        f"Payment reminder for order #{order._id}",
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        html_message=html_message,
-        fail_silently=True,
+    from .models import Order
+    now = now or timezone.now()
+    if interval is None:
+        interval = timedelta(hours=getattr(settings, 'TRANSFER_REMINDER_INTERVAL_HOURS', 48))
+    if min_age is None:
+        min_age = timedelta(hours=getattr(settings, 'TRANSFER_REMINDER_MIN_AGE_HOURS', 24))
+    recently_reminded = Order.objects.filter(transferRemindedAt__gt=now - interval).values('user_id')
+    return (
+        Order.objects.filter(
+            paymentMethod='Transfer', isPaid=False, transferConfirmed=False,
+            transferConfirmedAt__isnull=True, status='pending',
+            user__isnull=False, created_at__lte=now - min_age,
+        )
+        .exclude(user__in=recently_reminded)
+        .only('_id', 'user', 'totalPrice', 'shippingPrice', 'taxPrice')
+        .order_by('user', '_id')
     )
+
+
+def render_transfer_reminders(groups):
+    """Yield ``queue_mass_mail`` tuples, one reminder per group of a customer's due orders.
+
+    Each group is a list of one customer's orders, oldest first; the email is
+    addressed from the first and lists them all. Users load in one query.
+    """
+    prefetch_related_objects([orders[0] for orders in groups], 'user')
+    for orders in groups:
+        user = orders[0].user
+        context = order_context(orders[0], user, details=False, orders=[_due_order(order) for order in orders])
+        subject, text_message, html_message = render_email('transfer_reminder', context)
+        yield subject, text_message, settings.DEFAULT_FROM_EMAIL, [user.email], html_message
+
+
+def queue_transfer_reminders(batch_size=500, limit=None, dry_run=False, **window):
+    """Queue one transfer reminder per due customer; returns the number queued.
+
+    ``window`` is passed to ``transfer_reminder_candidates``. A reminder
+    lists every due order of its customer; ``batch_size`` customers are
+    rendered in one pass and queued with their orders' ``transferRemindedAt``
+    update in a single transaction.
+    """
+    from .models import Order
+    now = window.setdefault('now', timezone.now())
+    queued, batch = 0, []
+
+    def flush(batch):
+        if dry_run:
+            return len(batch)
+        with transaction.atomic():
+            rows = queue_mass_mail(render_transfer_reminders(batch))
+            Order.objects.filter(pk__in=[order.pk for orders in batch for order in orders]).update(
+                transferRemindedAt=now,
+            )
+        return len(rows)
+
+    candidates = transfer_reminder_candidates(**window).iterator(chunk_size=batch_size)
+    for _, orders in itertools.groupby(candidates, key=attrgetter('user_id')):
+        batch.append(list(orders))
+        if limit is not None and queued + len(batch) >= limit:
+            break
+        if len(batch) >= batch_size:
+            queued += flush(batch)
+            batch = []
+    if batch:
+        queued += flush(batch)
+    return queued
@@ -0,0 +1,78 @@
+"""
+Facet counts for the storefront filter sidebar.
+
+All four facets are computed from a single GROUP BY over (category, brand,
+price band, rating band) for the filtered product set, then folded into
+per-facet counts in Python.
+"""
+from collections import Counter
+
+from django.db.models import Case, Count, IntegerField, Value, When
+
+
+# Upper bounds of the price bands in the base currency; the last band is open-ended.
+PRICE_BANDS = (25, 50, 100, 250, 500)
+
+# Rating facets are "N stars & up", so they are reported cumulatively.
+RATING_BANDS = (4, 3, 2, 1)
+
+# Query parameters that only affect paging and never change facet counts.
+PAGING_PARAMS = ('page', 'page_size', 'pagination', 'cursor', 'count', 'sort')
+
+
+def _price_band_case():
+    whens = [When(priceBase__lt=bound, then=Value(i)) for i, bound in enumerate(PRICE_BANDS)]
+    return Case(*whens, default=Value(len(PRICE_BANDS)), output_field=IntegerField())
+
+
+def _rating_band_case():
+    whens = [When(rating__gte=band, then=Value(band)) for band in RATING_BANDS]
+    return Case(*whens, default=Value(0), output_field=IntegerField())
+
+
+def price_band_label(index):
+    lower = PRICE_BANDS[index - 1] if index > 0 else 0
+    upper = PRICE_BANDS[index] if index < len(PRICE_BANDS) else None
+    return {'min': lower, 'max': upper}
+
+
+def compute_facets(queryset):
+    """Return category, brand, price band and rating facet counts for ``queryset``."""
+    rows = (
+        queryset.order_by()
+        .annotate(price_band=_price_band_case(), rating_band=_rating_band_case())
+        .values('category', 'brand', 'price_band', 'rating_band')
+        .annotate(n=Count('pk'))
+    )
+    categories, brands, prices, ratings = Counter(), Counter(), Counter(), Counter()
+    total = 0
+    for row in rows:
+        n = row['n']
+        total += n
+        if row['category']:
+            categories[row['category']] += n
+        if row['brand']:
+            brands[row['brand']] += n
+        prices[row['price_band']] += n
+        ratings[row['rating_band']] += n
+
+    return {
+        'total': total,
+        'category': [{'value': k, 'count': v} for k, v in categories.most_common()],
+        'brand': [{'value': k, 'count': v} for k, v in brands.most_common()],
+        'price': [
+            {**price_band_label(i), 'count': prices[i]}
+            for i in range(len(PRICE_BANDS) + 1) if prices[i]
+        ],
+        'rating': [
+            {'min': band, 'count': sum(v for b, v in ratings.items() if b >= band)}
+            for band in RATING_BANDS
+        ],
+    }
+
+
+def facet_cache_key(listing_key):
+    """Derive the facet cache key from the listing's normalized filter key."""
+    if listing_key is None:
+        return None
+    return ('facets',) + tuple(item for item in listing_key if item[0] not in PAGING_PARAMS)
@@ -0,0 +1,85 @@
+"""
+Sparse fieldsets: ``?fields=a,b`` / ``?omit=c`` on list and detail endpoints.
+
+Serializers using ``DynamicFieldsMixin`` drop the unselected fields, and
+``fieldset_queryset`` narrows the SQL to match: only the columns behind the
+remaining fields are selected (``only()``) and reverse relations such as
+``orderitems`` are prefetched only when they are still part of the output.
+Serializer fields that are not model fields can list the columns they read
+in ``Meta.field_dependencies``.
+"""
+from django.core.exceptions import FieldDoesNotExist
+
+
+def _names(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def parse_fieldset(request):
+    """Return ``{'fields': [...] or None, 'omit': [...]}`` from the query string."""
+    fields = request.query_params.get('fields')
+    return {'fields': _names(fields) if fields else None, 'omit': _names(request.query_params.get('omit'))}
+
+
+def fieldset_key(fields=None, omit=()):
+    """Hashable, order-independent key for a fieldset (for caches and ETags)."""
+    return (tuple(sorted(fields)) if fields is not None else None, tuple(sorted(omit or ())))
+
+
+def select_fields(available, fields=None, omit=()):
+    """Names from ``available`` kept by the ``fields``/``omit`` selection, in order."""
+    keep = [name for name in available if fields is None or name in fields]
+    return [name for name in keep if name not in set(omit or ())]
+
+
+class DynamicFieldsMixin:
+    """Serializer mixin accepting ``fields=`` and ``omit=`` keyword arguments."""
+
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and not omit:
+            return
+        kept = set(select_fields(self.fields, fields, omit))
+        for name in list(self.fields):
+            if name not in kept:
+                self.fields.pop(name)
+
+
+def fieldset_plan(serializer, model):
+    """Return ``(columns, relations)`` read by the serializer's remaining fields."""
+    dependencies = getattr(serializer.Meta, 'field_dependencies', {})
+    columns, relations = {model._meta.pk.name}, []
+    for name, field in serializer.fields.items():
+        if name in dependencies:
+            columns.update(dependencies[name])
+            continue
+        source = name if field.source == '*' else field.source.split('.')[0]
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            continue
+        if model_field.concrete and not model_field.many_to_many:
+            columns.add(model_field.name)
+        elif model_field.is_relation:
+            relations.append(source)
+    return columns, relations
+
+
+def fieldset_queryset(queryset, serializer_class, fields=None, omit=(), extra=()):
+    """Restrict ``queryset`` to the columns and relations the fieldset needs.
+
+    ``extra`` names columns the view reads itself (e.g. ``updated_at`` for an
+    ETag); ordering columns are kept so cursors never hit deferred fields.
+    """
+    serializer = serializer_class(fields=fields, omit=omit)
+    model = queryset.model
+    columns, relations = fieldset_plan(serializer, model)
+    columns.update(extra)
+    for name in queryset.query.order_by:
+        name = name.lstrip('-') if isinstance(name, str) else ''
+        if name and '__' not in name and name not in queryset.query.annotations:
+            columns.add(model._meta.pk.name if name == 'pk' else name)
+    queryset = queryset.only(*columns)
+    if relations:
+        queryset = queryset.prefetch_related(*relations)
+    return queryset
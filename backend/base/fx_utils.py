@@ -0,0 +1,117 @@
+"""
+Multi-currency prices normalized to one reference currency.
+
+``ExchangeRate`` rows (loaded with ``python manage.py load_fx_rates``) give
+the units of each currency per unit of ``settings.BASE_CURRENCY``. Every
+product keeps ``priceBase`` = ``price`` converted to the base currency: set
+on save by a ``pre_save`` handler, by the bulk import/update paths, and
+recomputed for the whole catalog with one ``UPDATE`` per currency whenever
+the rates change. Listing filters and price sorts use ``priceBase`` (and its
+index); ``?currency=`` converts a result page for display.
+
+Currencies without a loaded rate fall back to 1:1, which is how prices were
+compared before rates existed.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .cache_utils import LRUCache, bump_version, get_version, CATALOG
+
+
+CENT = Decimal('0.01')
+_rates_cache = LRUCache(1)
+
+
+def base_currency():
+    return getattr(settings, 'BASE_CURRENCY', 'USD')
+
+
+def get_rates(version=None):
+    """``{currency: rate}`` for the current catalog version, cached per worker."""
+    version = get_version(CATALOG) if version is None else version
+    rates = _rates_cache.get('rates', version)
+    if rates is None:
+        from .models import ExchangeRate
+        rates = dict(ExchangeRate.objects.values_list('currency', 'rate'))
+        rates[base_currency()] = Decimal(1)
+        _rates_cache.set('rates', rates, version)
+    return rates
+
+
+def to_base(amount, currency, rates):
+    if amount is None:
+        return None
+    rate = rates.get(currency) or Decimal(1)
+    return (Decimal(amount) / rate).quantize(CENT)
+
+
+def from_base(amount, currency, rates):
+    if amount is None:
+        return None
+    rate = rates.get(currency) or Decimal(1)
+    return (Decimal(amount) * rate).quantize(CENT)
+
+
+def convert_page(items, currency, rates):
+    """Add ``displayPrice``/``displayCurrency`` to serialized products in place.
+
+    One factor per source currency is computed up front, so the page is
+    converted in a single pass regardless of its size.
+    """
+    target = rates.get(currency) or Decimal(1)
+    factors = {source: target / rate for source, rate in rates.items()}
+    for item in items:
+        try:
+            price = Decimal(str(item['price']))
+        except (KeyError, TypeError, InvalidOperation):
+            continue
+        factor = factors.get(item.get('priceCurrency'), target)
+        item['displayPrice'] = str((price * factor).quantize(CENT))
+        item['displayCurrency'] = currency
+    return items
+
+
+def reprice_products(rates=None):
+    """Recompute ``priceBase`` where it changed; returns the rows touched.
+
+    Rows whose ``priceBase`` already matches are left alone, so their
+    ``updated_at`` (and with it detail ETags and cached copies) only moves
+    when the normalized price actually does.
+    """
+    from .models import Product
+    if rates is None:
+        from .models import ExchangeRate
+        rates = dict(ExchangeRate.objects.values_list('currency', 'rate'))
+    rates = {currency: rate for currency, rate in rates.items() if currency != base_currency()}
+    output = DecimalField(max_digits=14, decimal_places=2)
+    now = timezone.now()
+    touched = 0
+    with transaction.atomic():
+        for currency, rate in rates.items():
+            price_base = Round(ExpressionWrapper(F('price') / Value(rate), output_field=output), 2)
+            touched += Product.objects.filter(priceCurrency=currency).exclude(priceBase=price_base).update(
+                priceBase=price_base, updated_at=now,
+            )
+        touched += Product.objects.exclude(priceCurrency__in=list(rates)).exclude(priceBase=F('price')).update(
+            priceBase=F('price'), updated_at=now,
+        )
+    # .update() skips signals, so invalidate explicitly; the version also keys
+    # the cached rates, which changed even when no priceBase did
+    from .catalog_utils import product_detail_cache
+    bump_version(CATALOG)
+    product_detail_cache.refresh()
+    return touched
+
+
+def load_rates(rates):
+    """Upsert ``{currency: rate}`` and reprice the catalog; returns the rows touched."""
+    from .models import ExchangeRate
+    with transaction.atomic():
+        for currency, rate in rates.items():
+            ExchangeRate.objects.update_or_create(currency=currency, defaults={'rate': rate})
+        return reprice_products()
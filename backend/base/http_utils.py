@@ -0,0 +1,37 @@
+"""
+Conditional GET helpers (ETag / Last-Modified / 304 Not Modified).
+
+Views compute their validators from cheap metadata (a row's ``updated_at``
+or a cache version) before doing any serialization, and return early with
+``304`` when the client's copy is still current.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """Return a strong, quoted ETag derived from ``parts``."""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def not_modified(request, etag, last_modified=None):
+    """Return a 304 response if the request's validators match, else ``None``."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def set_validators(response, etag, last_modified=None, private=False):
+    """Attach ETag / Last-Modified so clients can revalidate the response."""
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    return response
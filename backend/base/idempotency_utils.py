@@ -0,0 +1,117 @@
+"""
+``Idempotency-Key`` support for retried writes.
+
+A client that may retry a request (e.g. on a flaky mobile network) sends the
+same ``Idempotency-Key`` header on every attempt. The first attempt claims
+the key in ``IdempotencyKey`` together with a fingerprint of the request and
+stores the response once the view returns; later attempts with the same key
+get that stored response replayed (marked ``Idempotent-Replayed: true``)
+instead of running the view again. Keys are scoped to the user and expire
+after ``IDEMPOTENCY_KEY_TTL_HOURS``; ``python manage.py
+purge_idempotency_keys`` deletes expired rows through the ``expires_at``
+index.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+UNSAFE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def key_ttl():
+    return timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def request_fingerprint(request):
+    """SHA-256 over the method, path and canonical JSON body of ``request``."""
+    try:
+        body = request.data.dict() if hasattr(request.data, 'dict') else request.data
+    except Exception:
+        body = None
+    payload = json.dumps([request.method, request.path, body], sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _claim(user, key, fingerprint):
+    """Return ``(record, created)`` for ``key``, replacing an expired record."""
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.filter(user=user, key=key, expires_at__lte=now).delete()
+            record = IdempotencyKey.objects.create(
+                user=user, key=key, fingerprint=fingerprint, expires_at=now + key_ttl(),
+            )
+        return record, True
+    except IntegrityError:
+        return IdempotencyKey.objects.get(user=user, key=key), False
+
+
+def _replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return Response(
+            {'detail': f'{HEADER} was already used for a different request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.status_code is None:
+        return Response(
+            {'detail': f'A request with this {HEADER} is still being processed'},
+            status=status.HTTP_409_CONFLICT,
+        )
+    response = Response(record.response, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Make unsafe requests to a function view replayable by ``Idempotency-Key``.
+
+    Apply below ``@api_view``/``@permission_classes`` so only authorized
+    requests can claim keys. Server errors release the key so the client
+    can retry; every other response is stored and replayed.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or request.method not in UNSAFE_METHODS:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({'detail': f'{HEADER} is too long'}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user if request.user and request.user.is_authenticated else None
+        fingerprint = request_fingerprint(request)
+        record, created = _claim(user, key, fingerprint)
+        if not created:
+            return _replay(record, fingerprint)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500 or not hasattr(response, 'data'):
+            record.delete()
+            return response
+        record.status_code = response.status_code
+        record.response = response.data
+        record.save(update_fields=['status_code', 'response'])
+        return response
+    return wrapper
+
+
+def purge_expired_keys():
+    """Delete expired keys; returns the number removed."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
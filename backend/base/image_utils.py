@@ -0,0 +1,133 @@
+"""
+Product image derivatives.
+
+After a product image is uploaded, resized WebP and JPEG variants (thumb,
+card, full) are rendered in a background thread and stored under
+content-hashed names in ``MEDIA_ROOT/variants/``. Because a file's name
+changes whenever its bytes do, those URLs are served with year-long
+``immutable`` cache headers. ``Product.imageVariants`` records the storage
+paths together with the source image they were built from.
+"""
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .cache_utils import bump_version, CATALOG
+from .catalog_utils import product_detail_cache
+
+
+VARIANT_DIR = 'variants'
+VARIANT_SIZES = {
+    'thumb': (200, 200),
+    'card': (600, 600),
+    'full': (1600, 1600),
+}
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2))
+
+
+def needs_variants(product):
+    image = product.image
+    if not image or not image.name or image.name.startswith('/'):
+        # No upload, or the '/placeholder.png' default that lives outside storage
+        return False
+    return (product.imageVariants or {}).get('source') != image.name
+
+
+def render_variants(source_file):
+    """Render every variant of ``source_file``; returns ``{size: {fmt: path}}``."""
+    from PIL import Image, ImageOps
+
+    with Image.open(source_file) as original:
+        original = ImageOps.exif_transpose(original)
+        original.load()
+    variants = {}
+    for size_name, box in VARIANT_SIZES.items():
+        resized = original.copy()
+        resized.thumbnail(box, Image.LANCZOS)
+        variants[size_name] = {}
+        for fmt_name, (pil_format, options) in VARIANT_FORMATS.items():
+            image = resized
+            if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            buffer = io.BytesIO()
+            image.save(buffer, pil_format, **options)
+            data = buffer.getvalue()
+            digest = hashlib.sha256(data).hexdigest()[:20]
+            path = f'{VARIANT_DIR}/{digest}.{fmt_name}'
+            if not default_storage.exists(path):
+                default_storage.save(path, ContentFile(data))
+            variants[size_name][fmt_name] = path
+    return variants
+
+
+def build_product_variants(product_id):
+    """Generate and record variants for one product; returns True if updated."""
+    from .models import Product
+
+    product = Product.objects.filter(_id=product_id).only('_id', 'image', 'imageVariants').first()
+    if product is None or not needs_variants(product):
+        return False
+    source = product.image.name
+    with default_storage.open(source, 'rb') as f:
+        variants = render_variants(f)
+    variants['source'] = source
+
+    with transaction.atomic():
+        # Skip the write if a newer upload replaced the image meanwhile
+        updated = Product.objects.filter(_id=product_id, image=source).update(
+            imageVariants=variants, updated_at=timezone.now(),
+        )
+        if updated:
+            bump_version(CATALOG)
+    if updated:
+        product_detail_cache.refresh(product_id)
+    return bool(updated)
+
+
+def _build_in_background(product_id):
+    try:
+        build_product_variants(product_id)
+    except Exception as e:
+        print(f"Error generating image variants for product {product_id}: {e}")
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(product):
+    """Queue variant generation once the current transaction commits."""
+    if not needs_variants(product):
+        return
+    product_id = product._id
+    if getattr(settings, 'IMAGE_VARIANTS_ASYNC', True):
+        transaction.on_commit(lambda: _executor.submit(_build_in_background, product_id))
+    else:
+        transaction.on_commit(lambda: build_product_variants(product_id))
+
+
+def variant_urls(product):
+    """Public URLs for a product's variants: ``{size: {fmt: url}}``."""
+    variants = product.imageVariants or {}
+    return {
+        size: {fmt: default_storage.url(path) for fmt, path in formats.items()}
+        for size, formats in variants.items() if size in VARIANT_SIZES
+    }
+
+
+def product_image_url(product, size='card'):
+    """Best URL for ``size``: the JPEG variant when built, else the original."""
+    path = ((product.imageVariants or {}).get(size) or {}).get('jpeg')
+    if path:
+        return default_storage.url(path)
+    return product.image.url if product.image else ''
@@ -0,0 +1,143 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from base.email_utils import order_context, render_email, render_order_emails
+from base.models import Order, OrderItem, ShippingAddress
+
+
+def legacy_order_confirmation_html(order, user, items):
+    """The f-string order confirmation body the templates replaced, kept for comparison."""
+    html_message = f"""
+    <html>
+        <head>
+            <style>
+                body {{ font-family: Arial, sans-serif; background-color: #f5f5f5; }}
+                .container {{ max-width: 600px; margin: 20px auto; background-color: white; padding: 20px; border-radius: 8px; }}
+                .header {{ border-bottom: 2px solid #0dcaf0; padding-bottom: 10px; margin-bottom: 20px; }}
+                .header h1 {{ color: #333; margin: 0; }}
+                .order-details {{ background-color: #f9f9f9; padding: 15px; border-radius: 5px; margin: 15px 0; }}
+                .order-details p {{ margin: 5px 0; }}
+                .items-table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
+                .items-table th, .items-table td {{ padding: 10px; border-bottom: 1px solid #ddd; text-align: left; }}
+                .items-table th {{ background-color: #0dcaf0; color: white; }}
+                .total {{ font-weight: bold; font-size: 18px; color: #333; }}
+                .footer {{ background-color: #f5f5f5; padding: 20px; border-radius: 5px; margin-top: 20px; text-align: center; }}
+                .footer p {{ margin: 5px 0; font-size: 12px; color: #666; }}
+                .button {{ display: inline-block; background-color: #0dcaf0; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; margin: 10px 0; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>Thank you for your order!</h1>
+                    <p>Order #<strong>{order._id}</strong></p>
+                </div>
+                <p>Hello {user.first_name or user.username},</p>
+                <div class="order-details">
+                    <h3>Shipping Address</h3>
+                    <p>{order.shippingaddress.address}</p>
+                    <p>{order.shippingaddress.city}, {order.shippingaddress.postalCode}</p>
+                    <p>{order.shippingaddress.country}</p>
+                </div>
+                <table class="items-table">
+                    <tbody>
+    """
+    for item in items:
+        item_total = item.price * item.qty
+        html_message += f"""
+                        <tr>
+                            <td>{item.name}</td>
+                            <td>{item.qty}</td>
+                            <td>${item.price:.2f}</td>
+                            <td>${item_total:.2f}</td>
+                        </tr>
+        """
+    html_message += f"""
+                    </tbody>
+                </table>
+                <div class="order-details">
+                    <p><strong>Subtotal:</strong> ${order.totalPrice - order.shippingPrice - order.taxPrice:.2f}</p>
+                    <p><strong>Shipping:</strong> ${order.shippingPrice:.2f}</p>
+                    <p><strong>Tax:</strong> ${order.taxPrice:.2f}</p>
+                    <p class="total"><strong>Total:</strong> ${order.totalPrice:.2f}</p>
+                </div>
+                <a href="http://localhost:3000/order/{order._id}" class="button">View Order Status</a>
+            </div>
+        </body>
+    </html>
+    """
+    return html_message
+
+
+class Command(BaseCommand):
+    help = 'Compare per-email render time of the legacy f-string emails with the compiled templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=2000, help='Emails rendered per variant')
+        parser.add_argument('--items', type=int, default=5, help='Items per order')
+        parser.add_argument('--db', action='store_true',
+                            help='Also time per-order rendering from the database against render_order_emails '
+                                 '(sample rows are rolled back)')
+
+    def sample_orders(self, count, items_per_order):
+        user = User(username='bench', first_name='Bench')
+        orders = []
+        for i in range(1, count + 1):
+            order = Order(_id=i, totalPrice=Decimal('120.00'), shippingPrice=Decimal('10.00'), taxPrice=Decimal('5.00'))
+            order.shippingaddress = ShippingAddress(address=f'{i} Main St', city='Lagos', postalCode='100001', country='NG')
+            items = [OrderItem(name=f'Product {n}', qty=n + 1, price=Decimal('9.99')) for n in range(items_per_order)]
+            orders.append((order, items))
+        return user, orders
+
+    def timed(self, label, func, orders, baseline=None):
+        start = time.perf_counter()
+        for order, items in orders:
+            func(order, items)
+        per_email = (time.perf_counter() - start) / len(orders) * 1e6
+        speedup = f' ({baseline / per_email:.2f}x legacy)' if baseline else ''
+        self.stdout.write(f'{label:<32}{per_email:>10.1f} us/email{speedup}')
+        return per_email
+
+    def handle(self, *args, **options):
+        user, orders = self.sample_orders(max(options['count'], 1), options['items'])
+        # Warm up the template cache so the loop measures rendering only
+        render_email('order_confirmation', order_context(*orders[0][:1], user, orders[0][1]))
+
+        legacy = self.timed('legacy f-string (HTML only)', lambda o, i: legacy_order_confirmation_html(o, user, i), orders)
+        self.timed('template HTML + text', lambda o, i: render_email('order_confirmation', order_context(o, user, i)),
+                   orders, legacy)
+        if options['db']:
+            self.compare_from_database(orders)
+        self.stdout.write(self.style.SUCCESS(f'Rendered {len(orders)} order confirmations per variant'))
+
+    def compare_from_database(self, orders):
+        with transaction.atomic():
+            user = User.objects.create(username='email-benchmark', first_name='Bench')
+            saved = Order.objects.bulk_create([
+                Order(user=user, totalPrice=o.totalPrice, shippingPrice=o.shippingPrice, taxPrice=o.taxPrice)
+                for o, _ in orders
+            ])
+            ShippingAddress.objects.bulk_create([
+                ShippingAddress(order=order, address=o.shippingaddress.address, city='Lagos', country='NG')
+                for order, (o, _) in zip(saved, orders)
+            ])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, name=item.name, qty=item.qty, price=item.price)
+                for order, (_, items) in zip(saved, orders) for item in items
+            ])
+            ids = [order._id for order in saved]
+
+            # Before: each email loaded its own user, items and address
+            per_order = [(order, None) for order in Order.objects.filter(_id__in=ids)]
+            legacy = self.timed('legacy from DB, one by one', lambda o, i: legacy_order_confirmation_html(
+                o, o.user, o.orderitems.all()), per_order)
+            start = time.perf_counter()
+            render_order_emails('order_confirmation', Order.objects.filter(_id__in=ids))
+            per_email = (time.perf_counter() - start) / len(ids) * 1e6
+            self.stdout.write(f'{"render_order_emails (batch)":<32}{per_email:>10.1f} us/email '
+                              f'({legacy / per_email:.2f}x one by one)')
+            transaction.set_rollback(True)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from base.image_utils import build_product_variants, needs_variants
+from base.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generate missing or stale resized image variants for products'
+
+    def handle(self, *args, **options):
+        built = failed = 0
+        for product in Product.objects.only('_id', 'image', 'imageVariants').iterator(chunk_size=500):
+            if not needs_variants(product):
+                continue
+            try:
+                if build_product_variants(product._id):
+                    built += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Product {product._id}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Built variants for {built} products ({failed} failed)'))
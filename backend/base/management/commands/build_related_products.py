@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from base.recommend_utils import rebuild_copurchase_neighbors, default_top_n
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "frequently bought together" neighbour table from paid orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=None, help='Neighbours kept per product')
+
+    def handle(self, *args, **options):
+        top_n = options['top'] or default_top_n()
+        written = rebuild_copurchase_neighbors(top_n=top_n)
+        self.stdout.write(self.style.SUCCESS(f'Stored {written} neighbours (top {top_n} per product)'))
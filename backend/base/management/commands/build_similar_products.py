@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from base.recommend_utils import rebuild_similar_neighbors, default_top_n, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Rebuild content-based "similar products" neighbours (TF-IDF cosine) for the whole catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=None, help='Neighbours kept per product')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Products scored and written per batch')
+
+    def handle(self, *args, **options):
+        top_n = options['top'] or default_top_n()
+        started = time.monotonic()
+        written = rebuild_similar_neighbors(top_n=top_n, chunk_size=max(options['chunk_size'], 1))
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Stored {written} neighbours (top {top_n} per product) in {elapsed:.1f}s'))
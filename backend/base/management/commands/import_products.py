@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.bulk_utils import import_products, detect_format, FORMATS, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Stream-import products from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file to import')
+        parser.add_argument('--format', choices=FORMATS, help='Input format (default: from file extension)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        fmt = detect_format(filename=options['path'], explicit=options['format'])
+        try:
+            with open(options['path'], 'rb') as stream:
+                report = import_products(stream, fmt, batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['rows']} rows: {report['created']} created, {report['updated']} updated, "
+            f"{report['error_count']} rejected"
+        ))
@@ -0,0 +1,38 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.fx_utils import base_currency, load_rates, reprice_products
+
+
+class Command(BaseCommand):
+    help = 'Load exchange rates (units per 1 BASE_CURRENCY) from a CSV/JSON file or --rate and reprice products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='CSV with "currency,rate" rows or a JSON {"EUR": 0.92} object')
+        parser.add_argument('--rate', action='append', default=[], metavar='CUR=RATE',
+                            help='Rate given on the command line; may be repeated')
+
+    def read_file(self, path):
+        with open(path, newline='', encoding='utf-8') as handle:
+            if path.lower().endswith('.json'):
+                return json.load(handle).items()
+            return [row[:2] for row in csv.reader(handle) if row and row[0].strip().lower() != 'currency']
+
+    def handle(self, *args, **options):
+        pairs = list(self.read_file(options['path'])) if options['path'] else []
+        pairs += [item.split('=', 1) for item in options['rate']]
+        rates = {}
+        for currency, rate in pairs:
+            try:
+                rates[currency.strip().upper()] = Decimal(str(rate).strip())
+            except (InvalidOperation, ValueError):
+                raise CommandError(f'Invalid rate for {currency}: {rate}')
+            if rates[currency.strip().upper()] <= 0:
+                raise CommandError(f'Rate for {currency} must be positive')
+        touched = load_rates(rates) if rates else reprice_products()
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {len(rates)} rates against {base_currency()}; repriced {touched} products'
+        ))
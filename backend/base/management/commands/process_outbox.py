@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from base.outbox_utils import process_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbox emails in batches over one SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows claimed per batch (default OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new emails')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            totals = process_outbox(options['batch_size'], options['max_batches'])
+            if any(totals.values()) or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Sent {totals['sent']} emails, {totals['retried']} to retry, {totals['dead']} dead-lettered"
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from base.search_utils import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index from the Product table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to rebuild')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        count = rebuild_search_index(connection)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products ({connection.vendor})'))
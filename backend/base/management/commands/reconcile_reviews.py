@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from base.review_utils import reconcile_review_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute product rating, numReviews and ratingTotal from the Review table'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_review_aggregates()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {fixed} products'))
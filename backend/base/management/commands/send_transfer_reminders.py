@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from base.email_utils import queue_transfer_reminders
+from base.outbox_utils import process_outbox
+
+
+class Command(BaseCommand):
+    help = 'Remind customers with unpaid bank-transfer orders, at most once per TRANSFER_REMINDER_INTERVAL_HOURS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Customers reminded per transaction')
+        parser.add_argument('--limit', type=int, default=None, help='Queue at most this many reminders')
+        parser.add_argument('--dry-run', action='store_true', help='Count the customers due a reminder without queuing')
+        parser.add_argument('--no-send', action='store_true',
+                            help='Only queue the reminders; leave sending to the process_outbox worker')
+
+    def handle(self, *args, **options):
+        queued = queue_transfer_reminders(
+            batch_size=options['batch_size'], limit=options['limit'], dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{queued} customers are due a transfer reminder'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} transfer reminders'))
+        if queued and not options['no_send']:
+            totals = process_outbox()
+            self.stdout.write(self.style.SUCCESS(
+                f"Sent {totals['sent']} emails, {totals['retried']} to retry, {totals['dead']} dead-lettered"
+            ))
@@ -0,0 +1,61 @@
+# Full-text search index for products (FTS5 on SQLite, GIN tsvector on Postgres)
+
+from django.db import migrations
+
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS base_product_fts "
+    "USING fts5(name, brand, category, description, tokenize='porter unicode61')",
+    "INSERT INTO base_product_fts(base_product_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 5.0, 1.0)')",
+    "CREATE TRIGGER IF NOT EXISTS base_product_fts_ai AFTER INSERT ON base_product BEGIN "
+    "INSERT INTO base_product_fts(rowid, name, brand, category, description) "
+    "VALUES (new._id, new.name, new.brand, new.category, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS base_product_fts_ad AFTER DELETE ON base_product BEGIN "
+    "DELETE FROM base_product_fts WHERE rowid = old._id; END",
+    "CREATE TRIGGER IF NOT EXISTS base_product_fts_au AFTER UPDATE OF name, brand, category, description "
+    "ON base_product BEGIN "
+    "DELETE FROM base_product_fts WHERE rowid = old._id; "
+    "INSERT INTO base_product_fts(rowid, name, brand, category, description) "
+    "VALUES (new._id, new.name, new.brand, new.category, new.description); END",
+    "INSERT INTO base_product_fts(rowid, name, brand, category, description) "
+    "SELECT _id, name, brand, category, description FROM base_product",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS base_product_fts_ai',
+    'DROP TRIGGER IF EXISTS base_product_fts_ad',
+    'DROP TRIGGER IF EXISTS base_product_fts_au',
+    'DROP TABLE IF EXISTS base_product_fts',
+]
+POSTGRES_CREATE = [
+    "CREATE INDEX IF NOT EXISTS base_product_search_idx ON base_product USING GIN (("
+    "setweight(to_tsvector('english'::regconfig, COALESCE(\"name\", '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, COALESCE(\"brand\", '')), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, COALESCE(\"category\", '')), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, COALESCE(\"description\", '')), 'D')))",
+]
+POSTGRES_DROP = ['DROP INDEX IF EXISTS base_product_search_idx']
+
+
+def _run(schema_editor, statements):
+    with schema_editor.connection.cursor() as cursor:
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            cursor.execute(statement)
+
+
+def create_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_CREATE, 'postgresql': POSTGRES_CREATE})
+
+
+def drop_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_order_tracking'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.7 on 2026-10-18 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+                ('_id', models.AutoField(primary_key=True, serialize=False)),
+            ],
+        ),
+    ]
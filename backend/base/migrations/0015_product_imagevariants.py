@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0014_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='imageVariants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.7 on 2026-10-18 03:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def drop_duplicate_reviews(apps, schema_editor):
+    # Keep each user's first review of a product so the unique constraint can be added
+    Review = apps.get_model('base', 'Review')
+    duplicates = (
+        Review.objects.filter(user__isnull=False).values('product', 'user')
+        .annotate(keep=models.Min('_id'), reviews=models.Count('_id')).filter(reviews__gt=1)
+    )
+    for row in duplicates.iterator():
+        Review.objects.filter(product=row['product'], user=row['user']).exclude(_id=row['keep']).delete()
+
+
+def backfill_rating_totals(apps, schema_editor):
+    Product = apps.get_model('base', 'Product')
+    Review = apps.get_model('base', 'Review')
+
+    def aggregate(expression):
+        return models.Subquery(
+            Review.objects.filter(product=models.OuterRef('pk')).order_by()
+            .values('product').annotate(value=expression).values('value')[:1]
+        )
+
+    Product.objects.update(
+        numReviews=Coalesce(aggregate(models.Count('pk')), 0),
+        ratingTotal=Coalesce(aggregate(models.Sum('rating')), 0, output_field=models.IntegerField()),
+        rating=Coalesce(aggregate(models.Avg('rating')), 0,
+                        output_field=models.DecimalField(max_digits=10, decimal_places=2)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0015_product_imagevariants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='ratingTotal',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(drop_duplicate_reviews, migrations.RunPython.noop),
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', '-created_at', '-_id'], name='review_product_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('product', 'user'), name='review_product_user_unique'),
+        ),
+    ]
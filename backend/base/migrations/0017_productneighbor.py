@@ -0,0 +1,31 @@
+# Generated by Django 5.0.7 on 2026-10-18 03:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0016_review_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductNeighbor',
+            fields=[
+                ('kind', models.CharField(choices=[('copurchase', 'Frequently bought together')], default='copurchase', max_length=20)),
+                ('score', models.FloatField(default=0)),
+                ('_id', models.AutoField(primary_key=True, serialize=False)),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='base.product')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='base.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'kind', '-score', 'neighbor'], name='product_neighbor_rank_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productneighbor',
+            constraint=models.UniqueConstraint(fields=('product', 'kind', 'neighbor'), name='product_neighbor_unique'),
+        ),
+    ]
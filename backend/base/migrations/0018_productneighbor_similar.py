@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0017_productneighbor'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productneighbor',
+            name='kind',
+            field=models.CharField(choices=[('copurchase', 'Frequently bought together'), ('similar', 'Similar content')], default='copurchase', max_length=20),
+        ),
+    ]
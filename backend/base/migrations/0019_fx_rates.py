@@ -0,0 +1,44 @@
+# Generated by Django 5.0.7 on 2026-10-18 03:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_price_base(apps, schema_editor):
+    # No rates are loaded yet, so every price is its own base price (1:1)
+    apps.get_model('base', 'Product').objects.update(priceBase=F('price'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0018_productneighbor_similar'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('currency', models.CharField(max_length=10, unique=True)),
+                ('rate', models.DecimalField(decimal_places=8, max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('_id', models.AutoField(primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_price_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='priceBase',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True),
+        ),
+        migrations.RunPython(backfill_price_base, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['priceBase', '_id'], name='product_price_base_idx'),
+        ),
+    ]
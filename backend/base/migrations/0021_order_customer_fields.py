@@ -0,0 +1,49 @@
+# Generated by Django 5.0.7 on 2026-10-18 03:29
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_customer_fields(apps, schema_editor):
+    Order = apps.get_model('base', 'Order')
+    User = apps.get_model('auth', 'User')
+    for user in User.objects.filter(id__in=Order.objects.values('user_id')).iterator():
+        Order.objects.filter(user=user).update(
+            customerEmail=user.email or None,
+            customerName=f'{user.first_name} {user.last_name}'.strip() or user.username,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0020_idempotencykey'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='customerEmail',
+            field=models.CharField(blank=True, max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='customerName',
+            field=models.CharField(blank=True, max_length=300, null=True),
+        ),
+        migrations.RunPython(backfill_customer_fields, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(models.OrderBy(models.F('created_at'), descending=True), models.OrderBy(models.F('_id'), descending=True), name='order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(django.db.models.functions.text.Lower('customerEmail'), name='order_customer_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(django.db.models.functions.text.Lower('customerName'), name='order_customer_name_idx'),
+        ),
+    ]
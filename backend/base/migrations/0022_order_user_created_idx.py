@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-18 03:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0021_order_customer_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-_id'], name='order_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.7 on 2026-10-18 03:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_order_events(apps, schema_editor):
+    # Existing orders get a "created" event, plus their current status if it moved on
+    Order = apps.get_model('base', 'Order')
+    OrderEvent = apps.get_model('base', 'OrderEvent')
+    batch = []
+    for order in Order.objects.only('_id', 'status', 'created_at', 'updated_at').iterator(chunk_size=1000):
+        batch.append(OrderEvent(order_id=order._id, event='created', toStatus='pending', created_at=order.created_at))
+        if order.status != 'pending':
+            batch.append(OrderEvent(order_id=order._id, event='status', fromStatus='pending',
+                                    toStatus=order.status, created_at=order.updated_at))
+        if len(batch) >= 1000:
+            OrderEvent.objects.bulk_create(batch)
+            batch = []
+    OrderEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0022_order_user_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('event', models.CharField(choices=[('created', 'Created'), ('status', 'Status changed'), ('payment', 'Payment received'), ('tracking', 'Tracking updated')], max_length=20)),
+                ('fromStatus', models.CharField(blank=True, max_length=20, null=True)),
+                ('toStatus', models.CharField(blank=True, max_length=20, null=True)),
+                ('note', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('_id', models.AutoField(primary_key=True, serialize=False)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='base.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['order', 'created_at', '_id'], name='order_event_order_time_idx'), models.Index(fields=['created_at', 'order'], name='order_event_time_order_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_order_events, migrations.RunPython.noop),
+    ]
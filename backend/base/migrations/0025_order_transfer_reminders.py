@@ -0,0 +1,28 @@
+# Generated by Django 5.0.7 on 2026-10-18 03:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0024_outbox_email'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='transferRemindedAt',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('isPaid', False), ('paymentMethod', 'Transfer'), ('transferConfirmed', False)), fields=['user', '_id'], name='order_transfer_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('transferRemindedAt__isnull', False)), fields=['transferRemindedAt', 'user'], name='order_transfer_reminded_idx'),
+        ),
+    ]
@@ -1,5 +1,9 @@
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Product(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
@@ -10,6 +14,8 @@ class Product(models.Model):
     description = models.TextField( null=True, blank=True)
     rating = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, default=0)
     numReviews = models.IntegerField( default=0, null=True, blank=True)
+    # Sum of review ratings, so `rating` can be maintained per write (see base.review_utils)
+    ratingTotal = models.IntegerField(default=0)
     price = models.DecimalField(max_digits=10, decimal_places=2 , null=True, blank=True, default=0)
     priceCurrency = models.CharField(max_length=10, default='USD', choices=[
         ('USD', 'US Dollar'),
@@ -30,8 +36,24 @@ class Product(models.Model):
         ('MXN', 'Mexican Peso'),
     ])
     countInStock = models.IntegerField(  default=0, null=True, blank=True)
+    # `price` converted to settings.BASE_CURRENCY, used to filter and sort across currencies (see base.fx_utils)
+    priceBase = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    # Resized, content-hashed copies of `image` (see base.image_utils)
+    imageVariants = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     _id = models.AutoField(primary_key=True)
+
+    class Meta:
+        # Access paths used by the storefront listing filters and sorts
+        indexes = [
+            models.Index(F('created_at').desc(), F('_id').desc(), name='product_created_idx'),
+            models.Index(Lower('category'), F('created_at').desc(), name='product_category_lower_idx'),
+            models.Index(Lower('brand'), name='product_brand_lower_idx'),
+            models.Index(fields=['priceBase', '_id'], name='product_price_base_idx'),
+            models.Index(fields=['rating', '_id'], name='product_rating_idx'),
+            models.Index(F('created_at').desc(), name='product_in_stock_idx', condition=Q(countInStock__gt=0)),
+        ]
     
     def __str__(self):
         return self.name
@@ -45,6 +67,14 @@ class Review(models.Model):
     comment = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     _id = models.AutoField(primary_key=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'user'], name='review_product_user_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-_id'], name='review_product_created_idx'),
+        ]
     
     def __str__(self):
         return str(self.rating)
@@ -64,6 +94,8 @@ class Order(models.Model):
     # Transfer payment fields
     transferConfirmed = models.BooleanField(default=False)  # Admin confirmation for bank transfer
     transferConfirmedAt = models.DateTimeField(auto_now_add=False, null=True, blank=True)
+    # Last bank-transfer payment reminder (see the send_transfer_reminders command)
+    transferRemindedAt = models.DateTimeField(null=True, blank=True)
     # Order tracking status
     ORDER_STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -76,9 +108,30 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES, default='pending')
     tracking_number = models.CharField(max_length=100, null=True, blank=True)
     estimated_delivery = models.DateField(null=True, blank=True)
+    # Copied from `user` so admin search and listing never join auth_user (kept in sync by base.signals)
+    customerEmail = models.CharField(max_length=254, null=True, blank=True)
+    customerName = models.CharField(max_length=300, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     _id = models.AutoField(primary_key=True)
 
+    class Meta:
+        indexes = [
+            models.Index(F('created_at').desc(), F('_id').desc(), name='order_created_idx'),
+            models.Index(fields=['user', '-created_at', '-_id'], name='order_user_created_idx'),
+            models.Index(Lower('customerEmail'), name='order_customer_email_idx'),
+            models.Index(Lower('customerName'), name='order_customer_name_idx'),
+            # Unpaid bank-transfer orders, walked per customer by the reminder job
+            models.Index(
+                fields=['user', '_id'], name='order_transfer_due_idx',
+                condition=Q(paymentMethod='Transfer', isPaid=False, transferConfirmed=False),
+            ),
+            models.Index(
+                fields=['transferRemindedAt', 'user'], name='order_transfer_reminded_idx',
+                condition=Q(transferRemindedAt__isnull=False),
+            ),
+        ]
+
     def __str__(self):
         return str(self.created_at)
 
@@ -109,6 +162,44 @@ class ShippingAddress(models.Model):
         return str(self.address)
 
 
+class OrderEvent(models.Model):
+    """Append-only history of an order's status, payment and tracking changes (see base.order_utils)."""
+    CREATED = 'created'
+    STATUS = 'status'
+    PAYMENT = 'payment'
+    TRACKING = 'tracking'
+    EVENT_CHOICES = [
+        (CREATED, 'Created'),
+        (STATUS, 'Status changed'),
+        (PAYMENT, 'Payment received'),
+        (TRACKING, 'Tracking updated'),
+    ]
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    fromStatus = models.CharField(max_length=20, null=True, blank=True)
+    toStatus = models.CharField(max_length=20, null=True, blank=True)
+    note = models.CharField(max_length=255, blank=True, default='')
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    _id = models.AutoField(primary_key=True)
+
+    class Meta:
+        indexes = [
+            # One order's timeline is a single range read
+            models.Index(fields=['order', 'created_at', '_id'], name='order_event_order_time_idx'),
+            # "Orders changed since X" ranges over time first, then reads the order ids from the index
+            models.Index(fields=['created_at', 'order'], name='order_event_time_order_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Order events are append-only')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.order_id}: {self.event} {self.toStatus or ''}".strip()
+
+
 class ContactMessage(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     email = models.EmailField(max_length=200, null=True, blank=True)
@@ -132,3 +223,103 @@ class Wishlist(models.Model):
 
     def __str__(self):
         return f"Wishlist for {self.user.username}"
+
+
+class CacheVersion(models.Model):
+    """Shared invalidation counter; bumped whenever a cached data set changes."""
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    _id = models.AutoField(primary_key=True)
+
+    def __str__(self):
+        return f"{self.name}@{self.version}"
+
+
+class ProductNeighbor(models.Model):
+    """Precomputed top-N related products (see base.recommend_utils)."""
+    COPURCHASE = 'copurchase'
+    SIMILAR = 'similar'
+    KIND_CHOICES = [(COPURCHASE, 'Frequently bought together'), (SIMILAR, 'Similar content')]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=COPURCHASE)
+    score = models.FloatField(default=0)
+    _id = models.AutoField(primary_key=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'kind', 'neighbor'], name='product_neighbor_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'kind', '-score', 'neighbor'], name='product_neighbor_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.neighbor_id} ({self.kind}: {self.score})"
+
+
+class ExchangeRate(models.Model):
+    """Units of ``currency`` per one unit of settings.BASE_CURRENCY."""
+    currency = models.CharField(max_length=10, unique=True)
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+    updated_at = models.DateTimeField(auto_now=True)
+    _id = models.AutoField(primary_key=True)
+
+    def __str__(self):
+        return f"{self.currency}={self.rate}"
+
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a request made with an ``Idempotency-Key`` header (see base.idempotency_utils)."""
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    fingerprint = models.CharField(max_length=64)
+    # NULL while the first request is still being processed
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    _id = models.AutoField(primary_key=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code})"
+
+
+class OutboxEmail(models.Model):
+    """Email queued in the request's transaction and sent by ``process_outbox`` (see base.outbox_utils)."""
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead'),
+    ]
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True, default='')
+    html = models.TextField(null=True, blank=True)
+    from_email = models.CharField(max_length=254, null=True, blank=True)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    _id = models.AutoField(primary_key=True)
+
+    class Meta:
+        indexes = [
+            # The worker reads due pending rows in next_attempt_at order
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
@@ -0,0 +1,237 @@
+"""
+Order placement.
+
+An order is written in one transaction: all products are read with a single
+``in_bulk``, stock is reserved with one conditional ``UPDATE ... SET
+countInStock = countInStock - qty WHERE countInStock >= qty`` per product
+(in id order, so concurrent checkouts lock rows in the same order), and the
+items are inserted with ``bulk_create``. If any line cannot be reserved the
+whole order rolls back, so stock can never go negative and no partial order
+is left behind.
+
+Status changes go through ``transition_order``, which only allows the moves
+in ``TRANSITIONS`` and appends an ``OrderEvent`` row in the same
+transaction; ``advance_order`` walks the intermediate ``FULFILMENT`` stages
+for callers that only ask for the end state. The event table is never updated, so an order's timeline is a
+single range read on ``(order, created_at)``.
+
+Order history listings use ``order_summaries``: one grouped query returning
+each order's headline columns with its item count and first item image,
+instead of prefetching every item and shipping address.
+"""
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache_utils import bump_version, CATALOG
+from .catalog_utils import product_detail_cache
+from .image_utils import product_image_url
+from .models import Order, OrderEvent, OrderItem, Product, ShippingAddress
+
+
+class OrderError(ValueError):
+    """Raised when an order cannot be placed; the message is safe to show."""
+
+
+class OutOfStock(OrderError):
+    def __init__(self, product):
+        self.product = product
+        super().__init__(f'Not enough stock for {product.name}')
+
+
+class InvalidTransition(OrderError):
+    def __init__(self, order, to_status):
+        self.order = order
+        self.to_status = to_status
+        super().__init__(f"Cannot change order status from '{order.status}' to '{to_status}'")
+
+
+PENDING, PROCESSING, SHIPPED, DELIVERED, CANCELLED, REFUNDED = (
+    'pending', 'processing', 'shipped', 'delivered', 'cancelled', 'refunded',
+)
+TRANSITIONS = {
+    PENDING: {PROCESSING, CANCELLED, REFUNDED},
+    PROCESSING: {SHIPPED, CANCELLED, REFUNDED},
+    SHIPPED: {DELIVERED, REFUNDED},
+    DELIVERED: {REFUNDED},
+    CANCELLED: set(),
+    REFUNDED: set(),
+}
+# The forward path an order takes to delivery
+FULFILMENT = [PENDING, PROCESSING, SHIPPED, DELIVERED]
+
+
+def _quantities(order_items):
+    """Return ``{product_id: total_qty}``, merging repeated lines."""
+    quantities = {}
+    for item in order_items:
+        try:
+            product_id = int(item.get('product'))
+            qty = int(item.get('qty') or 0)
+        except (AttributeError, TypeError, ValueError):
+            raise OrderError('Each order item needs a product id and a quantity')
+        if qty < 1:
+            raise OrderError('Quantities must be at least 1')
+        quantities[product_id] = quantities.get(product_id, 0) + qty
+    return quantities
+
+
+def customer_fields(user):
+    """Denormalized ``Order`` customer columns for ``user``."""
+    if user is None:
+        return {'customerEmail': None, 'customerName': None}
+    name = f'{user.first_name} {user.last_name}'.strip() or user.username
+    return {'customerEmail': user.email or None, 'customerName': name}
+
+
+def record_event(order, event, actor=None, note='', from_status=None, to_status=None):
+    return OrderEvent.objects.create(
+        order=order, event=event, actor=actor, note=(note or '')[:255],
+        fromStatus=from_status, toStatus=to_status,
+    )
+
+
+def transition_order(order, to_status, actor=None, note=''):
+    """Move ``order`` to ``to_status`` and log it; raises ``InvalidTransition``.
+
+    The row is re-read under ``select_for_update`` so concurrent admins cannot
+    both apply a transition from the same state. Returns the updated order.
+    """
+    if to_status not in TRANSITIONS:
+        raise OrderError(f"Unknown order status '{to_status}'")
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        if to_status not in TRANSITIONS.get(order.status, ()):
+            raise InvalidTransition(order, to_status)
+        if to_status == REFUNDED and not order.isPaid:
+            raise OrderError('Cannot refund unpaid order')
+        from_status = order.status
+        order.status = to_status
+        if to_status == DELIVERED:
+            order.isDelivered = True
+            order.deliveredAt = timezone.now()
+        elif to_status == REFUNDED:
+            order.isRefunded = True
+        order.save()
+        record_event(order, OrderEvent.STATUS, actor, note, from_status, to_status)
+    return order
+
+
+def advance_order(order, to_status, actor=None, note=''):
+    """Move ``order`` forward to ``to_status`` through each fulfilment stage in between.
+
+    Every step is a ``transition_order`` call, so each is validated and
+    logged; the walk runs in one transaction and leaves nothing behind if a
+    step is refused. Statuses off the fulfilment path are a single transition.
+    """
+    steps = [to_status]
+    if order.status in FULFILMENT and to_status in FULFILMENT:
+        start, end = FULFILMENT.index(order.status), FULFILMENT.index(to_status)
+        if start < end:
+            steps = FULFILMENT[start + 1:end + 1]
+    with transaction.atomic():
+        for step in steps:
+            order = transition_order(order, step, actor, note)
+    return order
+
+
+def mark_paid(order, payment_result, actor=None, note=''):
+    """Record a payment on ``order``; returns True only the first time it becomes paid."""
+    with transaction.atomic():
+        was_paid = Order.objects.select_for_update().filter(pk=order.pk).values_list('isPaid', flat=True).first()
+        order.isPaid = True
+        order.paidAt = timezone.now()
+        order.paymentResult = payment_result
+        order.save()
+        if not was_paid:
+            record_event(order, OrderEvent.PAYMENT, actor, note, order.status, order.status)
+    return not was_paid
+
+
+def order_timeline(order, since=None):
+    """Events of ``order`` in time order, optionally only those after ``since``."""
+    events = OrderEvent.objects.filter(order=order)
+    if since is not None:
+        events = events.filter(created_at__gt=since)
+    return events.order_by('created_at', '_id').values('event', 'fromStatus', 'toStatus', 'note', 'created_at')
+
+
+def orders_changed_since(since):
+    """Ids of orders with any event after ``since``, read from the event time index."""
+    return OrderEvent.objects.filter(created_at__gt=since).values('order_id')
+
+
+def order_summaries(queryset):
+    """Annotate ``queryset`` with ``itemCount`` and ``firstItemImage`` for summary rows."""
+    first_image = OrderItem.objects.filter(order=OuterRef('pk')).order_by('_id').values('image')[:1]
+    return queryset.only(
+        '_id', 'created_at', 'status', 'isPaid', 'isDelivered', 'totalPrice',
+    ).annotate(
+        itemCount=Coalesce(Sum('orderitems__qty'), 0),
+        firstItemImage=Subquery(first_image),
+    )
+
+
+def _invalidate(product_ids):
+    # Stock was changed with .update(), which skips the model signals
+    bump_version(CATALOG)
+    for product_id in product_ids:
+        product_detail_cache.refresh(product_id)
+
+
+def place_order(user, data):
+    """Create an order with its items and shipping address, reserving stock."""
+    order_items = data.get('orderItems') or []
+    if len(order_items) == 0:
+        raise OrderError('No order items')
+    quantities = _quantities(order_items)
+
+    with transaction.atomic():
+        products = Product.objects.only(
+            '_id', 'name', 'image', 'imageVariants', 'countInStock'
+        ).in_bulk(list(quantities))
+        missing = sorted(set(quantities) - set(products))
+        if missing:
+            raise OrderError(f'Product {missing[0]} not found')
+
+        now = timezone.now()
+        for product_id in sorted(quantities):
+            reserved = Product.objects.filter(_id=product_id, countInStock__gte=quantities[product_id]).update(
+                countInStock=F('countInStock') - quantities[product_id], updated_at=now,
+            )
+            if not reserved:
+                raise OutOfStock(products[product_id])
+
+        order = Order.objects.create(
+            user=user,
+            **customer_fields(user),
+            paymentMethod=data.get('paymentMethod'),
+            taxPrice=data.get('taxPrice', 0),
+            shippingPrice=data.get('shippingPrice', 0),
+            totalPrice=data.get('totalPrice', 0),
+        )
+        items = []
+        for item in order_items:
+            product = products[int(item.get('product'))]
+            items.append(OrderItem(
+                product=product,
+                order=order,
+                name=product.name,
+                qty=int(item.get('qty')),
+                price=item.get('price'),
+                image=product_image_url(product, 'thumb'),
+            ))
+        OrderItem.objects.bulk_create(items)
+        record_event(order, OrderEvent.CREATED, user, to_status=order.status)
+        shipping = data.get('shippingAddress') or {}
+        ShippingAddress.objects.create(
+            order=order,
+            address=shipping.get('address'),
+            city=shipping.get('city'),
+            postalCode=shipping.get('postalCode'),
+            country=shipping.get('country'),
+        )
+        # robust: the order is committed either way, so a failed invalidation must not surface as an error
+        transaction.on_commit(lambda: _invalidate(sorted(quantities)), robust=True)
+    return order
@@ -0,0 +1,159 @@
+"""
+Transactional email outbox.
+
+Views never talk to SMTP. ``queue_mail`` takes ``send_mail``'s arguments
+(without ``fail_silently``) and inserts an ``OutboxEmail`` row, so when it
+is called inside the transaction that changed the order the email is
+committed or rolled back with it. The
+``process_outbox`` command drains due rows in batches over a single SMTP
+connection; a failed send is retried with exponential backoff
+(``OUTBOX_BACKOFF_SECONDS`` doubling up to ``OUTBOX_MAX_BACKOFF_SECONDS``)
+and dead-lettered after ``OUTBOX_MAX_ATTEMPTS``. Claimed rows are leased
+for ``LEASE_SECONDS`` so a crashed worker's batch is picked up again.
+"""
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+
+LEASE_SECONDS = 300
+# Errors after which the SMTP connection is reopened before the next message
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def queue_mail(subject, message, from_email, recipient_list, html_message=None):
+    """Queue an email for the outbox worker; returns the row, or None without recipients."""
+    recipients = [address for address in recipient_list or [] if address]
+    if not recipients:
+        return None
+    return OutboxEmail.objects.create(
+        subject=subject[:255], body=message or '', html=html_message,
+        from_email=from_email, to=recipients,
+    )
+
+
+def queue_mass_mail(datatuple):
+    """Queue ``(subject, message, from_email, recipient_list, html_message)`` tuples with one insert."""
+    rows = []
+    for subject, message, from_email, recipient_list, html_message in datatuple:
+        recipients = [address for address in recipient_list or [] if address]
+        if recipients:
+            rows.append(OutboxEmail(subject=subject[:255], body=message or '', html=html_message,
+                                    from_email=from_email, to=recipients))
+    return OutboxEmail.objects.bulk_create(rows)
+
+
+def backoff(attempts):
+    """Delay before retry number ``attempts`` (1-based)."""
+    base = _setting('OUTBOX_BACKOFF_SECONDS', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), _setting('OUTBOX_MAX_BACKOFF_SECONDS', 3600)))
+
+
+def claim_batch(batch_size):
+    """Lease up to ``batch_size`` due rows to this worker and count the attempt."""
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', '_id')[:batch_size]
+        )
+        if rows:
+            OutboxEmail.objects.filter(pk__in=[row.pk for row in rows]).update(
+                attempts=F('attempts') + 1, next_attempt_at=now + timedelta(seconds=LEASE_SECONDS),
+            )
+    for row in rows:
+        row.attempts += 1
+    return rows
+
+
+def _message(row, connection):
+    message = EmailMultiAlternatives(
+        row.subject, row.body, row.from_email or settings.DEFAULT_FROM_EMAIL, row.to, connection=connection,
+    )
+    if row.html:
+        message.attach_alternative(row.html, 'text/html')
+    return message
+
+
+def _fail(row, error, now):
+    """Schedule a retry for ``row``, or dead-letter it; returns True when dead."""
+    dead = row.attempts >= _setting('OUTBOX_MAX_ATTEMPTS', 8)
+    OutboxEmail.objects.filter(pk=row.pk).update(
+        status=OutboxEmail.DEAD if dead else OutboxEmail.PENDING,
+        next_attempt_at=now if dead else now + backoff(row.attempts),
+        last_error=f'{type(error).__name__}: {error}'[:2000],
+    )
+    return dead
+
+
+def send_batch(rows, connection):
+    """Send claimed ``rows`` over ``connection``; returns ``{'sent', 'retried', 'dead'}``."""
+    counts = {'sent': 0, 'retried': 0, 'dead': 0}
+    sent = []
+    for row in rows:
+        try:
+            _message(row, connection).send()
+            sent.append(row.pk)
+            counts['sent'] += 1
+        except Exception as e:
+            print(f"Error sending outbox email {row.pk}: {e}")
+            counts['dead' if _fail(row, e, timezone.now()) else 'retried'] += 1
+            if isinstance(e, CONNECTION_ERRORS):
+                connection.close()
+                try:
+                    connection.open()
+                except Exception as reopen_error:
+                    print(f"Error reopening SMTP connection: {reopen_error}")
+    if sent:
+        OutboxEmail.objects.filter(pk__in=sent).update(
+            status=OutboxEmail.SENT, sent_at=timezone.now(), last_error=None,
+        )
+    return counts
+
+
+def process_outbox(batch_size=None, max_batches=None, connection=None):
+    """Drain due outbox rows batch by batch over one SMTP connection.
+
+    The connection is opened when the first batch is claimed and closed at
+    the end. Returns the totals of ``send_batch``.
+    """
+    batch_size = batch_size or _setting('OUTBOX_BATCH_SIZE', 100)
+    totals = {'sent': 0, 'retried': 0, 'dead': 0}
+    opened = False
+    batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            rows = claim_batch(batch_size)
+            if not rows:
+                break
+            batches += 1
+            if not opened:
+                connection = connection or get_connection(fail_silently=False)
+                try:
+                    connection.open()
+                except Exception as e:
+                    # The server is unreachable: the whole batch backs off
+                    print(f"Error opening SMTP connection: {e}")
+                    now = timezone.now()
+                    for row in rows:
+                        totals['dead' if _fail(row, e, now) else 'retried'] += 1
+                    break
+                opened = True
+            for name, count in send_batch(rows, connection).items():
+                totals[name] += count
+    finally:
+        if opened:
+            connection.close()
+    return totals
@@ -0,0 +1,224 @@
+"""
+Pagination helpers shared by the list endpoints.
+
+Two modes are supported:
+
+- Page mode (default): the classic ``?page=&page_size=`` behaviour returning
+  ``results``/``count``/``num_pages``/``current_page`` for existing clients.
+- Cursor mode (``?pagination=cursor`` or ``?cursor=<token>``): keyset
+  pagination on the queryset ordering plus the primary key, so deep pages
+  cost the same as the first one and no ``COUNT(*)`` is issued unless asked.
+
+Either mode accepts ``?count=estimated`` to replace the exact ``COUNT(*)``
+with the planner's row estimate on Postgres (exact count elsewhere).
+"""
+import base64
+import datetime
+import json
+
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q
+
+
+# Below this many estimated rows an exact COUNT(*) is cheap enough to run.
+EXACT_COUNT_THRESHOLD = 1000
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client supplies a cursor that cannot be decoded."""
+
+
+def _param(request, name, default=None):
+    return request.query_params.get(name) or request.GET.get(name) or default
+
+
+def estimate_count(queryset):
+    """Return an approximate row count for ``queryset``.
+
+    On Postgres the planner estimate from ``EXPLAIN`` is used; small results
+    and other backends fall back to an exact ``COUNT(*)``.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < EXACT_COUNT_THRESHOLD:
+        return queryset.count()
+    return estimate
+
+
+def _count(queryset, mode):
+    if mode == 'estimated':
+        return estimate_count(queryset)
+    return queryset.count()
+
+
+def get_ordering(queryset):
+    """Return the queryset ordering with the primary key as final tie-breaker."""
+    pk_name = queryset.model._meta.pk.name
+    ordering = []
+    for name in queryset.query.order_by:
+        if not isinstance(name, str) or name == '?':
+            continue
+        if name.lstrip('-') == 'pk':
+            name = name.replace('pk', pk_name)
+        ordering.append(name)
+    if not ordering:
+        ordering = [f'-{pk_name}']
+    if pk_name not in {o.lstrip('-') for o in ordering}:
+        descending = ordering[0].startswith('-')
+        ordering.append(f'-{pk_name}' if descending else pk_name)
+    return ordering
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder truncates datetimes to milliseconds, which would make
+    # rows created within the same millisecond skip or repeat across pages.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _get_field(queryset, name):
+    """Return the model field for ``name``, or ``None`` for an annotation."""
+    if name in queryset.query.annotations:
+        return None
+    return queryset.model._meta.get_field(name)
+
+
+def decode_cursor(token, queryset, ordering):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor('Cursor does not match the current sort order')
+    decoded = []
+    for name, value in zip(ordering, values):
+        field = _get_field(queryset, name.lstrip('-'))
+        try:
+            if value is not None and field is not None:
+                value = field.to_python(value)
+            decoded.append(value)
+        except Exception:
+            raise InvalidCursor('Invalid cursor')
+    return decoded
+
+
+def _keyset_filter(queryset, ordering, values):
+    """Build the "strictly after" predicate for a row with ``values``.
+
+    NULLs are always sorted last, so a NULL key only continues into rows that
+    tie on it, and a non-NULL key on a nullable column also continues into
+    the NULL tail.
+    """
+    condition = None
+    equal = Q()
+    for name, value in zip(ordering, values):
+        field = name.lstrip('-')
+        if value is None:
+            equal &= Q(**{f'{field}__isnull': True})
+            continue
+        lookup = 'lt' if name.startswith('-') else 'gt'
+        after = Q(**{f'{field}__{lookup}': value})
+        model_field = _get_field(queryset, field)
+        if model_field is None or model_field.null:
+            after |= Q(**{f'{field}__isnull': True})
+        condition = (equal & after) if condition is None else condition | (equal & after)
+        equal &= Q(**{field: value})
+    return condition if condition is not None else Q(pk__in=[])
+
+
+def _order_expressions(queryset, ordering):
+    # Only nullable keys need NULLS LAST; plain ordering on NOT NULL columns
+    # lets the database walk an index instead of sorting.
+    expressions = []
+    for name in ordering:
+        field = _get_field(queryset, name.lstrip('-'))
+        if field is not None and not field.null:
+            expressions.append(name)
+        elif name.startswith('-'):
+            expressions.append(F(name[1:]).desc(nulls_last=True))
+        else:
+            expressions.append(F(name).asc(nulls_last=True))
+    return expressions
+
+
+def cursor_paginate(queryset, cursor, page_size, count_mode=None):
+    """Return ``(rows, meta)`` for one keyset page starting after ``cursor``."""
+    ordering = get_ordering(queryset)
+    meta = {'page_size': page_size}
+    if count_mode:
+        meta['count'] = _count(queryset, count_mode)
+
+    page_qs = queryset.order_by(*_order_expressions(queryset, ordering))
+    if cursor:
+        page_qs = page_qs.filter(_keyset_filter(queryset, ordering, decode_cursor(cursor, queryset, ordering)))
+
+    rows = list(page_qs[:page_size + 1])
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = None
+    if has_next and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, name.lstrip('-')) for name in ordering])
+    meta.update({'next_cursor': next_cursor, 'has_next': has_next})
+    return rows, meta
+
+
+def paginate_queryset(request, queryset, default_page_size=10, cursor_default=False):
+    """Paginate ``queryset`` according to the request's query parameters.
+
+    Returns ``(rows, meta)`` where ``meta`` is merged into the response next
+    to ``results``. With ``cursor_default`` the endpoint uses cursor mode
+    unless ``?pagination=page`` or a ``?page=`` number is given. Raises
+    ``InvalidCursor`` for malformed cursor tokens.
+    """
+    try:
+        page_size = int(_param(request, 'page_size', default_page_size))
+    except (TypeError, ValueError):
+        page_size = default_page_size
+    page_size = max(page_size, 1)
+    count_mode = _param(request, 'count')
+    if count_mode not in ('exact', 'estimated'):
+        count_mode = None
+
+    cursor = request.query_params.get('cursor')
+    page_requested = _param(request, 'page') is not None
+    mode = _param(request, 'pagination', 'cursor' if cursor_default and not page_requested else 'page')
+    if cursor is not None or mode == 'cursor':
+        return cursor_paginate(queryset, cursor, page_size, count_mode)
+
+    page = _param(request, 'page', 1)
+    paginator = Paginator(queryset, page_size)
+    if count_mode == 'estimated':
+        paginator.count = estimate_count(queryset)
+    try:
+        rows = paginator.page(page)
+        current_page = rows.number
+    except PageNotAnInteger:
+        rows = paginator.page(1)
+        current_page = 1
+    except EmptyPage:
+        rows = []
+        current_page = int(page)
+    return rows, {
+        'count': paginator.count,
+        'num_pages': paginator.num_pages,
+        'current_page': current_page,
+    }
@@ -0,0 +1,222 @@
+"""
+"Frequently bought together" recommendations.
+
+The co-purchase matrix (how many paid orders contain both product A and
+product B) is built by one grouped self-join of ``OrderItem`` in the
+database, streamed in (product, score) order so only the top-N neighbours of
+each product are kept, and written to ``ProductNeighbor`` in batches. Newly
+paid orders increment their pairs in place with ``F()`` updates; pairs that
+were trimmed out of a product's top-N re-enter with the new order's count
+only, until the next full rebuild (``build_related_products`` command)
+recomputes and trims the table again.
+
+Content-based "similar products" (for items without order history) use
+TF-IDF vectors over name, brand, category and description. Each vector is
+L2-normalized and pruned to its strongest terms; neighbours are found
+through an inverted index whose posting lists are ordered by weight and cut
+at ``MAX_POSTINGS`` (impact-ordered pruning), one chunk of products at a
+time, so only the scores of the current product are ever held rather than
+the full similarity matrix. With the defaults a 200k-product catalog takes
+a few minutes in one process.
+
+Rebuilds never hold a write transaction while computing: scores are
+produced outside any transaction, and each batch of products has its old
+rows replaced by the new ones in one short transaction, so checkouts and
+admin writes are only ever blocked for a single batch insert. A newly paid
+order counted while its products' batch is being swapped may be missed until
+the next rebuild.
+
+Both kinds are served by a single read on the ``product_neighbor_rank_idx``
+index joined to the neighbour rows.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import OrderItem, Product, ProductNeighbor
+
+
+DEFAULT_BATCH_SIZE = 1000
+# Terms kept per product vector, and the document-frequency ceiling above
+# which a term is too common to distinguish products (never below MIN_DF_CAP)
+TERMS_PER_PRODUCT = 24
+MAX_DF = 0.05
+MIN_DF_CAP = 200
+# Scoring reads each product's QUERY_TERMS strongest terms against the
+# MAX_POSTINGS highest-weighted products of each term
+QUERY_TERMS = 10
+MAX_POSTINGS = 200
+
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this to was with your you '
+    'our we will can all more new'.split()
+)
+_WORD_RE = re.compile(r'[^\W_]{2,}', re.UNICODE)
+
+
+def default_top_n():
+    return getattr(settings, 'RELATED_PRODUCTS_TOP_N', 20)
+
+
+def copurchase_counts():
+    """``(product, other, score)`` rows for every co-purchased pair, best first per product."""
+    return (
+        OrderItem.objects.filter(order__isPaid=True, product__isnull=False)
+        .annotate(other=F('order__orderitems__product'))
+        .exclude(other__isnull=True)
+        .exclude(other=F('product'))
+        .values_list('product', 'other')
+        .annotate(score=Count('order', distinct=True))
+        .order_by('product', '-score', 'other')
+    )
+
+
+def _replace_neighbors(kind, rows, after=None, upto=None):
+    """Swap in ``rows`` for the products with ``after < id <= upto``; returns rows written.
+
+    Either bound may be None for an open range. The delete and insert share
+    one short transaction so readers see the old or the new neighbours.
+    """
+    stale = ProductNeighbor.objects.filter(kind=kind)
+    if after is not None:
+        stale = stale.filter(product_id__gt=after)
+    if upto is not None:
+        stale = stale.filter(product_id__lte=upto)
+    with transaction.atomic():
+        stale.delete()
+        ProductNeighbor.objects.bulk_create(rows)
+    return len(rows)
+
+
+def rebuild_copurchase_neighbors(top_n=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Recompute the co-purchase neighbour table; returns the number of rows written.
+
+    The grouped query is read outside any transaction and every
+    ``batch_size`` rows are swapped in with ``_replace_neighbors``.
+    """
+    top_n = top_n or default_top_n()
+    written, batch, after = 0, [], None
+    rows = copurchase_counts().iterator(chunk_size=batch_size)
+    for product_id, group in groupby(rows, key=lambda row: row[0]):
+        for _, other_id, score in islice(group, top_n):
+            batch.append(ProductNeighbor(product_id=product_id, neighbor_id=other_id,
+                                         kind=ProductNeighbor.COPURCHASE, score=score))
+        if len(batch) >= batch_size:
+            written += _replace_neighbors(ProductNeighbor.COPURCHASE, batch, after, product_id)
+            batch, after = [], product_id
+    # The last batch also clears products past it that lost all their pairs
+    written += _replace_neighbors(ProductNeighbor.COPURCHASE, batch, after)
+    return written
+
+
+def record_order_copurchases(order):
+    """Count a newly paid order's product pairs; call once, when it becomes paid."""
+    ids = sorted(set(
+        order.orderitems.exclude(product__isnull=True).values_list('product_id', flat=True)
+    ))
+    if len(ids) < 2:
+        return 0
+    with transaction.atomic():
+        pairs = ProductNeighbor.objects.filter(kind=ProductNeighbor.COPURCHASE, product__in=ids, neighbor__in=ids)
+        existing = set(pairs.values_list('product_id', 'neighbor_id'))
+        if existing:
+            pairs.update(score=F('score') + 1)
+        ProductNeighbor.objects.bulk_create([
+            ProductNeighbor(product_id=a, neighbor_id=b, kind=ProductNeighbor.COPURCHASE, score=1)
+            for a in ids for b in ids
+            if a != b and (a, b) not in existing
+        ], ignore_conflicts=True)
+    return len(ids) * (len(ids) - 1)
+
+
+def related_products(product_id, kind=ProductNeighbor.COPURCHASE, limit=None, fields=()):
+    """Top neighbours of ``product_id`` with the neighbour rows loaded in the same query."""
+    limit = limit or default_top_n()
+    return list(
+        ProductNeighbor.objects.filter(product_id=product_id, kind=kind)
+        .select_related('neighbor')
+        .only('score', 'neighbor', *[f'neighbor__{name}' for name in fields])
+        .order_by('-score', 'neighbor')[:limit]
+    )
+
+
+def product_terms(name, brand, category, description):
+    """Term counts for one product; name words count double, brand/category are single terms."""
+    terms = Counter()
+    for weight, text in ((2, name), (1, description)):
+        for word in _WORD_RE.findall((text or '').lower()):
+            if word not in STOP_WORDS:
+                terms[word] += weight
+    for prefix, value in (('brand', brand), ('category', category)):
+        value = ' '.join((value or '').lower().split())
+        if value:
+            terms[f'{prefix}:{value}'] += 2
+    return terms
+
+
+def tfidf_vectors(docs, terms_per_product=TERMS_PER_PRODUCT, max_df=MAX_DF):
+    """Return pruned, L2-normalized ``[(term_id, weight), ...]`` per document."""
+    df = Counter()
+    for terms in docs:
+        df.update(terms.keys())
+    total = len(docs)
+    df_cap = max(int(max_df * total), MIN_DF_CAP)
+    term_ids = {}
+    vectors = []
+    for terms in docs:
+        weights = {term: (1 + math.log(count)) * (math.log((1 + total) / (1 + df[term])) + 1)
+                   for term, count in terms.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        # Terms unique to this product or shared by too many cannot rank neighbours
+        useful = [(term, w / norm) for term, w in weights.items() if 1 < df[term] <= df_cap]
+        useful = heapq.nlargest(terms_per_product, useful, key=itemgetter(1))
+        vectors.append([(term_ids.setdefault(term, len(term_ids)), w) for term, w in useful])
+    return vectors
+
+
+def rebuild_similar_neighbors(top_n=None, chunk_size=DEFAULT_BATCH_SIZE):
+    """Recompute TF-IDF cosine neighbours for every product; returns rows written."""
+    top_n = top_n or default_top_n()
+    ids, docs = [], []
+    rows = Product.objects.order_by('_id').values_list('_id', 'name', 'brand', 'category', 'description')
+    for pid, name, brand, category, description in rows.iterator(chunk_size=2000):
+        ids.append(pid)
+        docs.append(product_terms(name, brand, category, description))
+    vectors = tfidf_vectors(docs)
+    del docs
+
+    postings = defaultdict(list)
+    for index, vector in enumerate(vectors):
+        for term_id, weight in vector:
+            postings[term_id].append((index, weight))
+    for posting in postings.values():
+        posting.sort(key=itemgetter(1), reverse=True)
+        del posting[MAX_POSTINGS:]
+
+    # Each chunk is scored outside any transaction, then swapped in on its own
+    written, after = 0, None
+    for start in range(0, len(vectors), chunk_size):
+        batch = []
+        end = min(start + chunk_size, len(vectors))
+        for index in range(start, end):
+            scores = defaultdict(float)
+            for term_id, weight in vectors[index][:QUERY_TERMS]:
+                for other, other_weight in postings[term_id]:
+                    scores[other] += weight * other_weight
+            scores.pop(index, None)
+            for other, score in heapq.nlargest(top_n, scores.items(), key=itemgetter(1)):
+                batch.append(ProductNeighbor(product_id=ids[index], neighbor_id=ids[other],
+                                             kind=ProductNeighbor.SIMILAR, score=round(score, 6)))
+        upto = ids[end - 1]
+        written += _replace_neighbors(ProductNeighbor.SIMILAR, batch, after, upto)
+        after = upto
+    # Drop rows of products created since the scan started
+    _replace_neighbors(ProductNeighbor.SIMILAR, [], after)
+    return written
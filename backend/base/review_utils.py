@@ -0,0 +1,117 @@
+"""
+Review writes with incrementally maintained product rating aggregates.
+
+``Product.ratingTotal`` holds the sum of review ratings next to
+``numReviews``, so each create/update/delete adjusts both with a single
+``UPDATE ... SET x = x + delta`` and derives ``rating`` from the new values
+in the same statement. No ``AVG()`` over the product's reviews is needed on
+the write path; ``reconcile_review_aggregates`` (and the
+``reconcile_reviews`` command) recomputes everything in bulk if the counters
+ever drift, e.g. after reviews are edited in the Django admin.
+"""
+from django.db import transaction
+from django.db.models import (
+    Avg, Case, Count, DecimalField, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .cache_utils import bump_version, CATALOG
+from .catalog_utils import product_detail_cache
+from .models import Product, Review
+
+
+RATING_FIELD = DecimalField(max_digits=10, decimal_places=2)
+
+
+def _average(total, count):
+    return Case(
+        When(GreaterThan(count, 0), then=Cast(total, FloatField()) / count),
+        default=Value(0),
+        output_field=RATING_FIELD,
+    )
+
+
+def apply_review_delta(product_id, rating_delta, count_delta):
+    """Shift a product's rating sum and review count and recompute ``rating``.
+
+    The right-hand sides are evaluated against the row being updated, so
+    concurrent writers cannot lose each other's increments.
+    """
+    total = F('ratingTotal') + rating_delta
+    count = Coalesce(F('numReviews'), 0) + count_delta
+    Product.objects.filter(_id=product_id).update(
+        ratingTotal=total,
+        numReviews=count,
+        rating=_average(total, count),
+        updated_at=timezone.now(),
+    )
+
+
+def create_review(product, user, rating, comment=''):
+    with transaction.atomic():
+        review = Review.objects.create(
+            product=product,
+            user=user,
+            name=user.first_name or user.username,
+            email=user.email,
+            rating=rating,
+            comment=comment,
+        )
+        apply_review_delta(product._id, rating, 1)
+    return review
+
+
+def update_review(review, rating=None, comment=None):
+    with transaction.atomic():
+        # Lock the review so two concurrent edits cannot apply the same old rating twice
+        current = Review.objects.select_for_update().get(_id=review._id)
+        delta = 0
+        if rating is not None:
+            delta = rating - current.rating
+            current.rating = rating
+        if comment is not None:
+            current.comment = comment
+        current.save(update_fields=['rating', 'comment'])
+        if delta:
+            apply_review_delta(current.product_id, delta, 0)
+    return current
+
+
+def delete_review(review):
+    with transaction.atomic():
+        current = Review.objects.select_for_update().filter(_id=review._id).first()
+        if current is None:
+            return
+        current.delete()
+        apply_review_delta(current.product_id, -current.rating, -1)
+
+
+def reconcile_review_aggregates():
+    """Recompute ``rating``/``numReviews``/``ratingTotal`` from the reviews table.
+
+    Only products whose stored counters disagree are rewritten, in one
+    ``UPDATE`` with correlated subqueries. Returns the number of fixed rows.
+    """
+    def aggregate(expression):
+        return Subquery(
+            Review.objects.filter(product=OuterRef('pk')).order_by()
+            .values('product').annotate(value=expression).values('value')[:1]
+        )
+
+    real_count = Coalesce(aggregate(Count('pk')), 0)
+    real_total = Coalesce(aggregate(Sum('rating')), 0, output_field=IntegerField())
+    stale = Product.objects.annotate(real_count=real_count, real_total=real_total).filter(
+        ~Q(numReviews=F('real_count')) | Q(numReviews__isnull=True) | ~Q(ratingTotal=F('real_total'))
+    )
+    fixed = Product.objects.filter(pk__in=stale.values('pk')).update(
+        numReviews=real_count,
+        ratingTotal=real_total,
+        rating=Coalesce(aggregate(Avg('rating')), 0, output_field=RATING_FIELD),
+        updated_at=timezone.now(),
+    )
+    if fixed:
+        bump_version(CATALOG)
+        product_detail_cache.refresh()
+    return fixed
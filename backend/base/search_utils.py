@@ -0,0 +1,190 @@
+"""
+Full-text product search.
+
+SQLite uses the ``base_product_fts`` FTS5 table, kept in sync with
+``base_product`` by triggers. Postgres uses a GIN expression index over a
+weighted ``tsvector`` of the same columns. Both are created by migration
+``0011_product_search_index`` and can be rebuilt with
+``python manage.py rebuild_search_index``.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = 'base_product_fts'
+PG_INDEX = 'base_product_search_idx'
+PG_CONFIG = 'english'
+
+# Column weights: name matches rank above brand, category and description.
+SEARCH_COLUMNS = (('name', 'A', 10.0), ('brand', 'B', 5.0), ('category', 'B', 5.0), ('description', 'D', 1.0))
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_fts_available = {}
+
+
+def pg_vector_sql(table=None):
+    """SQL for the weighted tsvector; must match the GIN index expression."""
+    prefix = f'"{table}".' if table else ''
+    parts = [
+        f"setweight(to_tsvector('{PG_CONFIG}'::regconfig, COALESCE({prefix}\"{column}\", '')), '{weight}')"
+        for column, weight, _ in SEARCH_COLUMNS
+    ]
+    return '(' + ' || '.join(parts) + ')'
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall(query or '')
+
+
+def fts5_match_expression(tokens):
+    # Quote every token so user input can never be parsed as FTS5 syntax;
+    # the last token is a prefix match for search-as-you-type.
+    terms = ['"%s"' % t for t in tokens[:-1]] + ['"%s"*' % tokens[-1]]
+    return ' '.join(terms)
+
+
+def pg_tsquery_expression(tokens):
+    return ' & '.join(tokens[:-1] + [tokens[-1] + ':*'])
+
+
+def search_index_available(using='default'):
+    if using not in _fts_available:
+        connection = connections[using]
+        if connection.vendor == 'sqlite':
+            _fts_available[using] = FTS_TABLE in connection.introspection.table_names()
+        else:
+            _fts_available[using] = connection.vendor == 'postgresql'
+    return _fts_available[using]
+
+
+def search_products(queryset, query):
+    """Filter ``queryset`` to products matching ``query``, best match first.
+
+    Adds a ``search_rank`` annotation (higher is better). Falls back to the
+    old ``icontains`` scan when no full-text index exists for the backend.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+    using = queryset.db
+    if not search_index_available(using):
+        return queryset.filter(
+            Q(name__icontains=query) | Q(category__icontains=query) | Q(description__icontains=query)
+        )
+
+    table = queryset.model._meta.db_table
+    pk = f'"{table}"."{queryset.model._meta.pk.column}"'
+    if connections[using].vendor == 'postgresql':
+        vector = pg_vector_sql(table)
+        tsquery = pg_tsquery_expression(tokens)
+        match = RawSQL(f"{vector} @@ to_tsquery('{PG_CONFIG}', %s)", [tsquery], output_field=BooleanField())
+        rank = RawSQL(f"ts_rank({vector}, to_tsquery('{PG_CONFIG}', %s))", [tsquery], output_field=FloatField())
+    else:
+        expression = fts5_match_expression(tokens)
+        match = RawSQL(
+            f'{pk} IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)',
+            [expression], output_field=BooleanField(),
+        )
+        # FTS5 rank is bm25, where more negative means more relevant.
+        rank = RawSQL(
+            f'(SELECT -rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {pk})',
+            [expression], output_field=FloatField(),
+        )
+    return queryset.filter(match).annotate(search_rank=rank).order_by('-search_rank')
+
+
+def create_search_index(connection):
+    """Create the backend-specific index structures (mirrors migration 0011)."""
+    if connection.vendor == 'sqlite':
+        columns = ', '.join(column for column, _, _ in SEARCH_COLUMNS)
+        new_values = ', '.join(f'new.{column}' for column, _, _ in SEARCH_COLUMNS)
+        weights = ', '.join(str(w) for _, _, w in SEARCH_COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                f"USING fts5({columns}, tokenize='porter unicode61')"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25({weights})')")
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON base_product BEGIN "
+                f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new._id, {new_values}); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON base_product BEGIN "
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = old._id; END"
+            )
+            # Only changes to indexed columns rewrite the FTS row, not stock or price updates
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {columns} ON base_product BEGIN "
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = old._id; "
+                f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new._id, {new_values}); END"
+            )
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {PG_INDEX} ON base_product USING GIN ({pg_vector_sql()})')
+    _fts_available.pop(connection.alias, None)
+
+
+def ensure_search_index(connection):
+    """Recreate the index if a migration dropped it.
+
+    SQLite rebuilds a table (dropping its triggers) on most ALTERs, so this
+    runs after every ``migrate`` and repopulates the FTS table when needed.
+    An update trigger from before it was limited to the indexed columns is
+    replaced in place.
+    """
+    if 'base_product' not in connection.introspection.table_names():
+        return
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{FTS_TABLE}_a_'],
+            )
+            triggers = dict(cursor.fetchall())
+            if len(triggers) == 3:
+                if 'AFTER UPDATE OF' in triggers[f'{FTS_TABLE}_au']:
+                    return
+                cursor.execute(f'DROP TRIGGER {FTS_TABLE}_au')
+                create_search_index(connection)
+                return
+        create_search_index(connection)
+        rebuild_search_index(connection)
+    elif connection.vendor == 'postgresql':
+        create_search_index(connection)
+
+
+def drop_search_index(connection):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP INDEX IF EXISTS {PG_INDEX}')
+    _fts_available.pop(connection.alias, None)
+
+
+def rebuild_search_index(connection):
+    """Repopulate the index from ``base_product``; returns the row count."""
+    if connection.vendor == 'sqlite':
+        if FTS_TABLE not in connection.introspection.table_names():
+            create_search_index(connection)
+        columns = ', '.join(column for column, _, _ in SEARCH_COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(f'INSERT INTO {FTS_TABLE}(rowid, {columns}) SELECT _id, {columns} FROM base_product')
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+            cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+            return cursor.fetchone()[0]
+    if connection.vendor == 'postgresql':
+        create_search_index(connection)
+        with connection.cursor() as cursor:
+            cursor.execute(f'REINDEX INDEX {PG_INDEX}')
+            cursor.execute('SELECT COUNT(*) FROM base_product')
+            return cursor.fetchone()[0]
+    return 0
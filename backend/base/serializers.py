@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Product, Review, Order, OrderItem, ShippingAddress
+from .image_utils import variant_urls
+from .fieldset_utils import DynamicFieldsMixin
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -9,12 +11,40 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ReviewWriteSerializer(serializers.Serializer):
+    rating = serializers.IntegerField(min_value=1, max_value=5)
+    comment = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     reviews = ReviewSerializer(many=True, read_only=True)
+    imageVariants = serializers.SerializerMethodField(read_only=True)
     
     class Meta:
         model = Product
         fields = '__all__'
+        read_only_fields = ('ratingTotal', 'priceBase')
+
+    def get_imageVariants(self, obj):
+        return variant_urls(obj)
+
+
+class ProductDetailSerializer(ProductSerializer):
+    """Product with the page of reviews prefetched into ``review_page``."""
+    reviews = ReviewSerializer(source='review_page', many=True, read_only=True)
+
+
+class ProductListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Summary representation for listings; reviews are only served by productDetail."""
+    imageVariants = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ('_id', 'name', 'image', 'imageVariants', 'brand', 'category', 'rating', 'numReviews',
+                  'price', 'priceCurrency', 'countInStock', 'created_at')
+
+    def get_imageVariants(self, obj):
+        return variant_urls(obj)
 
 
 class ShippingAddressSerializer(serializers.ModelSerializer):
@@ -29,7 +59,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     orderitems = OrderItemSerializer(many=True, read_only=True)
     shippingaddress = ShippingAddressSerializer(read_only=True, required=False, allow_null=True)
     
@@ -38,12 +68,23 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class UserSerializer(serializers.ModelSerializer):
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """Compact order row for order history; needs the ``order_summaries`` annotations."""
+    itemCount = serializers.IntegerField(read_only=True)
+    firstItemImage = serializers.CharField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Order
+        fields = ('_id', 'created_at', 'status', 'isPaid', 'isDelivered', 'totalPrice', 'itemCount', 'firstItemImage')
+
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     isAdmin = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 'is_staff', 'isAdmin')
+        field_dependencies = {'isAdmin': ('is_staff',)}
     
     def get_isAdmin(self, obj):
         return obj.is_staff
@@ -0,0 +1,79 @@
+"""
+Model signal handlers that keep derived data in sync with the catalog.
+"""
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache_utils import bump_version, CATALOG
+from .catalog_utils import product_detail_cache
+from .fx_utils import get_rates, to_base
+from .image_utils import schedule_variants
+from .models import Order, Product, Review
+from .order_utils import customer_fields
+from .search_utils import ensure_search_index
+from .suggest_utils import suggest_index
+
+
+CUSTOMER_USER_FIELDS = {'email', 'first_name', 'last_name', 'username'}
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    bump_version(CATALOG)
+    product_detail_cache.refresh(instance.product_id if sender is Review else instance._id)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def touch_reviewed_product(sender, instance, **kwargs):
+    # Reviews are part of the product detail payload, so they advance its ETag
+    Product.objects.filter(_id=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, app_config, using, **kwargs):
+    if app_config.name == 'base':
+        ensure_search_index(connections[using])
+
+
+@receiver(post_save, sender=Product)
+def generate_image_variants(sender, instance, **kwargs):
+    schedule_variants(instance)
+
+
+@receiver(post_save, sender=Product)
+def index_product_suggestions(sender, instance, **kwargs):
+    suggest_index.update_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def drop_product_suggestions(sender, instance, **kwargs):
+    suggest_index.remove_product(instance._id)
+
+
+@receiver(pre_save, sender=Product)
+def set_price_base(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'price', 'priceCurrency'} & set(update_fields):
+        return
+    instance.priceBase = to_base(instance.price, instance.priceCurrency, get_rates())
+
+
+@receiver(pre_save, sender=Order)
+def fill_order_customer(sender, instance, **kwargs):
+    if instance.user_id and not instance.customerEmail and not instance.customerName:
+        for name, value in customer_fields(instance.user).items():
+            setattr(instance, name, value)
+
+
+@receiver(post_save, sender=User)
+def sync_order_customer(sender, instance, created, update_fields=None, **kwargs):
+    # Logins save only last_login; skip those and brand-new users (no orders yet)
+    if created or (update_fields is not None and not CUSTOMER_USER_FIELDS & set(update_fields)):
+        return
+    Order.objects.filter(user=instance).update(**customer_fields(instance))
@@ -0,0 +1,387 @@
+"""
+Search-box suggestions from an in-process prefix index.
+
+Product names, brands and categories are tokenized into a sorted token
+array; a query token matches every indexed token it is a prefix of (found
+with ``bisect``). Each token keeps its documents ranked best first (by
+popularity, then type and text), and one- and two-letter prefixes keep
+their best ``TOP_K`` precomputed, so a lookup merges ranked lists and stops
+after ``limit`` hits instead of ranking every match. Only immutable entries
+are collected under the index lock; ranking happens outside it. Query tokens with no prefix match fall back to typo
+tolerant matching: prefixes of indexed tokens are stored with their
+single-character deletions (SymSpell style), so candidates within edit
+distance ``MAX_EDIT_DISTANCE`` are found with dictionary lookups rather
+than by scanning the vocabulary.
+
+The index is built from the database on first use and updated in place by
+the Product signal handlers of the worker that made the change. Each such
+change advances the shared ``SUGGEST`` version (not the catalog version,
+which stock and review writes also advance) and the worker records the new
+value, so only changes made by other processes, seen at most every
+``SUGGEST_REFRESH_SECONDS``, trigger a rebuild. That rebuild runs in a
+background thread and is swapped in when done; queries keep using the
+current index meanwhile. Review counts used for ranking are refreshed by
+those rebuilds.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+from .cache_utils import LRUCache, bump_version, get_version, SUGGEST
+
+
+MAX_EDIT_DISTANCE = 1
+MIN_FUZZY_LENGTH = 3
+MAX_PREFIX_LENGTH = 8
+# Upper bound on indexed tokens visited per query token (short prefixes)
+MAX_SCAN = 2000
+# Prefixes up to this length keep their best TOP_K documents precomputed;
+# TOP_K is also the largest ``limit`` the suggest endpoint accepts
+TOP_PREFIX_LENGTH = 2
+TOP_K = 20
+TYPE_ORDER = {'category': 0, 'brand': 1, 'product': 2}
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    return _WORD_RE.findall((text or '').lower())
+
+
+def _deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance, or ``limit + 1`` once it exceeds ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.version = None
+        self.checked_at = 0.0
+        self._rebuilding = False
+        self._generation = 0
+        self._results = LRUCache(1024)
+
+    def _reset(self):
+        self._docs = {}                        # key -> (rank, key, tokens, suggestion)
+        self._doc_refs = defaultdict(int)      # brand/category key -> product count
+        self._products = {}                    # product id -> (name, brand, category, popularity)
+        self._token_docs = defaultdict(set)    # token -> {key}
+        self._ranked = {}                      # token -> its docs best first (built lazily)
+        self._top = {}                         # short prefix -> best TOP_K docs (built lazily)
+        self._tokens = []                      # sorted distinct tokens
+        self._prefix_refs = defaultdict(int)   # fuzzy prefix -> number of tokens
+        self._delete_map = defaultdict(set)    # prefix or its deletion -> {prefix}
+
+    # -- maintenance -------------------------------------------------------
+
+    def _touch(self, token):
+        """Drop the ranked lists that ``token``'s documents appear in."""
+        self._ranked.pop(token, None)
+        for length in range(1, min(len(token), TOP_PREFIX_LENGTH) + 1):
+            self._top.pop(token[:length], None)
+
+    def _add_token(self, token, key):
+        docs = self._token_docs[token]
+        if not docs:
+            bisect.insort(self._tokens, token)
+            for length in range(MIN_FUZZY_LENGTH, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                prefix = token[:length]
+                self._prefix_refs[prefix] += 1
+                if self._prefix_refs[prefix] == 1:
+                    for variant in _deletes(prefix) | {prefix}:
+                        self._delete_map[variant].add(prefix)
+        docs.add(key)
+        self._touch(token)
+
+    def _remove_token(self, token, key):
+        docs = self._token_docs.get(token)
+        if not docs:
+            return
+        docs.discard(key)
+        self._touch(token)
+        if docs:
+            return
+        del self._token_docs[token]
+        index = bisect.bisect_left(self._tokens, token)
+        if index < len(self._tokens) and self._tokens[index] == token:
+            del self._tokens[index]
+        for length in range(MIN_FUZZY_LENGTH, min(len(token), MAX_PREFIX_LENGTH) + 1):
+            prefix = token[:length]
+            self._prefix_refs[prefix] -= 1
+            if self._prefix_refs[prefix] <= 0:
+                del self._prefix_refs[prefix]
+                for variant in _deletes(prefix) | {prefix}:
+                    self._delete_map[variant].discard(prefix)
+                    if not self._delete_map[variant]:
+                        del self._delete_map[variant]
+
+    def _set_doc(self, key, text, doc_type, weight, product_id=None):
+        """Store the (immutable) entry for ``key``; entries sort best first."""
+        tokens = frozenset(normalize(text))
+        suggestion = {'text': text, 'type': doc_type, 'productId': product_id}
+        self._docs[key] = ((-weight, TYPE_ORDER[doc_type], text), key, tokens, suggestion)
+        return tokens
+
+    def _add_doc(self, key, text, doc_type, weight, product_id=None):
+        for token in self._set_doc(key, text, doc_type, weight, product_id):
+            self._add_token(token, key)
+
+    def _remove_doc(self, key):
+        entry = self._docs.pop(key, None)
+        if entry:
+            for token in entry[2]:
+                self._remove_token(token, key)
+
+    def _reweigh_facet(self, key):
+        _, _, tokens, suggestion = self._docs[key]
+        self._set_doc(key, suggestion['text'], suggestion['type'], self._doc_refs[key])
+        for token in tokens:
+            self._touch(token)
+
+    def _add_facet(self, doc_type, text):
+        if not text or not text.strip():
+            return
+        key = (doc_type, ' '.join(normalize(text)))
+        self._doc_refs[key] += 1
+        if key in self._docs:
+            self._reweigh_facet(key)
+        else:
+            self._add_doc(key, text.strip(), doc_type, 1)
+
+    def _remove_facet(self, doc_type, text):
+        if not text or not text.strip():
+            return
+        key = (doc_type, ' '.join(normalize(text)))
+        self._doc_refs[key] -= 1
+        if self._doc_refs[key] <= 0:
+            del self._doc_refs[key]
+            self._remove_doc(key)
+        else:
+            self._reweigh_facet(key)
+
+    def _add_product(self, pid, name, brand, category, popularity):
+        self._products[pid] = (name, brand, category, popularity)
+        if name:
+            self._add_doc(('product', pid), name, 'product', popularity, pid)
+        self._add_facet('brand', brand)
+        self._add_facet('category', category)
+
+    def _remove_product(self, pid):
+        previous = self._products.pop(pid, None)
+        if previous is None:
+            return
+        name, brand, category, _ = previous
+        self._remove_doc(('product', pid))
+        self._remove_facet('brand', brand)
+        self._remove_facet('category', category)
+
+    def _precompute(self):
+        """Rank every token's documents and the top of every short prefix."""
+        for token in self._tokens:
+            self._ranked_docs(token)
+        for prefix in {token[:length] for token in self._tokens for length in range(1, TOP_PREFIX_LENGTH + 1)}:
+            self._prefix_top(prefix)
+
+    def _apply_local(self, apply):
+        """Publish a local change to other workers and apply it to this index.
+
+        The new ``SUGGEST`` version is adopted only if the index was current
+        before the bump; otherwise another worker's change is still pending
+        and the next check rebuilds.
+        """
+        previous = get_version(SUGGEST)
+        bump_version(SUGGEST)
+        with self._lock:
+            if self.version is None:
+                return  # not built yet; the first query builds from the DB
+            apply()
+            if self.version == previous:
+                self.version = get_version(SUGGEST)
+            self._generation += 1
+
+    def update_product(self, product):
+        """Incrementally (re)index one product after it was saved."""
+        indexed = (product.name, product.brand, product.category, 1 + (product.numReviews or 0))
+        if self.version is not None and self._products.get(product._id) == indexed:
+            return  # stock, price and other unindexed changes leave suggestions alone
+
+        def apply():
+            self._remove_product(product._id)
+            self._add_product(product._id, *indexed)
+        self._apply_local(apply)
+
+    def remove_product(self, product_id):
+        self._apply_local(lambda: self._remove_product(product_id))
+
+    def rebuild(self, version=None):
+        """Build a fresh index from the database and swap it in."""
+        from .models import Product
+        version = get_version(SUGGEST) if version is None else version
+        fresh = SuggestIndex()
+        rows = Product.objects.values_list('_id', 'name', 'brand', 'category', 'numReviews').iterator(chunk_size=2000)
+        for pid, name, brand, category, num_reviews in rows:
+            fresh._add_product(pid, name, brand, category, 1 + (num_reviews or 0))
+        fresh._precompute()
+        with self._lock:
+            for name in ('_docs', '_doc_refs', '_products', '_token_docs', '_ranked', '_top', '_tokens',
+                         '_prefix_refs', '_delete_map'):
+                setattr(self, name, getattr(fresh, name))
+            self.version = version
+            self.checked_at = time.monotonic()
+            self._generation += 1
+
+    def _background_rebuild(self, version):
+        try:
+            self.rebuild(version)
+        except Exception as e:
+            print(f"Error rebuilding suggest index: {e}")
+        finally:
+            self._rebuilding = False
+            connection.close()
+
+    def rebuild_in_background(self, version):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._background_rebuild, args=(version,), daemon=True).start()
+
+    def ensure_fresh(self):
+        """Build on first use; afterwards only start background rebuilds for outside changes."""
+        if self.version is None:
+            with self._lock:
+                if self.version is None:
+                    self.rebuild()
+            return
+        interval = getattr(settings, 'SUGGEST_REFRESH_SECONDS', 5)
+        if time.monotonic() - self.checked_at < interval:
+            return
+        self.checked_at = time.monotonic()
+        version = get_version(SUGGEST)
+        if version != self.version:
+            self.rebuild_in_background(version)
+
+    # -- lookup ------------------------------------------------------------
+
+    def _ranked_docs(self, token):
+        ranked = self._ranked.get(token)
+        if ranked is None:
+            ranked = self._ranked[token] = tuple(sorted(self._docs[key] for key in self._token_docs[token]))
+        return ranked
+
+    def _prefix_tokens(self, prefix, limit=None):
+        start = bisect.bisect_left(self._tokens, prefix)
+        end = bisect.bisect_left(self._tokens, prefix + '\U0010ffff', start)
+        return self._tokens[start:end if limit is None else min(end, start + limit)]
+
+    def _prefix_top(self, prefix):
+        top = self._top.get(prefix)
+        if top is None:
+            merged = _best_distinct(heapq.merge(*map(self._ranked_docs, self._prefix_tokens(prefix))), TOP_K)
+            top = self._top[prefix] = tuple(merged)
+        return top
+
+    def _fuzzy_docs(self, word):
+        probe = word[:MAX_PREFIX_LENGTH]
+        candidates = set()
+        for variant in _deletes(probe) | {probe}:
+            candidates |= self._delete_map.get(variant, set())
+        docs = set()
+        for prefix in candidates:
+            if edit_distance(probe, prefix, MAX_EDIT_DISTANCE) <= MAX_EDIT_DISTANCE:
+                for token in self._prefix_tokens(prefix, MAX_SCAN):
+                    docs |= self._token_docs[token]
+        return docs
+
+    def _candidates(self, words, limit):
+        """Ranked streams to draw from plus the words results must also match.
+
+        Runs under the lock but only gathers immutable entries; the caller
+        ranks them without it. Returns ``(streams, filters, ordered)``, where
+        unordered streams still need sorting, or None when some word matches
+        nothing.
+        """
+        prefix_words, fuzzy = [], None
+        for word in words:
+            if self._prefix_tokens(word, 1):
+                prefix_words.append(word)
+            elif len(word) >= MIN_FUZZY_LENGTH:
+                docs = self._fuzzy_docs(word)
+                fuzzy = docs if fuzzy is None else fuzzy & docs
+                if not fuzzy:
+                    return None
+            else:
+                return None
+        if fuzzy is not None:
+            # Typo matches are few: rank them directly, checking the prefix words
+            return [[self._docs[key] for key in fuzzy]], prefix_words, False
+        if len(prefix_words) == 1 and len(prefix_words[0]) <= TOP_PREFIX_LENGTH and limit <= TOP_K:
+            return [self._prefix_top(prefix_words[0])], [], True
+        # Draw from the word matching the fewest tokens, filter by the others
+        driver = min(prefix_words, key=lambda word: len(self._prefix_tokens(word, MAX_SCAN)))
+        streams = [self._ranked_docs(token) for token in self._prefix_tokens(driver, MAX_SCAN)]
+        return streams, [word for word in prefix_words if word != driver], True
+
+    def suggest(self, query, limit=8):
+        words = normalize(query)
+        if not words:
+            return []
+        key = (tuple(words), limit)
+        with self._lock:
+            generation = self._generation
+            cached = self._results.get(key, version=generation)
+            if cached is not None:
+                return cached
+            candidates = self._candidates(words, limit)
+        results = []
+        if candidates is not None:
+            streams, filters, ordered = candidates
+            if not ordered:
+                streams = [sorted(stream) for stream in streams]
+            entries = heapq.merge(*streams) if len(streams) > 1 else streams[0]
+            if filters:
+                entries = (entry for entry in entries
+                           if all(any(token.startswith(word) for token in entry[2]) for word in filters))
+            results = [entry[3] for entry in _best_distinct(entries, limit)]
+        self._results.set(key, results, version=generation)
+        return results
+
+
+def _best_distinct(entries, limit):
+    """The first ``limit`` entries of a best-first stream, each document once."""
+    seen, best = set(), []
+    for entry in entries:
+        if entry[1] not in seen:
+            seen.add(entry[1])
+            best.append(entry)
+            if len(best) >= limit:
+                break
+    return best
+
+
+suggest_index = SuggestIndex()
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import User
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
 
 
 class UserProfileTests(APITestCase):
@@ -85,3 +86,1287 @@ class UserAuthTests(APITestCase):
         self.assertIn('token', res.data)
         self.assertEqual(res.data.get('email'), 'new@example.com')
         self.assertEqual(res.data.get('name'), 'NewName')
+
+
+class ProductPaginationTests(APITestCase):
+    def setUp(self):
+        from .models import Product
+        self.url = '/api/products/'
+        for i in range(7):
+            Product.objects.create(name=f'Item {i}', category='Cat', price=i % 3)
+
+    def test_page_mode_keeps_legacy_shape(self):
+        res = self.client.get(self.url, {'page': 2, 'page_size': 3})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['count'], 7)
+        self.assertEqual(res.data['num_pages'], 3)
+        self.assertEqual(res.data['current_page'], 2)
+        self.assertEqual(len(res.data['results']), 3)
+
+    def test_cursor_mode_walks_every_row_once(self):
+        for sort in ('newest', 'price_asc', 'price_desc'):
+            seen = []
+            params = {'pagination': 'cursor', 'page_size': 3, 'sort': sort}
+            while True:
+                res = self.client.get(self.url, params)
+                self.assertEqual(res.status_code, 200)
+                self.assertNotIn('num_pages', res.data)
+                seen.extend(p['_id'] for p in res.data['results'])
+                if not res.data['has_next']:
+                    break
+                params = {'cursor': res.data['next_cursor'], 'page_size': 3, 'sort': sort}
+            self.assertEqual(len(seen), 7)
+            self.assertEqual(len(set(seen)), 7)
+
+    def test_invalid_cursor_is_rejected(self):
+        res = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(res.status_code, 400)
+
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        from .models import Product
+        self.url = '/api/products/'
+        self.camera = Product.objects.create(name='Canon Camera', category='Electronics', description='DSLR body')
+        self.strap = Product.objects.create(name='Leather Strap', category='Accessories', description='Fits any camera')
+        Product.objects.create(name='Mouse', category='Electronics', description='Wireless')
+
+    def search(self, q, **params):
+        res = self.client.get(self.url, {'search': q, **params})
+        self.assertEqual(res.status_code, 200)
+        return [p['_id'] for p in res.data['results']]
+
+    def test_results_ranked_by_relevance(self):
+        self.assertEqual(self.search('camera'), [self.camera._id, self.strap._id])
+
+    def test_prefix_match_and_syntax_is_escaped(self):
+        self.assertEqual(self.search('cam'), [self.camera._id, self.strap._id])
+        self.assertEqual(self.search('"camera* ('), [self.camera._id, self.strap._id])
+
+    def test_index_follows_save_and_delete(self):
+        self.strap.description = 'Fits any lens'
+        self.strap.save()
+        self.assertEqual(self.search('camera'), [self.camera._id])
+        self.camera.delete()
+        self.assertEqual(self.search('camera'), [])
+
+    def test_only_indexed_columns_rewrite_the_index(self):
+        from django.db import connection
+        from .models import Product
+        from .search_utils import FTS_TABLE
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [self.camera._id])
+        Product.objects.filter(pk=self.camera.pk).update(countInStock=3, rating=4)
+        self.assertEqual(self.search('canon'), [])
+        Product.objects.filter(pk=self.camera.pk).update(name='Canon Camera II')
+        self.assertEqual(self.search('canon camera'), [self.camera._id])
+
+    def test_outdated_update_trigger_is_replaced(self):
+        from django.db import connection
+        from .search_utils import FTS_TABLE, ensure_search_index
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {FTS_TABLE}_au')
+            cursor.execute(f'CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON base_product BEGIN '
+                           f'DELETE FROM {FTS_TABLE} WHERE rowid = old._id; END')
+            ensure_search_index(connection)
+            cursor.execute("SELECT sql FROM sqlite_master WHERE name = %s", [f'{FTS_TABLE}_au'])
+            self.assertIn('AFTER UPDATE OF name, brand, category, description', cursor.fetchone()[0])
+
+    def test_cursor_pagination_over_ranked_results(self):
+        res = self.client.get(self.url, {'search': 'camera', 'pagination': 'cursor', 'page_size': 1})
+        second = self.client.get(self.url, {'search': 'camera', 'cursor': res.data['next_cursor'], 'page_size': 1})
+        self.assertEqual(res.data['results'][0]['_id'], self.camera._id)
+        self.assertEqual(second.data['results'][0]['_id'], self.strap._id)
+
+    def test_rebuild_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 3 products', out.getvalue())
+        self.assertEqual(self.search('mouse'), self.search('wireless'))
+
+
+class ProductListCacheTests(APITestCase):
+    def setUp(self):
+        from .models import Product
+        from .cache_utils import product_list_cache
+        product_list_cache.clear()
+        self.url = '/api/products/'
+        self.product = Product.objects.create(name='Desk Lamp', category='Home', price=20)
+
+    def test_cache_key_is_normalized(self):
+        from django.http import QueryDict
+        from .cache_utils import product_list_cache_key
+        a = product_list_cache_key(QueryDict('category=HOME&min_price=10&q=Desk%20%20Lamp'))
+        b = product_list_cache_key(QueryDict('min_price=10.0&category=home&search=desk lamp'))
+        self.assertEqual(a, b)
+        self.assertIsNone(product_list_cache_key(QueryDict('page=abc')))
+
+    def test_hit_then_invalidated_by_product_and_review_changes(self):
+        from .models import Review
+        from .cache_utils import product_list_cache
+        self.client.get(self.url, {'category': 'home'})
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url, {'category': 'HOME'})
+        self.assertEqual(res.data['results'][0]['name'], 'Desk Lamp')
+
+        self.product.name = 'Floor Lamp'
+        self.product.save()
+        res = self.client.get(self.url, {'category': 'home'})
+        self.assertEqual(res.data['results'][0]['name'], 'Floor Lamp')
+
+        version = product_list_cache.version
+        Review.objects.create(product=self.product, rating=5, comment='Bright')
+        self.client.get(self.url, {'category': 'home'})
+        self.assertNotEqual(product_list_cache.version, version)
+        self.assertEqual(len(product_list_cache), 1)
+
+    def test_lru_eviction(self):
+        from .cache_utils import LRUCache
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1, version=1)
+        cache.set('b', 2, version=1)
+        cache.get('a', version=1)
+        cache.set('c', 3, version=1)
+        self.assertIsNone(cache.get('b', version=1))
+        self.assertEqual(cache.get('a', version=1), 1)
+        self.assertIsNone(cache.get('a', version=2))
+
+
+class ProductSerializationTests(APITestCase):
+    def setUp(self):
+        from .models import Product, Review
+        self.product = Product.objects.create(name='Kettle', category='Home', price=30, numReviews=3)
+        for i in range(3):
+            Review.objects.create(product=self.product, rating=i + 3, comment=f'Review {i}')
+
+    def test_listing_omits_reviews(self):
+        res = self.client.get('/api/products/')
+        item = res.data['results'][0]
+        self.assertNotIn('reviews', item)
+        self.assertNotIn('description', item)
+        self.assertEqual(item['numReviews'], 3)
+
+    def test_detail_paginates_reviews(self):
+        url = f'/api/products/{self.product._id}/'
+        res = self.client.get(url, {'reviews_page_size': 2})
+        self.assertEqual([r['comment'] for r in res.data['reviews']], ['Review 2', 'Review 1'])
+        self.assertEqual(res.data['reviews_num_pages'], 2)
+        res = self.client.get(url, {'reviews_page_size': 2, 'reviews_page': 2})
+        self.assertEqual([r['comment'] for r in res.data['reviews']], ['Review 0'])
+
+
+class ProductFacetTests(APITestCase):
+    def setUp(self):
+        from .models import Product
+        from .cache_utils import product_list_cache
+        product_list_cache.clear()
+        self.url = '/api/products/facets/'
+        Product.objects.create(name='Phone', brand='Apple', category='Electronics', price=600, rating=4.5)
+        Product.objects.create(name='Tablet', brand='Apple', category='Electronics', price=300, rating=3.2)
+        Product.objects.create(name='Mug', brand='Acme', category='Home', price=12, rating=4.0)
+
+    def test_counts_in_one_query(self):
+        with self.assertNumQueries(2):  # catalog version + grouped facet query
+            res = self.client.get(self.url)
+        self.assertEqual(res.data['total'], 3)
+        self.assertEqual(res.data['category'], [{'value': 'Electronics', 'count': 2}, {'value': 'Home', 'count': 1}])
+        self.assertEqual(res.data['brand'][0], {'value': 'Apple', 'count': 2})
+        self.assertIn({'min': 500, 'max': None, 'count': 1}, res.data['price'])
+        self.assertEqual(res.data['rating'][0], {'min': 4, 'count': 2})
+        self.assertEqual(res.data['rating'][1], {'min': 3, 'count': 3})
+
+    def test_respects_filters_and_is_cached(self):
+        res = self.client.get(self.url, {'search': 'apple', 'page': 2})
+        self.assertEqual(res.data['total'], 2)
+        with self.assertNumQueries(1):
+            cached = self.client.get(self.url, {'search': 'Apple'})
+        self.assertEqual(cached.data, res.data)
+
+
+class ProductSuggestTests(APITestCase):
+    def setUp(self):
+        from .models import Product
+        from .suggest_utils import suggest_index
+        self.url = '/api/products/suggest/'
+        self.index = suggest_index
+        self.headphones = Product.objects.create(name='Wireless Headphones', brand='Sony', category='Audio', numReviews=9)
+        Product.objects.create(name='Wired Headset', brand='Sony', category='Audio')
+        Product.objects.create(name='Coffee Mug', brand='Acme', category='Kitchen')
+        self.index.rebuild()
+
+    def texts(self, query):
+        return [s['text'] for s in self.client.get(self.url, {'q': query}).data['suggestions']]
+
+    def test_prefix_matches_rank_by_popularity(self):
+        self.assertEqual(self.texts('wir')[:2], ['Wireless Headphones', 'Wired Headset'])
+        self.assertEqual(self.texts('so'), ['Sony'])
+        self.assertEqual(self.texts('wireless head'), ['Wireless Headphones'])
+
+    def test_typo_tolerance(self):
+        self.assertEqual(self.texts('kitchne'), ['Kitchen'])
+        self.assertEqual(self.texts('cofee'), ['Coffee Mug'])
+        self.assertEqual(self.texts('zzzz'), [])
+
+    def test_index_follows_product_changes(self):
+        from .models import Product
+        self.headphones.name = 'Bluetooth Speaker'
+        self.headphones.save()
+        self.assertEqual(self.texts('blue'), ['Bluetooth Speaker'])
+        self.assertNotIn('Wireless Headphones', self.texts('wir'))
+        Product.objects.filter(brand='Acme').delete()
+        self.assertEqual(self.texts('acme'), [])
+        self.assertEqual(self.texts('kitchen'), [])
+
+    def test_precomputed_prefixes_follow_changes(self):
+        from .models import Product
+        from .cache_utils import get_version, SUGGEST
+        self.assertEqual(self.texts('w'), ['Wireless Headphones', 'Wired Headset'])
+        Product.objects.create(name='Wool Scarf', brand='Knit', category='Apparel', numReviews=50)
+        self.assertEqual(self.texts('w')[0], 'Wool Scarf')
+        self.headphones.delete()
+        self.assertEqual(self.texts('w'), ['Wool Scarf', 'Wired Headset'])
+        self.assertEqual(self.texts('s'), ['Wool Scarf', 'Sony'])
+
+        # Stock and price saves leave the index and the shared version alone
+        product = Product.objects.get(name='Coffee Mug')
+        version = get_version(SUGGEST)
+        product.countInStock = 7
+        product.save()
+        self.assertEqual(get_version(SUGGEST), version)
+
+    def test_local_changes_do_not_rebuild(self):
+        from unittest import mock
+        from django.test import override_settings
+        from .cache_utils import bump_version, SUGGEST
+        from .order_utils import _invalidate
+        with override_settings(SUGGEST_REFRESH_SECONDS=0), \
+                mock.patch.object(self.index, 'rebuild') as rebuild, \
+                mock.patch.object(self.index, 'rebuild_in_background') as background:
+            self.headphones.name = 'Noise Cancelling Headphones'
+            self.headphones.save()
+            _invalidate([self.headphones._id])
+            self.assertEqual(self.texts('noise'), ['Noise Cancelling Headphones'])
+            background.assert_not_called()
+
+            # A change published by another worker is rebuilt off the request path
+            bump_version(SUGGEST)
+            self.assertEqual(self.texts('noise'), ['Noise Cancelling Headphones'])
+            background.assert_called_once()
+            rebuild.assert_not_called()
+
+
+class ProductReviewTests(APITestCase):
+    def setUp(self):
+        from .models import Product
+        self.user = User.objects.create_user(username='reviewer', password='pass12345')
+        self.other = User.objects.create_user(username='other', password='pass12345')
+        self.product = Product.objects.create(name='Lamp', price=20)
+        self.url = f'/api/products/{self.product._id}/reviews/'
+
+    def login(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def aggregates(self):
+        self.product.refresh_from_db()
+        return float(self.product.rating), self.product.numReviews, self.product.ratingTotal
+
+    def test_concurrent_duplicate_review_is_rejected(self):
+        from unittest import mock
+        from django.db.models.query import QuerySet
+        self.login(self.user)
+        self.client.post(self.url, {'rating': 4}, format='json')
+        # The second submission passes the exists() check as a racing request would
+        with mock.patch.object(QuerySet, 'exists', return_value=False):
+            res = self.client.post(self.url, {'rating': 1}, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(self.aggregates(), (4.0, 1, 4))
+
+    def test_create_update_delete_maintain_aggregates(self):
+        self.login(self.user)
+        first = self.client.post(self.url, {'rating': 5, 'comment': 'Great'}, format='json')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(self.client.post(self.url, {'rating': 1}, format='json').status_code, 400)
+        self.login(self.other)
+        self.client.post(self.url, {'rating': 2}, format='json')
+        self.assertEqual(self.aggregates(), (3.5, 2, 7))
+
+        review_url = f"/api/reviews/{first.data['_id']}/"
+        self.assertEqual(self.client.patch(review_url, {'rating': 1}, format='json').status_code, 403)
+        self.login(self.user)
+        res = self.client.patch(review_url, {'rating': 4}, format='json')
+        self.assertEqual(res.data['comment'], 'Great')
+        self.assertEqual(self.aggregates(), (3.0, 2, 6))
+
+        self.assertEqual(self.client.delete(review_url).status_code, 204)
+        self.assertEqual(self.aggregates(), (2.0, 1, 2))
+
+    def test_write_does_not_aggregate_over_reviews(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'rating': 4}, format='json')
+        self.assertFalse([q for q in queries if 'AVG(' in q['sql'].upper()])
+
+    def test_validation_and_listing(self):
+        self.assertEqual(self.client.post(self.url, {'rating': 4}, format='json').status_code, 401)
+        self.login(self.user)
+        self.assertEqual(self.client.post(self.url, {'rating': 9}, format='json').status_code, 400)
+        self.client.post(self.url, {'rating': 4}, format='json')
+        res = self.client.get(self.url, {'page_size': 1})
+        self.assertEqual(res.data['count'], 1)
+        self.assertEqual(res.data['results'][0]['rating'], 4)
+
+    def test_reconcile_fixes_drift(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import Product, Review
+        Review.objects.create(product=self.product, user=self.user, rating=5)
+        Review.objects.create(product=self.product, user=self.other, rating=2)
+        Product.objects.filter(_id=self.product._id).update(numReviews=0, ratingTotal=0, rating=0)
+        out = StringIO()
+        call_command('reconcile_reviews', stdout=out)
+        self.assertIn('Reconciled 1 products', out.getvalue())
+        self.assertEqual(self.aggregates(), (3.5, 2, 7))
+
+
+class RelatedProductTests(APITestCase):
+    def setUp(self):
+        from .models import Product
+        self.user = User.objects.create_user(username='buyer', password='pass12345')
+        self.camera, self.lens, self.bag, self.mug = [
+            Product.objects.create(name=name, price=10) for name in ('Camera', 'Lens', 'Bag', 'Mug')
+        ]
+
+    def order(self, *products, paid=True):
+        from .models import Order, OrderItem
+        order = Order.objects.create(user=self.user, isPaid=paid, totalPrice=10)
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, name=product.name, qty=1, price=10)
+        return order
+
+    def related(self, product):
+        res = self.client.get(f'/api/products/{product._id}/related/')
+        return [(item['name'], item['score']) for item in res.data['results']]
+
+    def test_rebuild_keeps_top_n_by_copurchase_count(self):
+        from .recommend_utils import rebuild_copurchase_neighbors
+        self.order(self.camera, self.lens, self.bag)
+        self.order(self.camera, self.lens)
+        self.order(self.camera, self.mug, paid=False)
+        self.assertEqual(rebuild_copurchase_neighbors(top_n=1), 3)
+        self.assertEqual(self.related(self.camera), [('Lens', 2.0)])
+        # Swapped in a product at a time; a product without pairs loses its stale rows
+        from .models import ProductNeighbor
+        ProductNeighbor.objects.create(product=self.mug, neighbor=self.bag, score=9)
+        self.assertEqual(rebuild_copurchase_neighbors(top_n=5, batch_size=1), 6)
+        self.assertEqual(self.related(self.camera), [('Lens', 2.0), ('Bag', 1.0)])
+        self.assertEqual(self.related(self.mug), [])
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/products/{self.camera._id}/related/')
+
+    def test_paying_an_order_updates_neighbours_incrementally(self):
+        from .recommend_utils import rebuild_copurchase_neighbors
+        self.order(self.camera, self.lens)
+        rebuild_copurchase_neighbors()
+        order = self.order(self.camera, self.lens, self.bag, paid=False)
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.client.put(f'/api/orders/{order._id}/pay/', {'id': 'PAY-1'}, format='json')
+        self.client.put(f'/api/orders/{order._id}/pay/', {'id': 'PAY-1'}, format='json')
+        self.assertEqual(self.related(self.camera), [('Lens', 2.0), ('Bag', 1.0)])
+        self.assertEqual(self.related(self.bag), [('Camera', 1.0), ('Lens', 1.0)])
+
+
+class SimilarProductTests(APITestCase):
+    def test_tfidf_neighbours_rank_by_shared_terms(self):
+        from .models import Product, ProductNeighbor
+        from .recommend_utils import rebuild_similar_neighbors
+        trail = Product.objects.create(name='Trail Running Shoes', brand='Salomon', category='Footwear',
+                                       description='Lightweight trail shoes with grippy outsole')
+        Product.objects.create(name='Road Running Shoes', brand='Asics', category='Footwear',
+                               description='Cushioned road shoes')
+        vest = Product.objects.create(name='Trail Running Vest', brand='Salomon', category='Running Gear',
+                                      description='Hydration vest for trail runs')
+        espresso = Product.objects.create(name='Espresso Machine', brand='Breville', category='Kitchen',
+                                          description='Pump espresso machine')
+        ProductNeighbor.objects.create(product=espresso, neighbor=vest, kind=ProductNeighbor.SIMILAR, score=1)
+        self.assertGreater(rebuild_similar_neighbors(top_n=5, chunk_size=1), 0)
+        self.assertFalse(ProductNeighbor.objects.filter(product=espresso).exists())
+
+        res = self.client.get(f'/api/products/{trail._id}/similar/')
+        names = [item['name'] for item in res.data['results']]
+        self.assertEqual(set(names), {'Road Running Shoes', 'Trail Running Vest'})
+        self.assertTrue(all(0 < item['score'] <= 1 for item in res.data['results']))
+        self.assertEqual(self.client.get('/api/products/abc/similar/').status_code, 400)
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        from .models import Product, Order, OrderItem, ShippingAddress
+        self.admin = User.objects.create_superuser(username='admin', password='pass12345', email='a@example.com')
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.product = Product.objects.create(name='Kettle', brand='Acme', price=30, description='Boils water')
+        for _ in range(3):
+            order = Order.objects.create(user=self.admin, totalPrice=30, paymentMethod='PayPal')
+            OrderItem.objects.create(order=order, product=self.product, name='Kettle', qty=1, price=30)
+            ShippingAddress.objects.create(order=order, address='1 Main St')
+
+    def get(self, url, params):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, params)
+        return res, ' '.join(q['sql'] for q in ctx.captured_queries)
+
+    def test_orders_prune_columns_and_relations(self):
+        res, sql = self.get('/api/orders/', {'fields': '_id,totalPrice,isPaid'})
+        self.assertEqual(set(res.data['results'][0]), {'_id', 'totalPrice', 'isPaid'})
+        self.assertNotIn('base_orderitem', sql)
+        self.assertNotIn('base_shippingaddress', sql)
+        self.assertNotIn('paymentResult', sql)
+
+        res, sql = self.get('/api/orders/', {'omit': 'shippingaddress'})
+        self.assertEqual(len(res.data['results'][0]['orderitems']), 1)
+        self.assertNotIn('shippingaddress', res.data['results'][0])
+        self.assertNotIn('base_shippingaddress', sql)
+
+        res, _ = self.get('/api/orders/my-orders/', {'fields': '_id,orderitems'})
+        self.assertEqual(set(res.data[0]), {'_id', 'orderitems'})
+
+    def test_products_users_and_detail(self):
+        res, sql = self.get('/api/products/', {'fields': '_id,name,price'})
+        self.assertEqual(set(res.data['results'][0]), {'_id', 'name', 'price'})
+        self.assertNotIn('"brand"', sql)
+
+        res, _ = self.get('/api/users/', {'omit': 'isAdmin,is_staff'})
+        self.assertNotIn('isAdmin', res.data['results'][0])
+
+        res, sql = self.get(f'/api/products/{self.product._id}/', {'fields': 'name,price'})
+        self.assertEqual(set(res.data), {'name', 'price'})
+        self.assertNotIn('base_review', sql)
+        self.assertNotIn('"description"', sql)
+        full = self.client.get(f'/api/products/{self.product._id}/')
+        self.assertIn('reviews', full.data)
+        self.assertEqual(full.data['description'], 'Boils water')
+
+
+class MultiCurrencyPriceTests(APITestCase):
+    def setUp(self):
+        from .models import Product
+        from .cache_utils import product_list_cache
+        from .fx_utils import load_rates
+        product_list_cache.clear()
+        load_rates({'JPY': 150, 'EUR': '0.8'})
+        self.yen = Product.objects.create(name='Teapot', price=3000, priceCurrency='JPY')     # 20 USD
+        self.usd = Product.objects.create(name='Lamp', price=50, priceCurrency='USD')         # 50 USD
+        self.eur = Product.objects.create(name='Clock', price=24, priceCurrency='EUR')        # 30 USD
+
+    def names(self, params):
+        return [p['name'] for p in self.client.get('/api/products/', params).data['results']]
+
+    def test_sort_and_filter_on_normalized_price(self):
+        self.assertEqual(self.names({'sort': 'price_asc'}), ['Teapot', 'Clock', 'Lamp'])
+        self.assertEqual(self.names({'sort': 'price_desc'}), ['Lamp', 'Clock', 'Teapot'])
+        self.assertEqual(self.names({'min_price': 25, 'max_price': 40}), ['Clock'])
+        # Bounds are read in the display currency: 4000-6000 JPY is 26.67-40 USD
+        self.assertEqual(self.names({'min_price': 4000, 'max_price': 6000, 'currency': 'JPY'}), ['Clock'])
+
+    def test_currency_display_and_reprice(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .fx_utils import load_rates
+        res = self.client.get('/api/products/', {'currency': 'EUR', 'sort': 'price_asc'})
+        self.assertEqual([(p['displayPrice'], p['displayCurrency']) for p in res.data['results']],
+                         [('16.00', 'EUR'), ('24.00', 'EUR'), ('40.00', 'EUR')])
+        self.assertEqual(self.client.get('/api/products/', {'currency': 'XYZ'}).status_code, 400)
+
+        out = StringIO()
+        etag = self.client.get(f'/api/products/{self.yen._id}/')['ETag']
+        lamp_etag = self.client.get(f'/api/products/{self.usd._id}/')['ETag']
+        call_command('load_fx_rates', '--rate', 'JPY=60', stdout=out)
+        # Only the yen price changed, so the other products keep their updated_at
+        self.assertIn('repriced 1 products', out.getvalue())
+        stale_at, lamp_at = self.yen.updated_at, self.usd.updated_at
+        self.yen.refresh_from_db()
+        self.usd.refresh_from_db()
+        self.assertEqual(self.yen.priceBase, 50)
+        self.assertGreater(self.yen.updated_at, stale_at)
+        self.assertEqual(self.usd.updated_at, lamp_at)
+        self.assertEqual(load_rates({'JPY': 60, 'EUR': '0.8'}), 0)
+        self.assertEqual(self.client.get(f'/api/products/{self.usd._id}/')['ETag'], lamp_etag)
+        self.assertNotEqual(self.client.get(f'/api/products/{self.yen._id}/')['ETag'], etag)
+        self.assertEqual(self.names({'sort': 'price_asc'})[0], 'Clock')
+
+
+class OrderPlacementTests(APITestCase):
+    def setUp(self):
+        from .models import Product
+        self.user = User.objects.create_user(username='shopper', email='s@example.com', password='pass12345')
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.pen = Product.objects.create(name='Pen', price=2, countInStock=5)
+        self.ink = Product.objects.create(name='Ink', price=8, countInStock=1)
+
+    def place(self, *lines):
+        return self.client.post('/api/orders/', {
+            'paymentMethod': 'PayPal', 'totalPrice': 10,
+            'orderItems': [{'product': p._id, 'qty': qty, 'price': str(p.price)} for p, qty in lines],
+            'shippingAddress': {'address': '1 Main St', 'city': 'Lagos', 'postalCode': '100001', 'country': 'NG'},
+        }, format='json')
+
+    def test_order_is_written_in_batches_and_reserves_stock(self):
+        from .models import Order
+        with self.assertNumQueries(15):
+            # auth user, 2 savepoints, in_bulk, 2 stock updates, order, items, event,
+            # address, release, the items read by the email, the outbox row,
+            # release, then the items read by the serializer
+            # (the catalog bump runs on commit, which TestCase never reaches)
+            res = self.place((self.pen, 2), (self.ink, 1))
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(len(res.data['orderitems']), 2)
+        self.pen.refresh_from_db()
+        self.ink.refresh_from_db()
+        self.assertEqual((self.pen.countInStock, self.ink.countInStock), (3, 0))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_out_of_stock_rolls_back_the_whole_order(self):
+        from .models import Order, OrderItem
+        res = self.place((self.pen, 1), (self.ink, 2))
+        self.assertEqual(res.status_code, 409)
+        self.assertEqual(res.data['product'], self.ink._id)
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.countInStock, 5)
+        self.assertFalse(Order.objects.exists() or OrderItem.objects.exists())
+        self.assertEqual(self.place().status_code, 400)
+
+
+class IdempotencyKeyTests(APITestCase):
+    def setUp(self):
+        from .models import Product
+        self.user = User.objects.create_user(username='retry', email='r@example.com', password='pass12345')
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.product = Product.objects.create(name='Cable', price=5, countInStock=10)
+        self.payload = {'paymentMethod': 'PayPal', 'totalPrice': 5,
+                        'orderItems': [{'product': self.product._id, 'qty': 1, 'price': '5.00'}]}
+
+    def post(self, key, payload=None):
+        return self.client.post('/api/orders/', payload or self.payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_order_is_replayed_not_duplicated(self):
+        from .models import Order
+        first = self.post('abc-123')
+        retry = self.post('abc-123')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['_id'], first.data['_id'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.countInStock, 9)
+
+        self.assertEqual(self.post('abc-123', {**self.payload, 'totalPrice': 6}).status_code, 422)
+        self.post('other-key')
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_payment_retry_and_expiry(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from .models import IdempotencyKey
+        from .idempotency_utils import purge_expired_keys
+        order_id = self.post('order-1').data['_id']
+        url = f'/api/orders/{order_id}/pay/'
+        with mock.patch('base.views.send_payment_confirmation_email') as send:
+            self.client.put(url, {'id': 'PAY-9'}, format='json', HTTP_IDEMPOTENCY_KEY='pay-1')
+            replay = self.client.put(url, {'id': 'PAY-9'}, format='json', HTTP_IDEMPOTENCY_KEY='pay-1')
+            # A second payment callback for an already paid order sends nothing
+            self.client.put(url, {'id': 'PAY-9'}, format='json', HTTP_IDEMPOTENCY_KEY='pay-2')
+        self.assertEqual(send.call_count, 1)
+        self.assertTrue(replay.data['isPaid'])
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(purge_expired_keys(), 3)
+
+
+class AdminOrderListTests(APITestCase):
+    def setUp(self):
+        from .models import Order, OrderItem, Product, ShippingAddress
+        self.admin = User.objects.create_superuser(username='boss', password='pass12345', email='boss@example.com')
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.customer = User.objects.create_user(username='ada', email='Ada@Example.com', password='pass12345',
+                                                 first_name='Ada', last_name='Lovelace')
+        product = Product.objects.create(name='Notebook', price=4)
+        self.orders = []
+        for i in range(60):
+            order = Order.objects.create(user=self.customer if i % 2 else self.admin, totalPrice=4)
+            OrderItem.objects.create(order=order, product=product, name='Notebook', qty=1, price=4)
+            ShippingAddress.objects.create(order=order, address=f'{i} Main St')
+            self.orders.append(order)
+
+    def test_page_size_does_not_change_query_count(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        counts = []
+        for size in (5, 50):
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get('/api/orders/', {'page_size': size})
+            self.assertEqual(len(res.data['results']), size)
+            self.assertEqual(len(res.data['results'][0]['orderitems']), 1)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_search_paths(self):
+        target = self.orders[11]
+        res = self.client.get('/api/orders/', {'q': str(target._id)})
+        self.assertEqual([o['_id'] for o in res.data['results']], [target._id])
+        res = self.client.get('/api/orders/', {'q': 'ada@example.com', 'page_size': 100})
+        self.assertEqual(res.data['count'], 30)
+        self.assertEqual(res.data['results'][0]['customerName'], 'Ada Lovelace')
+        self.assertEqual(self.client.get('/api/orders/', {'q': 'lovel'}).data['count'], 30)
+
+        self.customer.email = 'ada@lovelace.dev'
+        self.customer.save()
+        self.assertEqual(self.client.get('/api/orders/', {'q': 'ada@lovelace.dev'}).data['count'], 30)
+
+
+class MyOrdersTests(APITestCase):
+    def setUp(self):
+        from .models import Order, OrderItem, Product
+        self.user = User.objects.create_user(username='regular', password='pass12345')
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        other = User.objects.create_user(username='other', password='pass12345')
+        product = Product.objects.create(name='Mug', price=8)
+        Order.objects.create(user=other, totalPrice=1)
+        self.orders = []
+        for i in range(25):
+            order = Order.objects.create(user=self.user, totalPrice=8 * (i + 1))
+            OrderItem.objects.create(order=order, product=product, name='Mug', qty=i + 1, price=8, image=f'/img/{i}.jpg')
+            OrderItem.objects.create(order=order, product=product, name='Mug', qty=2, price=8, image='/img/second.jpg')
+            self.orders.append(order)
+
+    def test_cursor_pages_cover_all_orders(self):
+        seen, cursor = [], None
+        while True:
+            params = {'page_size': 10, **({'cursor': cursor} if cursor else {})}
+            res = self.client.get('/api/orders/my-orders/', params)
+            self.assertEqual(res.status_code, 200)
+            seen += [o['_id'] for o in res.data['results']]
+            cursor = res.data['next_cursor']
+            if not res.data['has_next']:
+                break
+        self.assertEqual(seen, [o._id for o in reversed(self.orders)])
+        self.assertEqual(self.client.get('/api/orders/my-orders/', {'cursor': '!!'}).status_code, 400)
+
+    def test_page_numbers_use_page_mode(self):
+        first = self.client.get('/api/orders/my-orders/', {'page': 1, 'page_size': 5}).data
+        second = self.client.get('/api/orders/my-orders/', {'page': 2, 'page_size': 5}).data
+        self.assertEqual((second['current_page'], second['count']), (2, len(self.orders)))
+        self.assertEqual(second['num_pages'], -(-len(self.orders) // 5))
+        self.assertEqual([o['_id'] for o in first['results'] + second['results']],
+                         [o._id for o in reversed(self.orders)][:10])
+
+    def test_plain_list_without_paging_params(self):
+        res = self.client.get('/api/orders/my-orders/')
+        self.assertIsInstance(res.data, list)
+        self.assertEqual([o['_id'] for o in res.data], [o._id for o in reversed(self.orders)])
+
+    def test_summary_is_one_query(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get('/api/orders/my-orders/', {'view': 'summary', 'page_size': 5})
+        self.assertEqual(len([q for q in ctx.captured_queries if 'base_order' in q['sql']]), 1)
+        row = res.data['results'][0]
+        self.assertEqual(set(row), {'_id', 'created_at', 'status', 'isPaid', 'isDelivered',
+                                    'totalPrice', 'itemCount', 'firstItemImage'})
+        self.assertEqual(row['_id'], self.orders[-1]._id)
+        self.assertEqual(row['itemCount'], 27)
+        self.assertEqual(row['firstItemImage'], '/img/24.jpg')
+
+        detail = self.client.get(f'/api/orders/{row["_id"]}/')
+        self.assertEqual(len(detail.data['orderitems']), 2)
+
+
+class OrderStatusTests(APITestCase):
+    def setUp(self):
+        from .models import Order
+        self.admin = User.objects.create_superuser(username='boss', password='pass12345', email='boss@example.com')
+        self.customer = User.objects.create_user(username='cust', password='pass12345', email='cust@example.com')
+        self.order = Order.objects.create(user=self.customer, totalPrice=10, isPaid=True)
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def track(self, **data):
+        return self.client.put(f'/api/orders/{self.order._id}/update-tracking/', data, format='json')
+
+    def test_transitions_are_validated_and_logged(self):
+        self.assertEqual(self.track(status='processing').status_code, 200)
+        # Skipped fulfilment stages are stepped through and logged
+        res = self.track(status='delivered', tracking_number='TRK1')
+        self.assertTrue(res.data['order']['isDelivered'])
+        self.assertEqual(self.track(status='pending').status_code, 400)
+        self.assertEqual(self.client.put(f'/api/orders/{self.order._id}/', {'isDelivered': False},
+                                         format='json').status_code, 400)
+
+        res = self.client.get(f'/api/orders/{self.order._id}/tracking/')
+        self.assertEqual([(e['event'], e['toStatus']) for e in res.data['events']], [
+            ('status', 'processing'), ('tracking', None), ('status', 'shipped'), ('status', 'delivered'),
+        ])
+        since = res.data['events'][1]['created_at']
+        res = self.client.get(f'/api/orders/{self.order._id}/tracking/', {'since': since.isoformat()})
+        self.assertEqual([e['toStatus'] for e in res.data['events']], ['shipped', 'delivered'])
+
+    def test_rejected_transition_writes_nothing(self):
+        from .models import Order, OrderEvent
+        cancelled = Order.objects.create(user=self.customer, totalPrice=10, status='cancelled')
+        res = self.client.put(f'/api/orders/{cancelled._id}/update-tracking/',
+                              {'status': 'delivered', 'tracking_number': 'TRK1'}, format='json')
+        self.assertEqual(res.status_code, 400)
+        cancelled.refresh_from_db()
+        self.assertIsNone(cancelled.tracking_number)
+        self.assertFalse(OrderEvent.objects.filter(order=cancelled).exists())
+
+        res = self.client.patch(f'/api/orders/{cancelled._id}/', {'isPaid': True, 'isDelivered': True}, format='json')
+        self.assertEqual(res.status_code, 400)
+        cancelled.refresh_from_db()
+        self.assertFalse(cancelled.isPaid)
+        self.assertFalse(OrderEvent.objects.filter(order=cancelled).exists())
+
+    def test_delivered_flag_steps_through_fulfilment(self):
+        from .models import Order, OrderEvent
+        order = Order.objects.create(user=self.customer, totalPrice=10)
+        res = self.client.patch(f'/api/orders/{order._id}/', {'isPaid': True, 'isDelivered': True}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.data['isPaid'])
+        self.assertTrue(res.data['isDelivered'])
+        self.assertEqual(
+            list(OrderEvent.objects.filter(order=order).order_by('_id').values_list('event', 'toStatus')),
+            [('payment', 'pending'), ('status', 'processing'), ('status', 'shipped'), ('status', 'delivered')],
+        )
+
+    def test_refund_and_changed_since(self):
+        from django.utils import timezone
+        from .models import Order, OrderEvent
+        before = timezone.now()
+        untouched = Order.objects.create(user=self.customer, totalPrice=5)
+        res = self.client.post(f'/api/orders/{self.order._id}/refund/', {'reason': 'Damaged'}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.isRefunded), ('refunded', True))
+        self.assertEqual(self.client.post(f'/api/orders/{self.order._id}/refund/').status_code, 400)
+
+        res = self.client.get('/api/orders/', {'changed_since': before.isoformat()})
+        self.assertEqual([o['_id'] for o in res.data['results']], [self.order._id])
+        self.assertNotIn(untouched._id, [o['_id'] for o in res.data['results']])
+        self.assertEqual(self.client.get('/api/orders/', {'changed_since': 'yesterday'}).status_code, 400)
+
+        event = OrderEvent.objects.get(order=self.order)
+        self.assertEqual(event.note, 'Damaged')
+        event.note = 'edited'
+        with self.assertRaises(ValueError):
+            event.save()
+
+
+class FlakyEmailBackend(LocmemEmailBackend):
+    """Test backend that counts opened connections and rejects subjects containing "fail"."""
+    opened = 0
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if any('fail' in message.subject for message in messages):
+            raise OSError('mailbox unavailable')
+        return super().send_messages(messages)
+
+
+class EmailOutboxTests(APITestCase):
+    def setUp(self):
+        from .models import Product
+        self.user = User.objects.create_user(username='mailer', email='m@example.com', password='pass12345')
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.product = Product.objects.create(name='Lamp', price=30, countInStock=1)
+        FlakyEmailBackend.opened = 0
+
+    def order(self):
+        return self.client.post('/api/orders/', {
+            'paymentMethod': 'PayPal', 'totalPrice': 30,
+            'orderItems': [{'product': self.product._id, 'qty': 1, 'price': '30'}],
+        }, format='json')
+
+    def test_checkout_queues_email_for_the_worker(self):
+        from io import StringIO
+        from django.core import mail
+        from django.core.management import call_command
+        from .models import OutboxEmail
+        self.assertEqual(self.order().status_code, 201)
+        self.assertEqual(self.order().status_code, 409)
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+        out = StringIO()
+        call_command('process_outbox', stdout=out)
+        self.assertIn('Sent 1 emails', out.getvalue())
+        self.assertEqual(mail.outbox[0].to, ['m@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.SENT)
+
+    def test_batches_share_one_connection_and_failures_back_off(self):
+        from datetime import timedelta
+        from django.core import mail
+        from django.test import override_settings
+        from django.utils import timezone
+        from .models import OutboxEmail
+        from .outbox_utils import process_outbox, queue_mail
+        for i in range(5):
+            queue_mail(f'Hello {i}', 'body', None, ['a@example.com'])
+        broken = queue_mail('This will fail', 'body', None, ['b@example.com'])
+
+        with override_settings(EMAIL_BACKEND='base.tests.FlakyEmailBackend', OUTBOX_MAX_ATTEMPTS=2):
+            totals = process_outbox(batch_size=2)
+            self.assertEqual(totals, {'sent': 5, 'retried': 1, 'dead': 0})
+            self.assertEqual(FlakyEmailBackend.opened, 1)
+            self.assertEqual(len(mail.outbox), 5)
+            broken.refresh_from_db()
+            self.assertEqual((broken.status, broken.attempts), (OutboxEmail.PENDING, 1))
+            self.assertGreater(broken.next_attempt_at, timezone.now())
+            self.assertIn('mailbox unavailable', broken.last_error)
+
+            self.assertEqual(process_outbox(), {'sent': 0, 'retried': 0, 'dead': 0})
+            OutboxEmail.objects.filter(pk=broken.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(process_outbox(), {'sent': 0, 'retried': 0, 'dead': 1})
+        broken.refresh_from_db()
+        self.assertEqual((broken.status, broken.attempts), (OutboxEmail.DEAD, 2))
+
+
+class EmailTemplateTests(APITestCase):
+    def setUp(self):
+        from .models import Order, OrderItem, ShippingAddress
+        self.user = User.objects.create_user(username='tom', first_name='Tom <b>', email='tom@example.com')
+        self.orders = []
+        for i in range(3):
+            order = Order.objects.create(user=self.user, totalPrice=25, shippingPrice=4, taxPrice=1)
+            OrderItem.objects.create(order=order, name=f'Cup {i}', qty=2, price=10)
+            ShippingAddress.objects.create(order=order, address=f'{i} High St', city='Accra')
+            self.orders.append(order)
+
+    def test_emails_have_escaped_html_and_plain_text(self):
+        from .email_utils import send_order_confirmation_email
+        from .models import OutboxEmail
+        send_order_confirmation_email(self.orders[0], self.user)
+        row = OutboxEmail.objects.get()
+        self.assertIn('Tom &lt;b&gt;', row.html)
+        self.assertIn('.items-table', row.html)
+        self.assertIn('- Cup 0 x 2 @ $10.00 = $20.00', row.body)
+        self.assertIn('Subtotal: $20.00', row.body)
+        self.assertNotIn('<', row.body.replace('Tom <b>', ''))
+
+    def test_batch_render_uses_one_query_per_relation(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .email_utils import queue_order_emails
+        from .models import Order, OutboxEmail
+        with self.assertNumQueries(5):
+            # orders, users, items, addresses, then one outbox insert
+            rows = queue_order_emails('order_confirmation', Order.objects.order_by('_id'))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([row.subject for row in OutboxEmail.objects.order_by('_id')],
+                         [f'Order Confirmation - mamigloexclusive #{o._id}' for o in self.orders])
+
+        out = StringIO()
+        call_command('benchmark_email_render', '--count', '3', stdout=out)
+        self.assertIn('us/email', out.getvalue())
+
+
+class TransferReminderTests(APITestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import Order
+        now = timezone.now()
+
+        def order(username, age_hours=72, **fields):
+            user = User.objects.filter(username=username).first() or User.objects.create_user(
+                username=username, email=f'{username}@example.com')
+            created = Order.objects.create(user=user, paymentMethod='Transfer', totalPrice=40, **fields)
+            Order.objects.filter(pk=created.pk).update(created_at=now - timedelta(hours=age_hours))
+            return created
+
+        self.ann_first, self.ann_second = order('ann'), order('ann')
+        self.bob = order('bob')
+        order('cat', age_hours=1)
+        order('dan', transferConfirmedAt=now)
+        order('eve', transferRemindedAt=now - timedelta(hours=1))
+        order('eve')
+        order('fay', isPaid=True)
+
+    def test_one_reminder_per_due_customer_lists_all_due_orders(self):
+        from io import StringIO
+        from django.core import mail
+        from django.core.management import call_command
+        from .email_utils import queue_transfer_reminders
+        from .models import OutboxEmail
+        self.assertEqual(queue_transfer_reminders(dry_run=True), 2)
+        with self.assertNumQueries(6):
+            # candidate scan, savepoint, users, outbox insert, reminded update, release
+            self.assertEqual(queue_transfer_reminders(batch_size=10), 2)
+        self.assertEqual(sorted(OutboxEmail.objects.values_list('to', flat=True)),
+                         [['ann@example.com'], ['bob@example.com']])
+        ann = OutboxEmail.objects.get(to=['ann@example.com'])
+        self.assertIn('2 orders', ann.body)
+        for order in (self.ann_first, self.ann_second):
+            self.assertIn(f'Order #{order._id} - amount due: $40.00', ann.body)
+            self.assertIn(f'/order/{order._id}', ann.html)
+            order.refresh_from_db()
+            self.assertIsNotNone(order.transferRemindedAt)
+
+        OutboxEmail.objects.all().delete()
+        out = StringIO()
+        call_command('send_transfer_reminders', stdout=out)
+        self.assertIn('Queued 0 transfer reminders', out.getvalue())
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_command_sends_over_the_outbox(self):
+        from io import StringIO
+        from django.core import mail
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('send_transfer_reminders', '--batch-size', '1', stdout=out)
+        self.assertIn('Queued 2 transfer reminders', out.getvalue())
+        self.assertIn('Sent 2 emails', out.getvalue())
+        self.assertEqual(sorted(m.subject for m in mail.outbox), sorted(
+            f'Payment Reminder - Bank Transfer for Order #{o._id}' for o in (self.ann_first, self.bob)))
+
+
+class ConcurrentCheckoutTests(APITransactionTestCase):
+    def test_parallel_checkouts_never_oversell(self):
+        import threading
+        import time
+        from django.db import connection, OperationalError
+        from .models import Order, Product
+        from .order_utils import place_order, OutOfStock
+        user = User.objects.create_user(username='rush', password='pass12345')
+        product = Product.objects.create(name='Limited Sneaker', price=100, countInStock=3)
+        barrier = threading.Barrier(8)
+        outcomes = []
+
+        def checkout():
+            try:
+                barrier.wait()
+                for attempt in range(50):
+                    try:
+                        place_order(user, {'orderItems': [{'product': product._id, 'qty': 1, 'price': 100}]})
+                        outcomes.append('ok')
+                        return
+                    except OperationalError:
+                        # SQLite "database is locked": back off and retry like a client would
+                        time.sleep(0.005 * (attempt + 1))
+                outcomes.append('locked')
+            except OutOfStock:
+                outcomes.append('sold out')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(outcomes.count('ok'), 3, outcomes)
+        self.assertEqual(outcomes.count('sold out'), 5, outcomes)
+        self.assertEqual(product.countInStock, 0)
+        self.assertEqual(Order.objects.count(), 3)
+
+
+class ProductQueryPlanTests(APITestCase):
+    """Every supported listing filter/sort combination must be served by an index."""
+
+    FILTERS = {
+        'none': {},
+        'category': {'category': 'Electronics'},
+        'brand': {'brand': 'Apple'},
+        'price': {'min_price': '10', 'max_price': '100'},
+        'rating': {'rating': '4'},
+        'in_stock': {'in_stock': 'true'},
+    }
+    SORTS = ('newest', 'price_asc', 'price_desc', 'rating')
+
+    def setUp(self):
+        from .models import Product
+        for i in range(20):
+            Product.objects.create(name=f'P{i}', brand='Apple', category='Electronics',
+                                   price=i * 10, rating=i % 5, countInStock=i % 2)
+
+    def explain(self, params):
+        from django.db import connection, transaction
+        from django.test import RequestFactory
+        from rest_framework.request import Request
+        from .models import Product
+        from .views import filter_products
+        request = Request(RequestFactory().get('/api/products/', params))
+        qs = filter_products(request, Product.objects.order_by('-created_at'))[:10]
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    # Tiny test tables would otherwise always be seq-scanned
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            return qs.explain()
+
+    def assertUsesIndex(self, plan, label):
+        from django.db import connection
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan', plan, f'{label}: {plan}')
+        else:
+            for line in plan.splitlines():
+                if 'SCAN' in line and 'base_product' in line:
+                    self.assertIn('INDEX', line, f'{label}: {plan}')
+            self.assertIn('INDEX', plan, f'{label}: {plan}')
+
+    def test_filter_sort_combinations_use_indexes(self):
+        for filter_name, params in self.FILTERS.items():
+            for sort in self.SORTS:
+                with self.subTest(filter=filter_name, sort=sort):
+                    plan = self.explain({**params, 'sort': sort})
+                    self.assertUsesIndex(plan, f'{filter_name}/{sort}')
+
+    def test_category_filter_uses_lower_index(self):
+        plan = self.explain({'category': 'electronics'})
+        self.assertIn('product_category_lower_idx', plan)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        from .models import Product, Order
+        from .cache_utils import product_list_cache
+        product_list_cache.clear()
+        self.product = Product.objects.create(name='Chair', category='Home', price=40)
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        self.order = Order.objects.create(user=self.user, paymentMethod='PayPal', totalPrice=40)
+
+    def test_product_detail_etag_and_last_modified(self):
+        from .models import Review
+        url = f'/api/products/{self.product._id}/'
+        res = self.client.get(url)
+        etag = res['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=res['Last-Modified']).status_code, 304)
+        # A different review page is a different representation
+        self.assertEqual(self.client.get(url, {'reviews_page': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        Review.objects.create(product=self.product, rating=4, comment='Comfy')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_product_list_aggregate_etag(self):
+        res = self.client.get('/api/products/', {'category': 'home'})
+        etag = res['ETag']
+        self.assertEqual(self.client.get('/api/products/', {'category': 'home'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get('/api/products/', {'category': 'garden'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.product.price = 35
+        self.product.save()
+        self.assertEqual(self.client.get('/api/products/', {'category': 'home'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_order_tracking_etag(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        url = f'/api/orders/{self.order._id}/tracking/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.order.status = 'processing'
+        self.order.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ProductCatalogIndexTests(APITestCase):
+    def test_static_fallback_matches_string_ids(self):
+        res = self.client.get('/api/products/3/')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['_id'], '3')
+        self.assertEqual(self.client.get('/api/products/999/').status_code, 404)
+
+    def test_index_lookups_are_normalized(self):
+        from .catalog_utils import static_catalog
+        self.assertEqual(static_catalog.get(' 003 ')['_id'], '3')
+        self.assertTrue(static_catalog.find_by_name('AIRPODS wireless  bluetooth headphones'))
+        self.assertTrue(all(p['category'] == 'Electronics' for p in static_catalog.in_category('electronics')))
+
+    def test_read_through_detail_cache_refreshes_on_change(self):
+        from .models import Product
+        from .catalog_utils import product_detail_cache
+        product_detail_cache.refresh()
+        product = Product.objects.create(name='Vase', category='Home', price=15)
+        url = f'/api/products/{product._id}/'
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            res = self.client.get(url)
+        self.assertEqual(res.data['name'], 'Vase')
+        product.name = 'Tall Vase'
+        product.save()
+        self.assertEqual(self.client.get(url).data['name'], 'Tall Vase')
+
+
+class ProductBulkImportExportTests(APITestCase):
+    def setUp(self):
+        from .models import Product
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='pw', is_staff=True)
+        refresh = RefreshToken.for_user(self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.existing = Product.objects.create(name='Old Name', category='Home', price=5, countInStock=1)
+
+    def upload(self, name, content, **params):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        upload = SimpleUploadedFile(name, content.encode())
+        return self.client.post('/api/products/import/?' + '&'.join(f'{k}={v}' for k, v in params.items()),
+                                {'file': upload}, format='multipart')
+
+    def test_csv_import_creates_updates_and_reports_errors(self):
+        from .models import Product
+        csv_data = (
+            'name,category,price,countInStock,_id\n'
+            'Lamp,Home,19.99,4,\n'
+            'Renamed,,7.50,,%d\n'
+            'Broken,Home,not-a-price,1,\n'
+            'Ghost,Home,1,1,9999\n'
+            'Rug,Home,45,2,\n'
+        ) % self.existing._id
+        res = self.upload('products.csv', csv_data, batch_size=2)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data['created'], res.data['updated'], res.data['error_count']), (2, 1, 2))
+        self.assertEqual(sorted(e['row'] for e in res.data['errors']), [4, 5])
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.category), ('Renamed', 'Home'))
+        self.assertTrue(Product.objects.filter(name='Rug', price=45).exists())
+        # bulk writes bypass signals but must still reach the search index
+        self.assertEqual(len(self.client.get('/api/products/', {'search': 'lamp'}).data['results']), 1)
+
+    def test_ndjson_import(self):
+        res = self.upload('products.ndjson', '{"name": "Cup", "price": "3"}\nnot json\n\n{"name": "Bowl"}\n')
+        self.assertEqual((res.data['created'], res.data['error_count']), (2, 1))
+        self.assertEqual(res.data['errors'][0]['row'], 2)
+
+    def test_streaming_export(self):
+        import csv
+        import json
+        res = self.client.get('/api/products/export/', {'fmt': 'csv'})
+        self.assertTrue(res.streaming)
+        rows = list(csv.DictReader(b''.join(res.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0]['name'], 'Old Name')
+        res = self.client.get('/api/products/export/', {'fmt': 'ndjson'})
+        line = json.loads(b''.join(res.streaming_content).decode().splitlines()[0])
+        self.assertEqual(line['price'], '5.00')
+
+    def test_management_command(self):
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('name,price\nTeapot,12\n')
+        self.addCleanup(os.unlink, f.name)
+        out = StringIO()
+        call_command('import_products', f.name, stdout=out, stderr=StringIO())
+        self.assertIn('1 created', out.getvalue())
+
+
+class ProductBulkUpdateTests(APITestCase):
+    def setUp(self):
+        from .models import Product
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='pw', is_staff=True)
+        refresh = RefreshToken.for_user(self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.a = Product.objects.create(name='A', price=10, countInStock=1)
+        self.b = Product.objects.create(name='B', price=20, countInStock=2)
+
+    def test_applies_changes_and_reports_conflicts(self):
+        stale = '2000-01-01T00:00:00Z'
+        payload = [
+            {'_id': self.a._id, 'price': '12.50', 'priceCurrency': 'EUR'},
+            {'_id': self.b._id, 'countInStock': 9, 'updated_at': stale},
+            {'_id': self.a._id, 'countInStock': 3},
+            {'_id': 999, 'price': '1'},
+            {'_id': self.b._id, 'priceCurrency': 'XXX'},
+        ]
+        # auth user, FX rates (catalog version + rates), savepoint, in_bulk, bulk_update,
+        # release, catalog version bump
+        with self.assertNumQueries(8):
+            res = self.client.patch('/api/products/bulk-update/', payload, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['updated'], 1)
+        self.assertEqual([c['index'] for c in res.data['conflicts']], [1, 2, 3, 4])
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((str(self.a.price), self.a.priceCurrency, self.a.countInStock), ('12.50', 'EUR', 1))
+        self.assertEqual(self.b.countInStock, 2)
+
+    def test_rejects_negative_price_and_stock(self):
+        payload = [{'_id': self.a._id, 'price': '-1'}, {'_id': self.b._id, 'countInStock': -5}]
+        res = self.client.patch('/api/products/bulk-update/', payload, format='json')
+        self.assertEqual(res.data['updated'], 0)
+        self.assertEqual([c['index'] for c in res.data['conflicts']], [0, 1])
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((str(self.a.price), self.b.countInStock), ('10.00', 2))
+
+    def test_requires_admin(self):
+        self.client.credentials()
+        res = self.client.patch('/api/products/bulk-update/', [], format='json')
+        self.assertEqual(res.status_code, 401)
+
+
+class ProductImageVariantTests(APITestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root, IMAGE_VARIANTS_ASYNC=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def make_upload(self, color='red', size=(1200, 800)):
+        import io
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        buffer = io.BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'PNG')
+        return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+    def test_variants_built_after_commit_and_exposed(self):
+        from .models import Product
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name='Poster', image=self.make_upload())
+        product.refresh_from_db()
+        self.assertEqual(product.imageVariants['source'], product.image.name)
+        self.assertEqual(set(product.imageVariants) - {'source'}, {'thumb', 'card', 'full'})
+
+        res = self.client.get(f'/api/products/{product._id}/')
+        thumb = res.data['imageVariants']['thumb']['webp']
+        self.assertRegex(thumb, r'/media/variants/[0-9a-f]{20}\.webp$')
+        listed = self.client.get('/api/products/').data['results'][0]
+        self.assertEqual(listed['imageVariants']['card'], res.data['imageVariants']['card'])
+
+        served = self.client.get(thumb)
+        self.assertEqual(served.status_code, 200)
+        self.assertEqual(served['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_variant_dimensions_and_content_hash_dedup(self):
+        from PIL import Image
+        from django.core.files.storage import default_storage
+        from .image_utils import render_variants
+        first = render_variants(self.make_upload())
+        second = render_variants(self.make_upload())
+        self.assertEqual(first, second)
+        with default_storage.open(first['thumb']['jpeg']) as f:
+            self.assertEqual(Image.open(f).size, (200, 133))
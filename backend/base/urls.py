@@ -26,7 +26,16 @@ urlpatterns = [
     path('messages/<int:pk>/', views.contactMessageDetail, name='contact-message-detail'),
     path('products/create/', views.createProduct, name='product-create'),
     path('products/', views.getProducts, name='products'),
+    path('products/suggest/', views.getProductSuggestions, name='product-suggest'),
+    path('products/facets/', views.getProductFacets, name='product-facets'),
+    path('products/import/', views.importProducts, name='products-import'),
+    path('products/export/', views.exportProducts, name='products-export'),
+    path('products/bulk-update/', views.bulkUpdateProducts, name='products-bulk-update'),
+    path('products/<str:pk>/related/', views.getRelatedProducts, name='product-related'),
+    path('products/<str:pk>/similar/', views.getSimilarProducts, name='product-similar'),
+    path('products/<str:pk>/reviews/', views.productReviews, name='product-reviews'),
     path('products/<str:pk>/', views.productDetail, name='product'),
+    path('reviews/<int:pk>/', views.reviewDetail, name='review-detail'),
     path('wishlist/', views.manageWishlist, name='wishlist'),
     path('wishlist/<int:product_id>/', views.checkWishlistItem, name='check-wishlist'),
     path('analytics/', views.getAnalytics, name='analytics'),
@@ -1,15 +1,34 @@
-from django.http import JsonResponse, FileResponse
+from django.http import JsonResponse, FileResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response 
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from django.shortcuts import render
-from .products import products
-from .models import Product, Order, OrderItem, ShippingAddress, Wishlist
-from .serializers import ProductSerializer, OrderSerializer
-from .serializers import ContactMessageSerializer
+from .catalog_utils import static_catalog, product_detail_cache
+from .models import Product, Review, Order, OrderItem, OrderEvent, Wishlist, ProductNeighbor
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, Value
+from django.db.models.functions import Lower
+from .serializers import ProductSerializer, ProductDetailSerializer, ProductListSerializer, OrderSerializer
+from .serializers import OrderSummarySerializer
+from .serializers import ContactMessageSerializer, ReviewSerializer, ReviewWriteSerializer
 from django.contrib.auth.models import User
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from .pagination_utils import paginate_queryset, InvalidCursor
+from .search_utils import search_products
+from .cache_utils import product_list_cache, product_list_cache_key, get_version, get_version_info, CATALOG
+from .http_utils import make_etag, not_modified, set_validators
+from .facet_utils import compute_facets, facet_cache_key
+from .image_utils import IMMUTABLE_CACHE_CONTROL, VARIANT_DIR
+from .suggest_utils import suggest_index
+from .fx_utils import base_currency, get_rates, to_base, convert_page
+from .fieldset_utils import parse_fieldset, fieldset_key, fieldset_queryset
+from .recommend_utils import related_products, record_order_copurchases
+from .idempotency_utils import idempotent
+from .order_utils import place_order, order_summaries, OrderError, OutOfStock
+from .order_utils import transition_order, advance_order, mark_paid, record_event, order_timeline, orders_changed_since
+from .outbox_utils import queue_mail
+from .review_utils import create_review, update_review, delete_review
+from .bulk_utils import import_products, iter_export, detect_format, bulk_update_products, DEFAULT_BATCH_SIZE
 from .serializers import UserSerializer, UserSerializer
 from .email_utils import (
     send_order_confirmation_email,
@@ -24,10 +43,12 @@ from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.dateparse import parse_datetime
 from django.utils.encoding import force_bytes, force_str
-from django.core.mail import send_mail
 from django.conf import settings
 from django.views.generic import View
+import os
+from decimal import InvalidOperation
 
 
 def serve_frontend(request):
@@ -42,6 +63,14 @@ def serve_frontend(request):
         return JsonResponse({'detail': 'Frontend build not found. Run `npm run build` in frontend.'}, status=404)
 
 
+def serve_image_variant(request, path):
+    """Serve a content-hashed image variant with a year-long immutable cache policy."""
+    from django.views.static import serve
+    response = serve(request, path, document_root=os.path.join(settings.MEDIA_ROOT, VARIANT_DIR))
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
 def serve_admin_panel(request):
     """Serve the admin-panel React app index.html.
 
@@ -118,7 +147,7 @@ def passwordResetRequest(request):
         link = f"{frontend_base}/password-reset-confirm/?uid={uid}&token={token}"
         subject = 'Password reset for mamigloexclusive'
         message = f'Hello {user.username},\n\nUse the following link to reset your password:\n{link}\n\nIf you did not request this, please ignore.'
-        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [email])
+        queue_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [email])
     except Exception:
         # do not reveal whether user exists
         pass
@@ -253,50 +282,79 @@ def createProduct(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(['GET', 'POST'])
-def getProducts(request):
-    # Public product list with pagination, search, and filtering
-    # Also accept POST for admin product creation at the same endpoint
-    if request.method == 'POST':
-        # Require admin privileges to create products
-        if not request.user or not request.user.is_authenticated or not request.user.is_staff:
-            return Response({'detail': 'Not authorized to create products'}, status=status.HTTP_403_FORBIDDEN)
-        data = request.data
-        serializer = ProductSerializer(data=data)
-        if serializer.is_valid():
-            serializer.save(user=request.user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def importProducts(request):
+    """Admin bulk import from an uploaded CSV or NDJSON `file`"""
+    upload = request.FILES.get('file')
+    if not upload:
+        return Response({'detail': 'Upload a CSV or NDJSON file as "file"'}, status=status.HTTP_400_BAD_REQUEST)
+    fmt = detect_format(upload.name, upload.content_type, request.query_params.get('fmt'))
+    try:
+        batch_size = int(request.query_params.get('batch_size') or DEFAULT_BATCH_SIZE)
+    except ValueError:
+        batch_size = DEFAULT_BATCH_SIZE
+    report = import_products(upload, fmt, batch_size=max(batch_size, 1))
+    return Response(report, status=status.HTTP_200_OK)
 
-    products_list = Product.objects.all().order_by('-created_at')
-    
-    # Search by name or category
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def exportProducts(request):
+    """Admin streaming export of the whole catalog as CSV or NDJSON"""
+    fmt = detect_format(explicit=request.query_params.get('fmt'))
+    content_type = 'application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
+    response = StreamingHttpResponse(iter_export(Product.objects.all(), fmt), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="products.{fmt}"'
+    return response
+
+
+@api_view(['PATCH'])
+@permission_classes([IsAdminUser])
+def bulkUpdateProducts(request):
+    """Admin batch price/stock update: a list of {_id, price, priceCurrency, countInStock}"""
+    items = request.data.get('items') if isinstance(request.data, dict) else request.data
+    if not isinstance(items, list):
+        return Response({'detail': 'Expected a list of product changes'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(bulk_update_products(items))
+
+
+def filter_products(request, products_list):
+    """Apply the public listing's search, filter and sort parameters."""
+    # Full-text search over name, brand, category and description (ranked by relevance)
     query = request.query_params.get('search') or request.query_params.get('q') or request.GET.get('q')
     if query:
-        from django.db.models import Q
-        products_list = products_list.filter(
-            Q(name__icontains=query) | Q(category__icontains=query) | Q(description__icontains=query)
-        )
-    
+        products_list = search_products(products_list, query)
+
     # Filter by category
     category = request.query_params.get('category') or request.GET.get('category')
     if category:
-        products_list = products_list.filter(category__iexact=category)
-    
-    # Filter by price range
+        # Case-insensitive match written as LOWER(category) = LOWER(%s) so it can use product_category_lower_idx
+        products_list = products_list.alias(category_lower=Lower('category')).filter(category_lower=Lower(Value(category)))
+
+    # Filter by brand
+    brand = request.query_params.get('brand') or request.GET.get('brand')
+    if brand:
+        products_list = products_list.alias(brand_lower=Lower('brand')).filter(brand_lower=Lower(Value(brand)))
+
+    # Filter by price range, given in ?currency= (default: base currency) and
+    # compared against the normalized priceBase column
     min_price = request.query_params.get('min_price') or request.GET.get('min_price')
     max_price = request.query_params.get('max_price') or request.GET.get('max_price')
+    if min_price or max_price:
+        currency = (request.query_params.get('currency') or base_currency()).upper()
+        rates = get_rates() if currency != base_currency() else {}
     if min_price:
         try:
-            products_list = products_list.filter(price__gte=float(min_price))
-        except (ValueError, TypeError):
+            products_list = products_list.filter(priceBase__gte=to_base(min_price, currency, rates))
+        except (ValueError, TypeError, InvalidOperation):
             pass
     if max_price:
         try:
-            products_list = products_list.filter(price__lte=float(max_price))
-        except (ValueError, TypeError):
+            products_list = products_list.filter(priceBase__lte=to_base(max_price, currency, rates))
+        except (ValueError, TypeError, InvalidOperation):
             pass
-    
+
     # Filter by rating (minimum rating)
     min_rating = request.query_params.get('rating') or request.GET.get('rating')
     if min_rating:
@@ -304,41 +362,136 @@ def getProducts(request):
             products_list = products_list.filter(rating__gte=float(min_rating))
         except (ValueError, TypeError):
             pass
-    
+
     # Filter by in-stock items only
     in_stock_only = request.query_params.get('in_stock') or request.GET.get('in_stock')
     if in_stock_only and in_stock_only.lower() in ['true', '1', 'yes']:
         products_list = products_list.filter(countInStock__gt=0)
-    
+
     # Sorting
     sort = request.query_params.get('sort') or request.GET.get('sort')
     if sort:
         if sort == 'price_asc':
-            products_list = products_list.order_by('price')
+            products_list = products_list.order_by('priceBase')
         elif sort == 'price_desc':
-            products_list = products_list.order_by('-price')
+            products_list = products_list.order_by('-priceBase')
         elif sort == 'rating':
             products_list = products_list.order_by('-rating')
         elif sort == 'newest':
             products_list = products_list.order_by('-created_at')
+    return products_list
+
+
+@api_view(['GET', 'POST'])
+def getProducts(request):
+    # Public product list with pagination, search, and filtering
+    # Also accept POST for admin product creation at the same endpoint
+    if request.method == 'POST':
+        # Require admin privileges to create products
+        if not request.user or not request.user.is_authenticated or not request.user.is_staff:
+            return Response({'detail': 'Not authorized to create products'}, status=status.HTTP_403_FORBIDDEN)
+        data = request.data
+        serializer = ProductSerializer(data=data)
+        if serializer.is_valid():
+            serializer.save(user=request.user)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    currency = request.query_params.get('currency')
+    if currency and currency.upper() not in dict(Product._meta.get_field('priceCurrency').choices):
+        return Response({'detail': f'Unsupported currency: {currency}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # The listing is a function of the catalog version and the query, so that pair is its ETag
+    catalog_version, catalog_modified = get_version_info(CATALOG)
+    etag = make_etag('products', catalog_version, sorted(request.query_params.lists()))
+    unchanged = not_modified(request, etag, catalog_modified)
+    if unchanged is not None:
+        return unchanged
+
+    # Anonymous listings are served from the per-worker cache while the catalog is unchanged
+    cache_key = None
+    if not request.user.is_authenticated:
+        cache_key = product_list_cache_key(request.query_params)
+    if cache_key is not None:
+        cached = product_list_cache.get(cache_key, catalog_version)
+        if cached is not None:
+            return set_validators(Response(cached), etag, catalog_modified)
+
+    # ?fields= / ?omit= trim both the payload and the selected columns
+    fieldset = parse_fieldset(request)
+    products_list = Product.objects.order_by('-created_at')
+    
+    products_list = filter_products(request, products_list)
+    products_list = fieldset_queryset(products_list, ProductListSerializer, **fieldset)
 
-    page = request.query_params.get('page') or request.GET.get('page') or 1
-    page_size = request.query_params.get('page_size') or request.GET.get('page_size') or 10
-    paginator = Paginator(products_list, page_size)
     try:
-        products_page = paginator.page(page)
-    except PageNotAnInteger:
-        products_page = paginator.page(1)
-    except EmptyPage:
-        products_page = []
+        products_page, page_meta = paginate_queryset(request, products_list)
+    except InvalidCursor as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = ProductListSerializer(products_page, many=True, **fieldset)
+    data = {'results': serializer.data, **page_meta}
+    if currency:
+        convert_page(data['results'], currency.upper(), get_rates(catalog_version))
+    if cache_key is not None:
+        product_list_cache.set(cache_key, data, catalog_version)
+    return set_validators(Response(data), etag, catalog_modified)
+
+@api_view(['GET'])
+def getProductSuggestions(request):
+    """Search-as-you-type suggestions (product names, brands, categories), typo tolerant"""
+    query = request.query_params.get('q', '')
+    try:
+        limit = min(max(int(request.query_params.get('limit') or 8), 1), 20)
+    except (TypeError, ValueError):
+        limit = 8
+    suggest_index.ensure_fresh()
+    return Response({'query': query, 'suggestions': suggest_index.suggest(query, limit)})
+
+@api_view(['GET'])
+def getProductFacets(request):
+    """Facet counts (category, brand, price band, rating) for the listing filters"""
+    cache_key = facet_cache_key(product_list_cache_key(request.query_params))
+    if cache_key is not None:
+        catalog_version = get_version(CATALOG)
+        cached = product_list_cache.get(cache_key, catalog_version)
+        if cached is not None:
+            return Response(cached)
+
+    data = compute_facets(filter_products(request, Product.objects.all()))
+    if cache_key is not None:
+        product_list_cache.set(cache_key, data, catalog_version)
+    return Response(data)
+
+
+def reviews_page_params(request):
+    """Return ``(page, page_size)`` for the reviews embedded in productDetail."""
+    try:
+        page = max(int(request.query_params.get('reviews_page') or 1), 1)
+        page_size = max(int(request.query_params.get('reviews_page_size') or 10), 1)
+    except (TypeError, ValueError):
+        page, page_size = 1, 10
+    return page, page_size
+
+
+def reviews_prefetch(page, page_size):
+    """Prefetch one page of a product's reviews, newest first, in a single query."""
+    start = (page - 1) * page_size
+    reviews = Review.objects.order_by('-created_at', '-_id')[start:start + page_size]
+    return Prefetch('reviews', queryset=reviews, to_attr='review_page')
+
+
+def serialize_product_detail(product, reviews_page, reviews_page_size, fieldset=None):
+    serializer = ProductDetailSerializer(product, many=False, **(fieldset or {}))
+    data = serializer.data
+    if 'reviews' not in serializer.fields:
+        return data
+    reviews_count = product.reviews.count()
+    data['reviews_count'] = reviews_count
+    data['reviews_page'] = reviews_page
+    data['reviews_num_pages'] = max(-(-reviews_count // reviews_page_size), 1)
+    return data
 
-    serializer = ProductSerializer(products_page, many=True)
-    return Response({
-        'results': serializer.data,
-        'count': paginator.count,
-        'num_pages': paginator.num_pages,
-        'current_page': int(page),
-    })
 
 @api_view(['GET','PUT','PATCH','DELETE'])
 @permission_classes([AllowAny])
@@ -349,21 +502,35 @@ def productDetail(request, pk):
             return Response({'detail': 'Admin authentication required'}, status=status.HTTP_403_FORBIDDEN)
     
     # Guard against invalid ids (e.g., frontend sending 'undefined') to avoid ValueError -> 500
+    products_qs = Product.objects.all()
+    if request.method == 'GET':
+        fieldset = parse_fieldset(request)
+        products_qs = fieldset_queryset(products_qs, ProductDetailSerializer, extra=('updated_at',), **fieldset)
+        variant = fieldset_key(**fieldset)
+        # Full reviews are only served here, one page at a time
+        reviews_page, reviews_page_size = reviews_page_params(request)
+        if 'reviews' in ProductDetailSerializer(**fieldset).fields:
+            products_qs = products_qs.prefetch_related(reviews_prefetch(reviews_page, reviews_page_size))
+        # Revalidate against the row's updated_at before loading or serializing anything
+        try:
+            updated_at = Product.objects.filter(_id=pk).values_list('updated_at', flat=True).first()
+        except ValueError:
+            updated_at = None
+        if updated_at:
+            etag = make_etag('product', pk, updated_at, reviews_page, reviews_page_size, variant)
+            unchanged = not_modified(request, etag, updated_at)
+            if unchanged is not None:
+                return unchanged
+            cached = product_detail_cache.get(pk, updated_at, reviews_page, reviews_page_size, variant)
+            if cached is not None:
+                return set_validators(Response(cached), etag, updated_at)
     try:
-        product = Product.objects.get(_id=pk)
+        product = products_qs.get(_id=pk)
     except ValueError:
         return Response({'detail': 'Invalid product id'}, status=status.HTTP_400_BAD_REQUEST)
     except Product.DoesNotExist:
-        # Fallback to static products data
-        product = None
-        try:
-            pid = int(pk)
-        except (ValueError, TypeError):
-            return Response({'detail': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
-        for i in products:
-            if i['_id'] == pid:
-                product = i
-                break
+        # Fallback to the static products data, indexed by normalized id at startup
+        product = static_catalog.get(pk)
         if not product:
             return Response({'detail': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
         # If product comes from the static fallback (a dict), only allow GET.
@@ -372,8 +539,12 @@ def productDetail(request, pk):
             return Response({'detail': 'Cannot modify static product'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
     if request.method == 'GET':
-        serializer = ProductSerializer(product, many=False)
-        return Response(serializer.data)
+        if isinstance(product, dict):
+            return Response(product)
+        etag = make_etag('product', pk, product.updated_at, reviews_page, reviews_page_size, variant)
+        data = serialize_product_detail(product, reviews_page, reviews_page_size, fieldset)
+        product_detail_cache.set(pk, product.updated_at, data, reviews_page, reviews_page_size, variant)
+        return set_validators(Response(data), etag, product.updated_at)
 
     if request.method in ['PUT', 'PATCH']:
         try:
@@ -407,6 +578,91 @@ def productDetail(request, pk):
             return Response({'detail': 'Server error while deleting product', 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+
+
+def neighbor_products_response(request, pk, kind):
+    """Serialize a product's precomputed neighbours of ``kind`` (one indexed query)."""
+    try:
+        product_id = int(pk)
+        limit = min(max(int(request.query_params.get('limit') or 8), 1), 50)
+    except (TypeError, ValueError):
+        return Response({'detail': 'Invalid product id'}, status=status.HTTP_400_BAD_REQUEST)
+    neighbors = related_products(product_id, kind=kind, limit=limit, fields=ProductListSerializer.Meta.fields)
+    results = ProductListSerializer([n.neighbor for n in neighbors], many=True).data
+    for item, neighbor in zip(results, neighbors):
+        item['score'] = neighbor.score
+    return Response({'results': results})
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def getRelatedProducts(request, pk):
+    """Products frequently bought together with this one, from the precomputed neighbour table"""
+    return neighbor_products_response(request, pk, ProductNeighbor.COPURCHASE)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def getSimilarProducts(request, pk):
+    """Products with similar name, brand, category and description (TF-IDF neighbours)"""
+    return neighbor_products_response(request, pk, ProductNeighbor.SIMILAR)
+
+@api_view(['GET', 'POST'])
+@permission_classes([AllowAny])
+def productReviews(request, pk):
+    """List a product's reviews (paginated, newest first) or add the user's review"""
+    try:
+        product = Product.objects.only('_id').get(_id=pk)
+    except ValueError:
+        return Response({'detail': 'Invalid product id'}, status=status.HTTP_400_BAD_REQUEST)
+    except Product.DoesNotExist:
+        return Response({'detail': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'GET':
+        reviews = Review.objects.filter(product=product).order_by('-created_at', '-_id')
+        try:
+            reviews_page, page_meta = paginate_queryset(request, reviews)
+        except InvalidCursor as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': ReviewSerializer(reviews_page, many=True).data, **page_meta})
+
+    if not request.user or not request.user.is_authenticated:
+        return Response({'detail': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+    serializer = ReviewWriteSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    if Review.objects.filter(product=product, user=request.user).exists():
+        return Response({'detail': 'Product already reviewed'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        review = create_review(product, request.user, **serializer.validated_data)
+    except IntegrityError:
+        # A concurrent submission by the same user won the unique constraint
+        return Response({'detail': 'Product already reviewed'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(ReviewSerializer(review).data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['PUT', 'PATCH', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def reviewDetail(request, pk):
+    """Edit or remove a review (its author or an admin)"""
+    try:
+        review = Review.objects.get(_id=pk)
+    except Review.DoesNotExist:
+        return Response({'detail': 'Review not found'}, status=status.HTTP_404_NOT_FOUND)
+    if review.user_id != request.user.id and not request.user.is_staff:
+        return Response({'detail': 'Not authorized to modify this review'}, status=status.HTTP_403_FORBIDDEN)
+
+    if request.method == 'DELETE':
+        delete_review(review)
+        return Response({'detail': 'Review deleted'}, status=status.HTTP_204_NO_CONTENT)
+
+    serializer = ReviewWriteSerializer(data=request.data, partial=request.method == 'PATCH')
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+    review = update_review(review, rating=data.get('rating'), comment=data.get('comment'))
+    return Response(ReviewSerializer(review).data)
+
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def getUsers(request):
@@ -415,24 +671,16 @@ def getUsers(request):
     if query:
         from django.db.models import Q
         users = users.filter(Q(username__icontains=query) | Q(email__icontains=query))
+    fieldset = parse_fieldset(request)
+    users = fieldset_queryset(users, UserSerializer, **fieldset)
 
-    page = request.query_params.get('page') or request.GET.get('page') or 1
-    page_size = request.query_params.get('page_size') or request.GET.get('page_size') or 10
-    paginator = Paginator(users, page_size)
     try:
-        users_page = paginator.page(page)
-    except PageNotAnInteger:
-        users_page = paginator.page(1)
-    except EmptyPage:
-        users_page = []
+        users_page, page_meta = paginate_queryset(request, users)
+    except InvalidCursor as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    serializer = UserSerializer(users_page, many=True)
-    return Response({
-        'results': serializer.data,
-        'count': paginator.count,
-        'num_pages': paginator.num_pages,
-        'current_page': int(page),
-    })
+    serializer = UserSerializer(users_page, many=True, **fieldset)
+    return Response({'results': serializer.data, **page_meta})
 
 
 @api_view(['GET','POST'])
@@ -478,7 +726,7 @@ def contactMessages(request):
                     subject_line = f"New contact message: {obj.subject or 'No subject'}"
                     body = f"From: {obj.email or obj.user}\n\n{obj.message}\n\nView in admin: /admin/base/contactmessage/{obj._id}/"
                     try:
-                        send_mail(subject_line, body, settings.DEFAULT_FROM_EMAIL, admin_emails, fail_silently=True)
+                        queue_mail(subject_line, body, settings.DEFAULT_FROM_EMAIL, admin_emails)
                     except Exception:
                         pass
             except Exception:
@@ -515,7 +763,7 @@ def contactMessages(request):
                             subject_line = f"New contact message: {obj.subject or 'No subject'}"
                             body = f"From: {obj.email or obj.user}\n\n{obj.message}\n\nView in admin: /admin/base/contactmessage/{obj._id}/"
                             try:
-                                send_mail(subject_line, body, settings.DEFAULT_FROM_EMAIL, admin_emails, fail_silently=True)
+                                queue_mail(subject_line, body, settings.DEFAULT_FROM_EMAIL, admin_emails)
                             except Exception:
                                 pass
                     except Exception:
@@ -535,23 +783,13 @@ def contactMessages(request):
     msgs = ContactMessage.objects.all().order_by('-created_at')
     if query:
         msgs = msgs.filter(message__icontains=query) | msgs.filter(email__icontains=query) | msgs.filter(subject__icontains=query)
-    page = request.query_params.get('page') or request.GET.get('page') or 1
-    page_size = request.query_params.get('page_size') or request.GET.get('page_size') or 20
-    paginator = Paginator(msgs, page_size)
     try:
-        msgs_page = paginator.page(page)
-    except PageNotAnInteger:
-        msgs_page = paginator.page(1)
-    except EmptyPage:
-        msgs_page = []
+        msgs_page, page_meta = paginate_queryset(request, msgs, default_page_size=20)
+    except InvalidCursor as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     serializer = ContactMessageSerializer(msgs_page, many=True)
-    return Response({
-        'results': serializer.data,
-        'count': paginator.count,
-        'num_pages': paginator.num_pages,
-        'current_page': int(page),
-    })
+    return Response({'results': serializer.data, **page_meta})
 
 
 @api_view(['GET','PATCH'])
@@ -610,6 +848,7 @@ def userDetail(request, pk):
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def getOrders(request):
     if request.method == 'POST':
         # Create a new order (authenticated user)
@@ -617,54 +856,23 @@ def getOrders(request):
         user = request.user
         
         try:
-            # Create Order
-            order = Order.objects.create(
-                user=user,
-                paymentMethod=data.get('paymentMethod'),
-                taxPrice=data.get('taxPrice', 0),
-                shippingPrice=data.get('shippingPrice', 0),
-                totalPrice=data.get('totalPrice', 0),
-            )
-            
-            # Create Order Items and Shipping Address
-            orderItems = data.get('orderItems', [])
-            if len(orderItems) == 0:
-                order.delete()
-                return Response({'detail': 'No order items'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            for item in orderItems:
-                product = Product.objects.get(_id=item.get('product'))
-                orderItem = OrderItem.objects.create(
-                    product=product,
-                    order=order,
-                    name=product.name,
-                    qty=item.get('qty'),
-                    price=item.get('price'),
-                    image=product.image.url if product.image else '',
-                )
-            
-            # Create Shipping Address
-            shipping = data.get('shippingAddress', {})
-            ShippingAddress.objects.create(
-                order=order,
-                address=shipping.get('address'),
-                city=shipping.get('city'),
-                postalCode=shipping.get('postalCode'),
-                country=shipping.get('country'),
-            )
-            
-            # Send order confirmation email
-            try:
-                send_order_confirmation_email(order, user)
-            except Exception as e:
-                # Log the error but don't fail the order creation
-                print(f"Error sending order confirmation email: {e}")
-            
-            serializer = OrderSerializer(order, many=False)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        
+            with transaction.atomic():
+                order = place_order(user, data)
+                # Queue the confirmation email in the order's transaction
+                try:
+                    send_order_confirmation_email(order, user)
+                except Exception as e:
+                    # Log the error but don't fail the order creation
+                    print(f"Error sending order confirmation email: {e}")
+        except OutOfStock as e:
+            return Response({'detail': str(e), 'product': e.product._id}, status=status.HTTP_409_CONFLICT)
+        except OrderError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = OrderSerializer(order, many=False)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
     
     # GET: List all orders (admin only)
     if request.method == 'GET':
@@ -672,33 +880,47 @@ def getOrders(request):
             return Response({'detail': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
         
         orders = Order.objects.all().order_by('-created_at')
-        query = request.query_params.get('search') or request.query_params.get('q') or request.GET.get('q')
-        if query:
+        query = (request.query_params.get('search') or request.query_params.get('q') or request.GET.get('q') or '').strip()
+        if query.lstrip('#').isdigit():
+            # Order numbers are looked up exactly by primary key
+            orders = orders.filter(_id=int(query.lstrip('#')))
+        elif '@' in query:
+            # Full email addresses hit the lower(customerEmail) index
+            orders = orders.alias(customer_email_lower=Lower('customerEmail')).filter(customer_email_lower=query.lower())
+        elif query:
+            # Free text scans the denormalized customer columns, without joining auth_user
             from django.db.models import Q
-            orders = orders.filter(Q(user__username__icontains=query) | Q(user__email__icontains=query) | Q(_id__icontains=query))
+            orders = orders.filter(Q(customerName__icontains=query) | Q(customerEmail__icontains=query))
         
+        # Orders with any status, payment or tracking event after the given time
+        changed_since = request.query_params.get('changed_since')
+        if changed_since:
+            since = parse_datetime(changed_since)
+            if since is None:
+                return Response({'detail': 'changed_since must be an ISO 8601 datetime'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            orders = orders.filter(_id__in=orders_changed_since(since))
+
         # Filter by payment status if provided
         paid_filter = request.query_params.get('paid')
         if paid_filter:
             orders = orders.filter(isPaid=(paid_filter.lower() == 'true'))
+        fieldset = parse_fieldset(request)
+        orders = fieldset_queryset(orders, OrderSerializer, **fieldset)
 
-        page = request.query_params.get('page') or request.GET.get('page') or 1
-        page_size = request.query_params.get('page_size') or request.GET.get('page_size') or 10
-        paginator = Paginator(orders, page_size)
         try:
-            orders_page = paginator.page(page)
-        except PageNotAnInteger:
-            orders_page = paginator.page(1)
-        except EmptyPage:
-            orders_page = []
+            orders_page, page_meta = paginate_queryset(request, orders)
+        except InvalidCursor as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = OrderSerializer(orders_page, many=True)
-        return Response({
-            'results': serializer.data,
-            'count': paginator.count,
-            'num_pages': paginator.num_pages,
-            'current_page': int(page),
-        })
+        serializer = OrderSerializer(orders_page, many=True, **fieldset)
+        return Response({'results': serializer.data, **page_meta})
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
 
 
 @api_view(['GET','PUT','PATCH','DELETE'])
@@ -721,11 +943,23 @@ def orderDetail(request, pk):
         if not request.user.is_staff:
             return Response({'detail': 'Not authorized to update orders'}, status=status.HTTP_403_FORBIDDEN)
         data = request.data
-        order.isPaid = data.get('isPaid', order.isPaid)
-        order.isDelivered = data.get('isDelivered', order.isDelivered)
-        if 'isRefunded' in data:
-            order.isRefunded = data.get('isRefunded')
-        order.save()
+        flags = {name: _as_bool(data[name]) for name in ('isPaid', 'isDelivered', 'isRefunded') if name in data}
+        if any(getattr(order, name) and not value for name, value in flags.items()):
+            return Response({'detail': 'Payment, delivery and refund cannot be undone'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        # Flags are applied as state transitions so they are validated and logged;
+        # a refused step rolls back every flag in the request
+        try:
+            with transaction.atomic():
+                if flags.get('isPaid') and not order.isPaid:
+                    if mark_paid(order, order.paymentResult, actor=request.user, note='Marked paid by admin'):
+                        record_order_copurchases(order)
+                if flags.get('isDelivered') and not order.isDelivered:
+                    order = advance_order(order, 'delivered', actor=request.user)
+                if flags.get('isRefunded') and not order.isRefunded:
+                    order = transition_order(order, 'refunded', actor=request.user)
+        except OrderError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         serializer = OrderSerializer(order, many=False)
         return Response(serializer.data)
 
@@ -739,6 +973,7 @@ def orderDetail(request, pk):
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def updateOrderPayment(request, pk):
     """Update order payment status after successful payment processing"""
     try:
@@ -750,20 +985,17 @@ def updateOrderPayment(request, pk):
     if order.user != request.user and not request.user.is_staff:
         return Response({'detail': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
     
-    data = request.data
-    order.isPaid = True
-    order.paymentResult = data
-    from django.utils import timezone
-    order.paidAt = timezone.now()
-    order.save()
-    
-    # Send payment confirmation email
-    try:
-        payment_method = order.paymentMethod or "Payment"
-        send_payment_confirmation_email(order, order.user, payment_method)
-    except Exception as e:
-        # Log the error but don't fail the payment update
-        print(f"Error sending payment confirmation email: {e}")
+    with transaction.atomic():
+        if mark_paid(order, request.data, actor=request.user, note=order.paymentMethod or ''):
+            record_order_copurchases(order)
+
+            # Queue the payment confirmation email with the first payment only
+            try:
+                payment_method = order.paymentMethod or "Payment"
+                send_payment_confirmation_email(order, order.user, payment_method)
+            except Exception as e:
+                # Log the error but don't fail the payment update
+                print(f"Error sending payment confirmation email: {e}")
     
     serializer = OrderSerializer(order, many=False)
     return Response(serializer.data)
@@ -772,15 +1004,43 @@ def updateOrderPayment(request, pk):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def myOrders(request):
-    """Return orders for the authenticated user"""
-    user = request.user
-    orders = Order.objects.filter(user=user).order_by('-created_at')
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
+    """Return the authenticated user's orders, newest first.
+
+    Without paging parameters the response is the plain list existing clients
+    expect. ``?cursor=``, ``?pagination=``, ``?page=``/``?page_size=`` or
+    ``?view=`` opt in to the paginated envelope (cursor mode unless a
+    ``?page=`` number is given).
+    ``?view=summary`` returns compact rows (id, date, status, total, item
+    count, first item image) from one aggregated query; the full order is
+    available from ``orderDetail``.
+    """
+    orders = Order.objects.filter(user=request.user).order_by('-created_at', '-_id')
+    summary = request.query_params.get('view') == 'summary'
+    if summary:
+        orders = order_summaries(orders)
+    else:
+        fieldset = parse_fieldset(request)
+        orders = fieldset_queryset(orders, OrderSerializer, **fieldset)
+
+    paging_params = ('cursor', 'pagination', 'page', 'page_size', 'view')
+    if not any(name in request.query_params for name in paging_params):
+        return Response(OrderSerializer(orders, many=True, **fieldset).data)
+
+    try:
+        orders_page, page_meta = paginate_queryset(request, orders, default_page_size=20, cursor_default=True)
+    except InvalidCursor as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if summary:
+        serializer = OrderSummarySerializer(orders_page, many=True)
+    else:
+        serializer = OrderSerializer(orders_page, many=True, **fieldset)
+    return Response({'results': serializer.data, **page_meta})
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def confirmTransferPayment(request, pk):
     """Confirm transfer payment - user indicates they've made the transfer"""
     try:
@@ -814,6 +1074,7 @@ def confirmTransferPayment(request, pk):
 
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
+@idempotent
 def approveTransferPayment(request, pk):
     """Admin endpoint to approve transfer payment"""
     try:
@@ -836,12 +1097,10 @@ def approveTransferPayment(request, pk):
         )
     
     # Mark order as paid
-    from django.utils import timezone
-    order.isPaid = True
-    order.paidAt = timezone.now()
     order.transferConfirmed = True
-    order.paymentResult = {'transferApprovedBy': request.user.username, 'method': 'Transfer'}
-    order.save()
+    payment_result = {'transferApprovedBy': request.user.username, 'method': 'Transfer'}
+    if mark_paid(order, payment_result, actor=request.user, note='Transfer approved'):
+        record_order_copurchases(order)
     
     serializer = OrderSerializer(order, many=False)
     return Response({
@@ -861,10 +1120,10 @@ def manageWishlist(request):
     
     if request.method == 'GET':
         # Get wishlist items
-        products = wishlist.products.all()
-        serializer = ProductSerializer(products, many=True)
+        products = list(wishlist.products.only(*ProductListSerializer.Meta.fields))
+        serializer = ProductListSerializer(products, many=True)
         return Response({
-            'count': products.count(),
+            'count': len(products),
             'items': serializer.data
         })
     
@@ -945,16 +1204,13 @@ def refundOrder(request, pk):
     
     reason = request.data.get('reason', 'Refund requested')
     
-    # Mark as refunded
-    from django.utils import timezone
-    order.isRefunded = True
-    order.save()
-    
-    # Send refund notification email
+    # Mark as refunded and queue the notification in the same transaction
     try:
-        from django.core.mail import send_mail
-        subject = f"Refund Processed - Order #{order._id}"
-        message = f"""
+        with transaction.atomic():
+            order = transition_order(order, 'refunded', actor=request.user, note=reason)
+            try:
+                subject = f"Refund Processed - Order #{order._id}"
+                message = f"""
         Hello {order.user.first_name or order.user.username},
         
         Your refund request for order #{order._id} has been processed.
@@ -965,15 +1221,16 @@ def refundOrder(request, pk):
         
         Thank you for shopping with mamigloexclusive!
         """
-        send_mail(
-            subject,
-            message,
-            'from@mamigloexclusive.com',
-            [order.user.email],
-            fail_silently=True,
-        )
-    except Exception as e:
-        print(f"Error sending refund email: {e}")
+                queue_mail(
+                    subject,
+                    message,
+                    'from@mamigloexclusive.com',
+                    [order.user.email],
+                )
+            except Exception as e:
+                print(f"Error sending refund email: {e}")
+    except OrderError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     serializer = OrderSerializer(order, many=False)
     return Response({
@@ -1061,30 +1318,32 @@ def updateOrderTracking(request, pk):
     
     data = request.data
     
-    # Update order status
-    if 'status' in data:
-        order.status = data['status']
-    
-    # Update tracking number
-    if 'tracking_number' in data:
-        order.tracking_number = data['tracking_number']
-    
-    # Update estimated delivery
-    if 'estimated_delivery' in data:
-        order.estimated_delivery = data['estimated_delivery']
-    
-    # Mark as delivered if status is 'delivered'
-    if data.get('status') == 'delivered':
-        from django.utils import timezone
-        order.isDelivered = True
-        order.deliveredAt = timezone.now()
-        # Send shipment email
-        try:
-            send_order_shipped_email(order, order.user, order.tracking_number)
-        except Exception as e:
-            print(f"Error sending shipment email: {e}")
-    
-    order.save()
+    # Tracking details and the status change are written in one transaction,
+    # so a refused transition leaves nothing behind
+    try:
+        with transaction.atomic():
+            # Update tracking number and estimated delivery
+            tracking_changed = 'tracking_number' in data and data['tracking_number'] != order.tracking_number
+            if 'tracking_number' in data:
+                order.tracking_number = data['tracking_number']
+            if 'estimated_delivery' in data:
+                order.estimated_delivery = data['estimated_delivery']
+            order.save()
+            if tracking_changed:
+                record_event(order, OrderEvent.TRACKING, request.user, note=order.tracking_number or '')
+
+            # Update order status through the transition table, stepping through
+            # skipped fulfilment stages as orderDetail does
+            if 'status' in data and data['status'] != order.status:
+                order = advance_order(order, data['status'], actor=request.user, note=data.get('note', ''))
+                if order.status == 'delivered':
+                    # Queue the shipment email with the status change
+                    try:
+                        send_order_shipped_email(order, order.user, order.tracking_number)
+                    except Exception as e:
+                        print(f"Error sending shipment email: {e}")
+    except OrderError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     serializer = OrderSerializer(order, many=False)
     return Response({
@@ -1103,10 +1362,21 @@ def getOrderTracking(request, pk):
         return Response({'detail': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
     
     # Only order owner or admin can view tracking
-    if order.user != request.user and not request.user.is_staff:
+    if order.user_id != request.user.id and not request.user.is_staff:
         return Response({'detail': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
-    
-    return Response({
+
+    since = request.query_params.get('since')
+    if since:
+        since = parse_datetime(since)
+        if since is None:
+            return Response({'detail': 'since must be an ISO 8601 datetime'}, status=status.HTTP_400_BAD_REQUEST)
+
+    etag = make_etag('tracking', order._id, order.updated_at, since)
+    unchanged = not_modified(request, etag, order.updated_at)
+    if unchanged is not None:
+        return unchanged
+
+    return set_validators(Response({
         'order_id': order._id,
         'status': order.status,
         'tracking_number': order.tracking_number,
@@ -1114,7 +1384,8 @@ def getOrderTracking(request, pk):
         'is_delivered': order.isDelivered,
         'delivered_at': order.deliveredAt,
         'created_at': order.created_at,
-    })
+        'events': list(order_timeline(order, since or None)),
+    }), etag, order.updated_at, private=True)
 
 
 @api_view(['GET'])